@@ -0,0 +1,160 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## End-to-end benchmark of the agent
+## Runs satellite.py against the stand-in API and the fake
+## sdk_mgr for every combination of fleet size and interval,
+## each scenario in its own process, and reports the samples
+## and telemetry updates per second, the end-to-end latency
+## of the samples, the CPU time and the memory of the agent.
+##
+## Requires grpcio and the NDK protobuf bindings on the
+## PYTHONPATH, e.g.
+##   PYTHONPATH=/usr/lib/python3.6/site-packages/sdk_protos \
+##       python3 benchmarks/bench_agent.py --fleet 1 10 50 --interval 1 10
+############################################################
+import os
+import sys
+import json
+import math
+import signal
+import asyncio
+import logging
+import argparse
+import itertools
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.dirname(os.path.abspath(__file__)),
+                os.path.join(ROOT, 'satellite_agent'),
+                os.path.join(ROOT, 'netns')]
+
+## NORAD ids of the list entries, the flat '.satellite' container tracks
+## the default satellite
+LIST_IDS = 40000
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100.0 * len(ordered)) - 1)]
+
+
+def rss_kb():
+    '''Return the current resident set size in kB.'''
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+async def drive(scenario):
+    import standin_api
+    import fake_sdk_mgr
+    import sources
+    import scheduler
+    import snapshot
+    import satellite
+
+    api = standin_api.StandInServer(latency=scenario['latency'], jitter=scenario['jitter'],
+                                    error_rate=scenario['error_rate']).start()
+    sources.WHERETHEISS_URL = api.url
+
+    ## no namespaces, no rate limit of the public API, a private snapshot
+    satellite.MGMT_NAMESPACE = None
+    satellite.API_MIN_INTERVAL = 0
+    satellite.rate_limiter = scheduler.RateLimiter(scenario['api_rate'], scenario['api_rate'])
+    snapshot.SNAPSHOT_PATH = os.path.join(tempfile.mkdtemp(), 'snapshot.json')
+
+    sdk = fake_sdk_mgr.FakeSdkMgr()
+    satellite.SDK_MGR_ADDRESS = await sdk.start()
+    agent = asyncio.ensure_future(satellite.run_agent())
+    await sdk.registered.wait()
+
+    await sdk.config('.satellite', {'interval': {'value': scenario['interval']},
+                                    'mode': {'value': 'MODE_' + scenario['mode']},
+                                    'extrapolation_interval': {'value': scenario['extrapolation']}})
+    for i in range(scenario['fleet'] - 1):
+        await sdk.config('.satellite.satellite', {}, keys=[LIST_IDS + i])
+    await sdk.config('.commit.end', {})
+
+    cpu = resource.getrusage(resource.RUSAGE_SELF)
+    start = asyncio.get_event_loop().time()
+    await asyncio.sleep(scenario['duration'])
+    elapsed = asyncio.get_event_loop().time() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss = rss_kb()
+
+    os.kill(os.getpid(), signal.SIGTERM)
+    await agent
+    await sdk.stop()
+    api.shutdown()
+
+    latencies = [1000.0 * l for l in sdk.latencies]
+    return dict(scenario,
+                samples_per_s=round(len(latencies) / elapsed, 2),
+                updates_per_s=round(sdk.updates / elapsed, 2),
+                rpcs_per_s=round(sdk.update_rpcs / elapsed, 2),
+                latency_p50_ms=round(percentile(latencies, 50), 2),
+                latency_p99_ms=round(percentile(latencies, 99), 2),
+                latency_max_ms=round(max(latencies or [0.0]), 2),
+                cpu_percent=round(100.0 * (usage.ru_utime + usage.ru_stime - cpu.ru_utime - cpu.ru_stime) / elapsed, 1),
+                rss_kb=rss,
+                max_rss_kb=usage.ru_maxrss,
+                api_requests=api.count,
+                api_errors=api.errors)
+
+
+def run_scenario(scenario):
+    logging.basicConfig(level=scenario['log_level'], stream=sys.stderr)
+    loop = asyncio.get_event_loop()
+    result = loop.run_until_complete(drive(scenario))
+    loop.close()
+    print(json.dumps(result))
+
+
+COLUMNS = ['fleet', 'interval', 'mode', 'samples_per_s', 'updates_per_s', 'rpcs_per_s',
+           'latency_p50_ms', 'latency_p99_ms', 'latency_max_ms', 'cpu_percent', 'rss_kb', 'api_errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of the satellite agent')
+    parser.add_argument('--fleet', type=int, nargs='+', default=[1, 10, 50], help='number of tracked satellites')
+    parser.add_argument('--interval', type=int, nargs='+', default=[1, 10], help='sample interval in seconds')
+    parser.add_argument('--mode', choices=['api', 'propagate'], default='api')
+    parser.add_argument('--extrapolation', type=int, default=0, help='extrapolation interval in seconds')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per scenario')
+    parser.add_argument('--latency', type=float, default=0.05, help='API response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='random additional API delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of failing API requests')
+    parser.add_argument('--api-rate', type=float, default=1000.0, help='API requests per second allowed')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per scenario')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return run_scenario(json.loads(args.run))
+
+    if not args.json:
+        print(' '.join('%14s' % c for c in COLUMNS))
+    for fleet_size, interval in itertools.product(args.fleet, args.interval):
+        scenario = dict(fleet=fleet_size, interval=interval, mode=args.mode, extrapolation=args.extrapolation,
+                        duration=args.duration, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, api_rate=args.api_rate, log_level=args.log_level)
+        ## a process per scenario, so memory and agent state start fresh
+        output = subprocess.run([sys.executable, __file__, '--run', json.dumps(scenario)],
+                                stdout=subprocess.PIPE, check=True).stdout
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(' '.join('%14s' % result[c] for c in COLUMNS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Micro-benchmark of WorldMapFormatter.iter_format()
+## Renders frames of the 'show satellite' world map with a
+## growing number of fleet members and track points, with
+## cold and warm caches and with warm caches while the
+## satellite moves (a refresh of 'show satellite watch'),
+## on the ascii map or on a DotMap of the terminal width.
+##
+## Runs with the SR Linux CLI python environment, or anywhere
+## else with minimal stand-ins of the srlinux modules the
+## plugin imports (only the Formatter base class is used).
+############################################################
+import os
+import sys
+import types
+import timeit
+import itertools
+import argparse
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN = os.path.join(ROOT, 'cli-plugin', 'satellite.py')
+
+SRLINUX_MODULES = {
+    'srlinux': [],
+    'srlinux.mgmt': [],
+    'srlinux.mgmt.cli': ['CliPlugin', 'KeyCompleter'],
+    'srlinux.syntax': ['Syntax'],
+    'srlinux.syntax.value_checkers': ['IntegerValueInRangeChecker'],
+    'srlinux.schema': ['FixedSchemaRoot'],
+    'srlinux.location': ['build_path'],
+    'srlinux.data': ['ColumnFormatter', 'TagValueFormatter', 'TagValueWithKeyLineFormatter', 'Formatter',
+                     'Border', 'Borders', 'Data', 'Indent', 'Header', 'Whiteline', 'Footer', 'Alignment'],
+    'srlinux.data.utilities': ['Percentage'],
+}
+
+
+def load_plugin():
+    '''Import the CLI plugin, with stand-ins of the srlinux modules when
+    they are not installed.'''
+    try:
+        import srlinux.data
+    except ImportError:
+        for name, attributes in SRLINUX_MODULES.items():
+            module = sys.modules[name] = types.ModuleType(name)
+            for attribute in attributes:
+                setattr(module, attribute, type(attribute, (object,), {}))
+        sys.modules['srlinux'].strings = None
+
+    spec = importlib.util.spec_from_file_location('satellite_plugin', PLUGIN)
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    return plugin
+
+
+class Items(list):
+    '''A list node of the CLI data.'''
+
+    def items(self):
+        return self
+
+
+def entry(fleet, track):
+    '''Return a satellite as the formatter gets it, as strings.'''
+    point = lambda i: types.SimpleNamespace(index=i, timestamp='2022-02-04 12:00:00',
+                                            latitude='%.4f' % ((i * 7) % 160 - 80),
+                                            longitude='%.4f' % ((i * 3) % 350 - 175),
+                                            altitude='420.1', velocity='27600.5')
+    members = Items(types.SimpleNamespace(norad_id=40000 + i, name='sat-%d' % i,
+                                          latitude='%.4f' % ((i * 13) % 160 - 80),
+                                          longitude='%.4f' % ((i * 29) % 350 - 175))
+                    for i in range(fleet))
+    return types.SimpleNamespace(
+        name='iss', id='25544', timestamp='2022-02-04 12:00:00', latitude='51.5', longitude='-0.12',
+        altitude='420.1', velocity='27600.5', visibility='daylight', footprint='4500.0',
+        daynum='2459615.0', solar_lat='-15.8', solar_lon='348.5', units='kilometers',
+        restored='false', age='0', estimated='false', error_bound='0',
+        track=Items(point(i) for i in range(track)), fleet=members)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of WorldMapFormatter.iter_format')
+    parser.add_argument('--number', type=int, default=2000, help='frames per measurement')
+    parser.add_argument('--style', default='ascii', choices=['ascii', 'braille', 'half-block'], help='map style')
+    parser.add_argument('--width', type=int, default=120, help='terminal width of the braille and half-block maps')
+    args = parser.parse_args()
+
+    plugin = load_plugin()
+    formatter_class = plugin.WorldMapFormatter
+
+    print('%8s %8s %14s %14s %14s' % ('fleet', 'track', 'cold us/frame', 'warm us/frame', 'moved us/frame'))
+    for fleet, track in [(0, 0), (5, 0), (25, 0), (0, 60), (25, 60), (25, 1000)]:
+        satellite = entry(fleet, track)
+        formatter = formatter_class(track=bool(track), style=args.style)
+        frame = lambda: list(formatter.iter_format(satellite, args.width))
+
+        def cold():
+            formatter.row_cache.clear()
+            formatter.cell_cache.clear()
+            plugin.DotMap.cache.clear()
+            frame()
+
+        cold_us = timeit.timeit(cold, number=args.number) / args.number * 1e6
+        frame()
+        warm_us = timeit.timeit(frame, number=args.number) / args.number * 1e6
+
+        ## the same fleet and track, the satellite alternating between two positions
+        moved = entry(fleet, track)
+        moved.latitude, moved.longitude = '-33.87', '151.21'
+        entries = itertools.cycle([satellite, moved])
+        move = lambda: list(formatter.iter_format(next(entries), args.width))
+        move()
+        moved_us = timeit.timeit(move, number=args.number) / args.number * 1e6
+        print('%8d %8d %14.1f %14.1f %14.1f' % (fleet, track, cold_us, warm_us, moved_us))
+
+
+if __name__ == '__main__':
+    main()
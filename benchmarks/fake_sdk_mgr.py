@@ -0,0 +1,151 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## In-process fake of the SR Linux sdk_mgr
+## Implements the SdkMgrService, SdkNotificationService and
+## SdkMgrTelemetryService on a local grpc.aio server, so the
+## agent runs unmodified against it. Config notifications are
+## queued with config(), the received telemetry is merged
+## into a state dict and measured.
+############################################################
+import json
+import time
+import asyncio
+
+import grpc
+
+import sdk_service_pb2
+import sdk_service_pb2_grpc
+import sdk_common_pb2
+import config_service_pb2
+import telemetry_service_pb2
+import telemetry_service_pb2_grpc
+
+SUCCESS = sdk_common_pb2.SdkMgrStatus.Value('kSdkMgrSuccess')
+
+
+def leaf_value(value):
+    '''Return the value of a leaf of a telemetry JSON object.'''
+    return value['value'] if isinstance(value, dict) and 'value' in value else value
+
+
+def sample_time(daynum):
+    '''Return the unix time of a julian date.'''
+    return (float(daynum) - 2440587.5) * 86400.0
+
+
+class SdkMgrService(sdk_service_pb2_grpc.SdkMgrServiceServicer):
+
+    def __init__(self, sdk):
+        self.sdk = sdk
+
+    async def AgentRegister(self, request, context):
+        self.sdk.rpcs.append('AgentRegister')
+        self.sdk.registered.set()
+        return sdk_service_pb2.AgentRegistrationResponse(status=SUCCESS, app_id=1)
+
+    async def AgentUnRegister(self, request, context):
+        self.sdk.rpcs.append('AgentUnRegister')
+        return sdk_service_pb2.AgentRegistrationResponse(status=SUCCESS, app_id=1)
+
+    async def KeepAlive(self, request, context):
+        self.sdk.keepalives += 1
+        return sdk_service_pb2.KeepAliveResponse(status=SUCCESS)
+
+    async def NotificationRegister(self, request, context):
+        return sdk_service_pb2.NotificationRegisterResponse(status=SUCCESS, stream_id=1, sub_id=1)
+
+
+class SdkNotificationService(sdk_service_pb2_grpc.SdkNotificationServiceServicer):
+
+    def __init__(self, sdk):
+        self.sdk = sdk
+
+    async def NotificationStream(self, request, context):
+        while True:
+            response = await self.sdk.notifications.get()
+            if response is None:
+                return
+            yield response
+
+
+class SdkMgrTelemetryService(telemetry_service_pb2_grpc.SdkMgrTelemetryServiceServicer):
+
+    def __init__(self, sdk):
+        self.sdk = sdk
+
+    async def TelemetryAddOrUpdate(self, request, context):
+        self.sdk.receive_update(request)
+        return telemetry_service_pb2.TelemetryUpdateResponse(status=SUCCESS)
+
+    async def TelemetryDelete(self, request, context):
+        self.sdk.receive_delete(request)
+        return telemetry_service_pb2.TelemetryDeleteResponse(status=SUCCESS)
+
+
+class FakeSdkMgr(object):
+    '''The fake sdk_mgr and its measurements.
+
+    state: dict of js_path on the merged leaves published by the agent
+    rpcs: names of the registration and telemetry RPCs received, in order
+    latencies: end-to-end latency in seconds of every fetched sample,
+    from the time it was served (its daynum) to its arrival here
+    '''
+
+    def __init__(self):
+        self.server = None
+        self.notifications = asyncio.Queue()
+        self.registered = asyncio.Event()
+        self.state = {}
+        self.rpcs = []
+        self.latencies = []
+        self.update_rpcs = 0
+        self.delete_rpcs = 0
+        self.updates = 0
+        self.keepalives = 0
+
+    async def start(self, address='127.0.0.1:0'):
+        '''Start serving, return the address the agent has to connect to.'''
+        self.server = grpc.aio.server()
+        sdk_service_pb2_grpc.add_SdkMgrServiceServicer_to_server(SdkMgrService(self), self.server)
+        sdk_service_pb2_grpc.add_SdkNotificationServiceServicer_to_server(SdkNotificationService(self), self.server)
+        telemetry_service_pb2_grpc.add_SdkMgrTelemetryServiceServicer_to_server(SdkMgrTelemetryService(self), self.server)
+        port = self.server.add_insecure_port(address)
+        await self.server.start()
+        return '%s:%d' % (address.rsplit(':', 1)[0], port)
+
+    async def stop(self):
+        await self.notifications.put(None)
+        await self.server.stop(grace=1)
+
+    async def config(self, js_path, data=None, keys=(), op='Create'):
+        '''Send a config notification to the agent.'''
+        notification = sdk_service_pb2.Notification(config=config_service_pb2.ConfigNotification(
+            op=sdk_common_pb2.SdkMgrOperation.Value(op),
+            key=config_service_pb2.ConfigKey(js_path=js_path, keys=[str(k) for k in keys]),
+            data=config_service_pb2.ConfigData(json=json.dumps(data or {}))))
+        await self.notifications.put(sdk_service_pb2.NotificationStreamResponse(notification=[notification]))
+
+    def receive_update(self, request):
+        now = time.time()
+        self.update_rpcs += 1
+        self.rpcs.append('TelemetryAddOrUpdate')
+        for info in request.state:
+            self.updates += 1
+            leaves = json.loads(info.data.json_content)
+            merged = self.state.setdefault(info.key.js_path, {})
+            merged.update(leaves)
+            ## a new fetched sample changes daynum, estimated positions reuse it
+            if 'daynum' in leaves and str(leaf_value(merged.get('estimated', 'false'))).lower() != 'true':
+                self.latencies.append(now - sample_time(leaf_value(leaves['daynum'])))
+
+    def receive_delete(self, request):
+        self.delete_rpcs += 1
+        self.rpcs.append('TelemetryDelete')
+        for key in request.key:
+            for js_path in list(self.state):
+                if js_path == key.js_path or js_path.startswith(key.js_path + '.'):
+                    del self.state[js_path]
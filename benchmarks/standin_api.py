@@ -0,0 +1,170 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Stand-in for the wheretheiss API
+## Serves the satellites, position, positions and TLE
+## endpoints from a local HTTP/1.1 keep-alive server with
+## configurable latency and errors, so the agent can be
+## measured without internet access.
+############################################################
+import math
+import time
+import json
+import random
+import argparse
+import threading
+import http.server
+import urllib.parse
+
+## Inclination (degrees) and period (seconds) of the simulated orbits
+INCLINATION = 51.6
+PERIOD = 5560.0
+ALTITUDE = 420.0
+VELOCITY = 27600.0
+
+## TLE of the ISS, served for every NORAD id
+TLE_LINE1 = '1 25544U 98067A   22035.51743056  .00005614  00000-0  10851-3 0  9993'
+TLE_LINE2 = '2 25544  51.6446 272.9016 0006148  88.3398 356.3466 15.49646102324278'
+
+
+def julian_date(timestamp):
+    return timestamp / 86400.0 + 2440587.5
+
+
+def position(norad_id, timestamp):
+    '''Return the payload of the position endpoint of a satellite on a
+    circular orbit, each NORAD id has its own phase.
+
+    daynum is the julian date of timestamp at full precision, so a
+    consumer can tell when the sample was served.
+    '''
+    phase = 2.0 * math.pi * (timestamp / PERIOD + (norad_id % 97) / 97.0)
+    incl = math.radians(INCLINATION)
+    lat = math.degrees(math.asin(math.sin(incl) * math.sin(phase)))
+    lon = math.degrees(math.atan2(math.cos(incl) * math.sin(phase), math.cos(phase)))
+    ## earth rotation
+    lon = (lon - timestamp / 240.0 + 540.0) % 360.0 - 180.0
+    return {
+        'name': 'sat-%d' % norad_id,
+        'id': norad_id,
+        'latitude': round(lat, 6),
+        'longitude': round(lon, 6),
+        'altitude': ALTITUDE,
+        'velocity': VELOCITY,
+        'visibility': 'daylight',
+        'footprint': 4500.0,
+        'timestamp': int(timestamp),
+        'daynum': julian_date(timestamp),
+        'solar_lat': -15.8,
+        'solar_lon': 348.5,
+        'units': 'kilometers',
+    }
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        ## positions are computed at the arrival of the request, like the real API
+        now = time.time()
+        server = self.server
+        server.count += 1
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        if random.random() < server.error_rate:
+            server.errors += 1
+            if random.random() < 0.5:
+                return self._send(429, {'error': 'too many requests'}, {'Retry-After': str(server.retry_after)})
+            return self._send(500, {'error': 'internal error'})
+
+        if parts[:2] != ['v1', 'satellites']:
+            return self._send(404, {'error': 'not found'})
+
+        if len(parts) == 2:
+            return self._send(200, [{'name': 'sat-%d' % i, 'id': i} for i in server.catalog])
+
+        try:
+            norad_id = int(parts[2])
+        except ValueError:
+            return self._send(404, {'error': 'satellite not found'})
+
+        if len(parts) == 3:
+            return self._send(200, position(norad_id, now))
+        if parts[3] == 'positions':
+            query = urllib.parse.parse_qs(url.query)
+            timestamps = query.get('timestamps', [''])[0].split(',')
+            try:
+                return self._send(200, [position(norad_id, float(t)) for t in timestamps if t])
+            except ValueError:
+                return self._send(400, {'error': 'invalid timestamps'})
+        if parts[3] == 'tles':
+            return self._send(200, {'requested_timestamp': int(now), 'tle_timestamp': int(now),
+                                    'id': str(norad_id), 'name': 'sat-%d' % norad_id,
+                                    'header': 'SAT-%d' % norad_id, 'line1': TLE_LINE1, 'line2': TLE_LINE2})
+        return self._send(404, {'error': 'not found'})
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    '''The stand-in API server.
+
+    latency: fixed delay in seconds added to every response
+    jitter: additional uniformly distributed delay in seconds
+    error_rate: fraction of the requests answered with a 429 or 500 error
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, jitter=0.0, error_rate=0.0,
+                 retry_after=1, catalog=(25544,)):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.catalog = list(catalog)
+        self.count = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        return 'http://%s:%d/v1/satellites' % self.server_address[:2]
+
+    def start(self):
+        '''Serve from a background thread.'''
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stand-in for the wheretheiss API')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='fixed delay of a response in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random additional delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 429 or 500')
+    args = parser.parse_args()
+
+    server = StandInServer(('127.0.0.1', args.port), args.latency, args.jitter, args.error_rate)
+    print(f"Serving {server.url}")
+    server.serve_forever()
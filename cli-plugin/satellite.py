@@ -3,7 +3,10 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 ###########################################################################
-# Description: CLI plugin for the command 'show satellite'
+# Description: CLI plugin for the commands 'show satellite',
+#              'show satellite track', 'show satellite passes',
+#              'show satellite nearby', 'show satellite statistics'
+#              and 'show satellite watch'
 ###########################################################################
 
 from srlinux.mgmt.cli import CliPlugin
@@ -16,7 +19,24 @@ from srlinux.data import ColumnFormatter, TagValueFormatter, TagValueWithKeyLine
 from srlinux.data import Border, Borders, Data, Indent, Header, Whiteline, Footer, Alignment
 from srlinux.syntax.value_checkers import IntegerValueInRangeChecker
 from srlinux.data.utilities import Percentage
+import sys
 import json
+import time
+import zlib
+import base64
+import datetime
+
+## Leaves copied from the state to draw the world map
+MAP_FIELDS = ['Name','ID','Timestamp','Latitude','Longitude','Altitude','Velocity','Visibility','Footprint','Daynum','Solar-lat','Solar-lon','Units','Restored','Age']
+
+## Styles of the world map: the hand drawn ascii map or a DotMap
+MAP_STYLES = ['ascii', 'braille', 'half-block']
+
+## Field projections of 'show satellite <norad-id> fields <projection>', the only leaves copied
+PROJECTIONS = {
+    'position': ['Name','Timestamp','Latitude','Longitude','Altitude','Velocity'],
+    'summary': ['Name','Timestamp','Latitude','Longitude','Visibility','Estimated','Age'],
+}
 
 class Plugin(CliPlugin):
 
@@ -25,27 +45,148 @@ class Plugin(CliPlugin):
     In: cli, the root node of the CLI command hierachy
     '''
     def load(self, cli, **_kwargs):
-        syntax = Syntax('satellite', help='Display all satellite statistics')
+        syntax = Syntax('satellite', help='Display all satellite statistics') \
+            .add_unnamed_argument('norad-id', default='*',
+                                  help='NORAD id of a tracked satellite, the satellite of the container with the fleet by default',
+                                  suggestions=KeyCompleter(path='/satellite/satellite[norad-id=*]')) \
+            .add_named_argument('fields', default='all', choices=['all'] + sorted(PROJECTIONS),
+                                help='all: the world map, position or summary: a table of these leaves only') \
+            .add_named_argument('map', default='ascii', choices=MAP_STYLES,
+                                help='ascii: the fixed size map, braille or half-block: a map as wide as the terminal with 8 or 2 dots per character')
 
         print("Loading CLI:", syntax)
 
-        cli.show_mode.add_command(
+        satellite = cli.show_mode.add_command(
                 syntax,
                 update_location=False,
                 callback=self._print,
                 schema=self._my_schema()
                 )
 
+        satellite.add_command(
+                Syntax('track', help='Display the recent ground track of the satellite')
+                    .add_unnamed_argument('norad-id', default='*',
+                                          help='NORAD id of a tracked satellite, the satellite of the container with the fleet by default',
+                                          suggestions=KeyCompleter(path='/satellite/satellite[norad-id=*]'))
+                    .add_named_argument('map', default='ascii', choices=MAP_STYLES,
+                                        help='ascii: the fixed size map, braille or half-block: a map as wide as the terminal with 8 or 2 dots per character'),
+                update_location=False,
+                callback=self._print_track,
+                schema=self._my_schema(track=True)
+                )
+
+        satellite.add_command(
+                Syntax('passes', help='Display the upcoming passes of the satellites over the site')
+                    .add_unnamed_argument('norad-id', default='*',
+                                          help='NORAD id of a tracked satellite, all of them by default',
+                                          suggestions=KeyCompleter(path='/satellite/satellite[norad-id=*]')),
+                update_location=False,
+                callback=self._print_passes,
+                schema=self._passes_schema()
+                )
+
+        satellite.add_command(
+                Syntax('nearby', help='Display the satellites near the site or in view, and the satellites close to each other'),
+                update_location=False,
+                callback=self._print_nearby,
+                schema=self._nearby_schema()
+                )
+
+        satellite.add_command(
+                Syntax('statistics', help='Display the latency and errors of every stage of the agent'),
+                update_location=False,
+                callback=self._print_statistics,
+                schema=self._statistics_schema()
+                )
+
+        satellite.add_command(
+                Syntax('watch', help='Display the world map and refresh it until Ctrl-C')
+                    .add_named_argument('interval', default='1',
+                                        help='Seconds between two refreshes',
+                                        value_checker=IntegerValueInRangeChecker(1, 3600))
+                    .add_named_argument('count', default='0',
+                                        help='Number of refreshes, 0 refreshes until Ctrl-C',
+                                        value_checker=IntegerValueInRangeChecker(0, 1000000)),
+                update_location=False,
+                callback=self._watch,
+                schema=self._my_schema()
+                )
+
     '''
     _my_schema() method: contruct schema for this CLI command
+    In: track, include the ground track history
     Return: schema object
     '''
-    def _my_schema(self):
+    def _my_schema(self, track=False):
         root = FixedSchemaRoot()
 
         satellite = root.add_child(
                 'satellite',
-                fields=['Name','ID','Timestamp','Latitude','Longitude','Altitude','Velocity','Visibility','Footprint','Daynum','Solar-lat','Solar-lon','Units'])
+                fields=MAP_FIELDS)
+
+        ## the other satellites of the fleet, drawn on the same map
+        satellite.add_child(
+                'fleet',
+                key='Norad-id',
+                fields=['Name','Latitude','Longitude'])
+
+        if track:
+            satellite.add_child(
+                    'track',
+                    key='Index',
+                    fields=['Timestamp','Latitude','Longitude','Altitude','Velocity'])
+
+        return root
+
+    '''
+    _passes_schema() method: contruct schema for 'show satellite passes'
+    Return: schema object
+    '''
+    def _passes_schema(self):
+        root = FixedSchemaRoot()
+
+        satellite = root.add_child(
+                'satellite',
+                key='Norad-id',
+                fields=['Name'])
+
+        satellite.add_child(
+                'passes',
+                key='Index',
+                fields=['AOS','LOS','Duration','Max-elevation','Max-elevation-time','AOS-azimuth','LOS-azimuth','Sunlit'])
+
+        return root
+
+    '''
+    _nearby_schema() method: contruct schema for 'show satellite nearby'
+    Return: schema object
+    '''
+    def _nearby_schema(self):
+        root = FixedSchemaRoot()
+
+        root.add_child(
+                'satellite',
+                key='Norad-id',
+                fields=['Name','Distance','Elevation','Azimuth','In-view'])
+
+        root.add_child(
+                'pair',
+                key='Pair',
+                fields=['Norad-id','Other-norad-id','Distance'])
+
+        return root
+
+    '''
+    _statistics_schema() method: contruct schema for 'show satellite statistics'
+    Return: schema object
+    '''
+    def _statistics_schema(self):
+        root = FixedSchemaRoot()
+
+        root.add_child(
+                'stage',
+                key='Stage',
+                fields=['Count','Rate','P50','P99','Max','Errors','Error-types'])
 
         return root
 
@@ -55,10 +196,10 @@ class Plugin(CliPlugin):
     In: arguments, the CLI command's context
     Return: copy of a section of the state datastore
     '''
-    def _fetch_state(self, state, arguments):
+    def _fetch_state(self, state, arguments, path):
         ## build a YANG path objects from the path string
-        ## retrieve the interface name from the arguments
-        path = build_path('/satellite')
+        ## only the subtree of the command is read
+        path = build_path(path)
 
         ## fetch the value of the YANG path recursively
         ## this will return everythin under the given interface
@@ -66,33 +207,208 @@ class Plugin(CliPlugin):
 
         return data
 
+    '''
+    _fetch_satellites() method: read the leaves of the tracked satellites
+    Non-recursive reads of the satellite container and of the matching entries of
+    the satellite list, their ground tracks, passes and statistics are not read
+    In: norad_id, NORAD id of a satellite, '*' for all of them
+    Return: list of (NORAD id, satellite) pairs, the satellite of the container first
+    '''
+    def _fetch_satellites(self, state, norad_id='*'):
+        path = build_path(f'/satellite/satellite[norad-id={norad_id}]')
+        entries = state.server_data_store.get_data(path, recursive=False)
+        satellites = [(str(member.norad_id), member)
+                      for container in entries.satellite.items()
+                      for member in container.satellite.items()]
+
+        ## the satellite of the container is only read when it can match
+        if norad_id == '*' or not satellites:
+            data = state.server_data_store.get_data(build_path('/satellite'), recursive=False)
+            for satellite in data.satellite.items():
+                key = str(satellite.id)
+                if satellite.id and norad_id in ('*', key) and all(key != k for k, _ in satellites):
+                    satellites.insert(0, (key, satellite))
+
+        return satellites
 
     '''
-    _populate_schema() method: fill in schema from state datastore
-    In: state_datastore, state datastore extract
-    In: arguments, the CLI commands context
-    Return: filled-in schema
+    _fetch_children() method: read one list of the tracked satellites, e.g. their ground tracks
+    Keyed reads of only that list under the matching entries of the satellite list, and under
+    the satellite container unless its satellite is one of these entries
+    In: norad_id, NORAD id of a satellite, '*' for all of them
+    In: child, name of the list
+    Return: dict of NORAD id on the entries of the list
     '''
-    def _populate_schema(self, state_datastore, arguments):
-        #retrieve the schema from the input arguments
+    def _fetch_children(self, state, norad_id, child):
+        path = build_path(f'/satellite/satellite[norad-id={norad_id}]/{child}')
+        entries = state.server_data_store.get_data(path, recursive=True)
+        children = {str(member.norad_id): list(getattr(member, child).items())
+                    for container in entries.satellite.items()
+                    for member in container.satellite.items()}
+
+        if norad_id == '*' or norad_id not in children:
+            data = state.server_data_store.get_data(build_path('/satellite'), recursive=False)
+            keys = [str(satellite.id) for satellite in data.satellite.items() if satellite.id]
+            if keys and norad_id in ('*', keys[0]) and keys[0] not in children:
+                data = state.server_data_store.get_data(build_path(f'/satellite/{child}'), recursive=True)
+                children[keys[0]] = [entry for satellite in data.satellite.items()
+                                     for entry in getattr(satellite, child).items()]
+
+        return children
+
+    '''
+    _populate_map() method: fill in the world map schema with the leaves it draws
+    In: norad_id, '*' draws the satellite of the container with the fleet, a NORAD id
+        draws that satellite alone
+    Return: filled-in schema and its satellite entry, None when there is no such satellite
+    '''
+    def _populate_map(self, state, arguments, norad_id='*'):
         schema = Data(arguments.schema)
+        satellites = self._fetch_satellites(state, norad_id)
 
-        #populate it with the relevant data from the state datastore
-        for satellite in state_datastore.satellite.items():
+        node = None
+        for _, satellite in satellites[:1]:
             node = schema.satellite.create()
+            for field in MAP_FIELDS:
+                _copy_leaf(satellite, node, field)
+
+            if norad_id == '*':
+                for key, member in satellites[1:]:
+                    if key != str(satellite.id):
+                        fleet = node.fleet.create(member.norad_id)
+                        fleet.name = member.name
+                        fleet.latitude = member.latitude
+                        fleet.longitude = member.longitude
+
+        return schema, node
+
+    '''
+    _populate_missing() method: add the empty satellite entry of a map without satellite
+    It is drawn as the lost connection frame, or as not tracked when a NORAD id was asked
+    Return: the empty satellite entry
+    '''
+    def _populate_missing(self, schema, norad_id='*'):
+        node = schema.satellite.create()
+        if norad_id != '*':
+            node.id = norad_id
+        return node
+
+    '''
+    _projection_schema() method: contruct the table schema of a field projection
+    In: fields, name of the projection in PROJECTIONS
+    Return: schema object
+    '''
+    def _projection_schema(self, fields):
+        root = FixedSchemaRoot()
+
+        root.add_child(
+                'satellite',
+                key='Norad-id',
+                fields=PROJECTIONS[fields])
+
+        return root
+
+    '''
+    _populate_projection() method: fill in the table of a field projection
+    Only the leaves of the projection are copied, one row per satellite
+    '''
+    def _populate_projection(self, state, norad_id, fields):
+        schema = Data(self._projection_schema(fields))
+
+        for key, satellite in self._fetch_satellites(state, norad_id):
+            node = schema.satellite.create(key)
+            for field in PROJECTIONS[fields]:
+                _copy_leaf(satellite, node, field)
+
+        return schema
+
+    '''
+    _populate_track() method: fill in the world map schema and the ground track of the satellite
+    Only the track of the drawn satellite is read, not those of the fleet
+    '''
+    def _populate_track(self, state, arguments, norad_id='*'):
+        schema, node = self._populate_map(state, arguments, norad_id)
+        if node is None:
+            self._populate_missing(schema, norad_id)
+            return schema
+
+        for point in self._fetch_children(state, str(node.id), 'track').get(str(node.id), []):
+            track = node.track.create(point.index)
+            track.timestamp = _date(point.timestamp)
+            track.latitude = point.latitude
+            track.longitude = point.longitude
+            track.altitude = point.altitude
+            track.velocity = point.velocity
+
+        return schema
+
+    '''
+    _populate_passes() method: fill in the passes schema from state datastore
+    The passes are predicted and cached by the agent, the CLI only reads them
+    '''
+    def _populate_passes(self, state, arguments, norad_id='*'):
+        schema = Data(arguments.schema)
+        passes = self._fetch_children(state, norad_id, 'passes')
+
+        for key, satellite in self._fetch_satellites(state, norad_id):
+            node = schema.satellite.create(key)
             node.name = satellite.name
-            node.id = satellite.id
-            node.timestamp = satellite.timestamp
-            node.latitude = satellite.latitude
-            node.longitude = satellite.longitude
-            node.altitude = satellite.altitude
-            node.velocity = satellite.velocity
-            node.visibility = satellite.visibility
-            node.footprint = satellite.footprint
-            node.daynum = satellite.daynum
-            node.solar_lat = satellite.solar_lat
-            node.solar_lon = satellite.solar_lon
-            node.units = satellite.units
+            for p in passes.get(key, []):
+                entry = node.passes.create(p.index)
+                entry.aos = p.aos
+                entry.los = p.los
+                entry.duration = p.duration
+                entry.max_elevation = p.max_elevation
+                entry.max_elevation_time = p.max_elevation_time
+                entry.aos_azimuth = p.aos_azimuth
+                entry.los_azimuth = p.los_azimuth
+                entry.sunlit = p.sunlit
+
+        return schema
+
+    '''
+    _populate_nearby() method: fill in the nearby schema from state datastore
+    The queries are answered by the spatial index of the agent, the CLI only reads them
+    '''
+    def _populate_nearby(self, state_datastore, arguments):
+        schema = Data(arguments.schema)
+
+        for satellite in state_datastore.satellite.items():
+            for nearby in satellite.nearby.items():
+                for entry in nearby.satellite.items():
+                    node = schema.satellite.create(entry.norad_id)
+                    node.name = entry.name
+                    node.distance = entry.distance
+                    node.elevation = entry.elevation
+                    node.azimuth = entry.azimuth
+                    node.in_view = entry.in_view
+
+                for pair in nearby.pair.items():
+                    node = schema.pair.create(pair.name)
+                    node.norad_id = pair.norad_id
+                    node.other_norad_id = pair.other_norad_id
+                    node.distance = pair.distance
+
+        return schema
+
+    '''
+    _populate_statistics() method: fill in the statistics schema from state datastore
+    Durations are in milliseconds, the rate in runs per second
+    '''
+    def _populate_statistics(self, state_datastore, arguments):
+        schema = Data(arguments.schema)
+
+        for satellite in state_datastore.satellite.items():
+            for statistics in satellite.statistics.items():
+                for stage in statistics.stage.items():
+                    node = schema.stage.create(stage.name)
+                    node.count = stage.count
+                    node.rate = stage.rate
+                    node.p50 = stage.p50
+                    node.p99 = stage.p99
+                    node.max = stage.max
+                    node.errors = stage.errors
+                    node.error_types = ', '.join(f"{error.type}: {error.count}" for error in stage.error.items())
 
         return schema
 
@@ -100,9 +416,9 @@ class Plugin(CliPlugin):
     _set_formatters() method
     In: schema, schema to augment with formatters
     '''
-    def _set_formatters(self, schema):
+    def _set_formatters(self, schema, track=False, style='ascii'):
         #schema.set_formatter('/satellite',Border(TagValueFormatter(), Border.Above | Border.Below))
-        schema.set_formatter('/satellite',Border(WorldMapFormatter(), Border.Above | Border.Below, '='))
+        schema.set_formatter('/satellite',Border(WorldMapFormatter(track=track, style=style), Border.Above | Border.Below, '='))
 
 
     '''
@@ -112,19 +428,105 @@ class Plugin(CliPlugin):
     In: output: the CLI output object
     '''
     def _print(self, state, arguments, output, **_kwargs):
-        state_datastore = self._fetch_state(state, arguments)
+        norad_id = arguments.get('norad-id')
+        fields = arguments.get('fields')
 
-        #print('child_names', *state_datastore.child_names)
-        #for child in state_datastore.iter_children():
-        #    if 'satellite' in str(child):
-        #        print("child", child)
-        #        for field, value in zip(child.field_names, child.field_values):
-        #            print(f"    {field} = {value}")
+        if fields in PROJECTIONS:
+            schema = self._populate_projection(state, norad_id, fields)
+            schema.set_formatter('/satellite', Border(ColumnFormatter(), Border.Above | Border.Below))
+        else:
+            schema, node = self._populate_map(state, arguments, norad_id)
+            if node is None:
+                self._populate_missing(schema, norad_id)
+            self._set_formatters(schema, style=arguments.get('map'))
+        output.print_data(schema)
 
-        schema = self._populate_schema(state_datastore, arguments)
-        self._set_formatters(schema)
+    '''
+    _print_track() method: the callback function of 'show satellite track'
+    Draws the ground track history on the world map
+    '''
+    def _print_track(self, state, arguments, output, **_kwargs):
+        schema = self._populate_track(state, arguments, arguments.get('norad-id'))
+        self._set_formatters(schema, track=True, style=arguments.get('map'))
+        output.print_data(schema)
+
+    '''
+    _print_passes() method: the callback function of 'show satellite passes'
+    Lists the upcoming passes over the site as a table per satellite
+    '''
+    def _print_passes(self, state, arguments, output, **_kwargs):
+        schema = self._populate_passes(state, arguments, arguments.get('norad-id'))
+        schema.set_formatter('/satellite', TagValueWithKeyLineFormatter())
+        schema.set_formatter('/satellite/passes', Border(ColumnFormatter(), Border.Above | Border.Below))
+        output.print_data(schema)
+
+    '''
+    _print_nearby() method: the callback function of 'show satellite nearby'
+    Lists the satellites near the site and the close pairs as tables, distances in km
+    '''
+    def _print_nearby(self, state, arguments, output, **_kwargs):
+        state_datastore = self._fetch_state(state, arguments, '/satellite/nearby')
+        schema = self._populate_nearby(state_datastore, arguments)
+        schema.set_formatter('/satellite', Border(ColumnFormatter(), Border.Above | Border.Below))
+        schema.set_formatter('/pair', Border(ColumnFormatter(), Border.Above | Border.Below))
         output.print_data(schema)
 
+    '''
+    _print_statistics() method: the callback function of 'show satellite statistics'
+    Lists the statistics of every stage as a table
+    '''
+    def _print_statistics(self, state, arguments, output, **_kwargs):
+        state_datastore = self._fetch_state(state, arguments, '/satellite/statistics')
+        schema = self._populate_statistics(state_datastore, arguments)
+        schema.set_formatter('/stage', Border(ColumnFormatter(), Border.Above | Border.Below))
+        output.print_data(schema)
+
+    '''
+    _watch() method: the callback function of 'show satellite watch'
+    Polls the state every interval seconds and redraws only the map cells and
+    panel rows that changed, with cursor addressed ANSI sequences written to the
+    terminal directly, until count refreshes or Ctrl-C
+    '''
+    def _watch(self, state, arguments, output, **_kwargs):
+        interval = int(arguments.get('interval'))
+        count = int(arguments.get('count'))
+        formatter = WorldMapFormatter()
+        screen = WatchScreen(formatter, sys.stdout)
+        refreshes = 0
+        try:
+            while True:
+                started = time.monotonic()
+                schema, node = self._populate_map(state, arguments)
+                if node is None:
+                    ## no state published yet, drawn as the lost connection frame
+                    node = self._populate_missing(schema)
+                screen.draw(*formatter.frame(node))
+
+                refreshes += 1
+                if count and refreshes >= count:
+                    break
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            screen.close()
+
+'''
+_date() function: format a timestamp of the state (seconds since the epoch)
+'''
+def _date(timestamp):
+    if timestamp is None:
+        return None
+    return str(datetime.datetime.fromtimestamp(int(timestamp)))
+
+'''
+_copy_leaf() function: copy the leaf of a schema field from the state to a schema node
+'''
+def _copy_leaf(satellite, node, field):
+    leaf = field.lower().replace('-', '_')
+    value = getattr(satellite, leaf)
+    setattr(node, leaf, _date(value) if leaf == 'timestamp' else value)
+
 ######################################################################
 #
 # Custom formatter 'WorldMapFormatter'
@@ -159,30 +561,120 @@ class WorldMapFormatter(Formatter):
         "|                    /__/\/                                             |",
         "|                                                                       |"]
 
-    def __init__(self):
+    ## Immutable base map, every row is joined once when the plugin loads
+    base_rows = tuple(line.strip() for line in worldmap_list)
+
+    ## Rendered rows keyed by (row, markers on that row), shared by all
+    ## formatters so repeated commands reuse the rows of unchanged markers
+    row_cache = {}
+    row_cache_size = 1024
+    ## Map cell of every (latitude, longitude) leaf pair: between two frames
+    ## only the current positions and the newest track point are converted
+    cell_cache = {}
+    cell_cache_size = 16384
+
+    ## Glyphs (ANSI escape codes to print color)
+    current_glyph = '\033[5;92m#\033[00m'
+    track_glyph = '\033[92m.\033[00m'
+    fleet_glyphs = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+    ## Columns left to the side panel next to a DotMap
+    panel_width = 60
+
+    def __init__(self, track=False, style='ascii'):
         self.width = 73
         self.height = 25
-
-        self.worldmap = [list(line.strip()) for line in self.worldmap_list]
+        self.track = track
+        self.style = style
 
     def _map_coordinates(self, x, in_min, in_max, out_min, out_max):
         return round((x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min)
 
-
-    def iter_format(self, entry, max_width):
+    def _cell(self, latitude, longitude):
+        ## Convert lat. and lon. into 2D coordinates on the worldmap
+        key = (latitude, longitude)
+        cell = self.cell_cache.get(key)
+        if cell is None:
+            y = self._map_coordinates(float(latitude),90,-90,0,self.height-1)
+            x = self._map_coordinates(float(longitude),-180,180,0,self.width-1)
+            cell = (y, x)
+            if len(self.cell_cache) >= self.cell_cache_size:
+                self.cell_cache.clear()
+            self.cell_cache[key] = cell
+        return cell
+
+    def _render_row(self, y, cells):
+        key = (y, cells)
+        line = self.row_cache.get(key)
+        if line is None:
+            base = self.base_rows[y]
+            parts = []
+            prev = 0
+            for x, glyph in cells:
+                parts.append(base[prev:x])
+                parts.append(glyph)
+                prev = x + 1
+            parts.append(base[prev:])
+            line = "".join(parts)
+
+            if len(self.row_cache) >= self.row_cache_size:
+                self.row_cache.clear()
+            self.row_cache[key] = line
+        return line
+
+    def render(self, markers, panel):
+        '''Yield the rows of the map with markers and a side panel.
+
+        markers: iterable of (latitude, longitude, glyph), later markers
+        are drawn over earlier ones in the same cell
+        panel: dict of row number on the text printed next to that row
+        '''
+        rows = {}
+        cell = self._cell
+        for latitude, longitude, glyph in markers:
+            y, x = cell(latitude, longitude)
+            row = rows.get(y)
+            if row is None:
+                row = rows[y] = {}
+            row[x] = glyph
+
+        for y, base in enumerate(self.base_rows):
+            cells = rows.get(y)
+            line = self._render_row(y, tuple(sorted(cells.items()))) if cells else base
+            text = panel.get(y)
+            yield line + text if text else line
+
+    def _restored(self, entry):
+        ## samples restored after a restart of the agent are flagged with their age
+        if str(entry.restored).lower() == 'true':
+            return f" (restored, {entry.age} s old)"
+        return ""
+
+    def frame(self, entry):
+        '''Return the markers and the side panel of a satellite entry, as
+        taken by render().'''
         if entry.name:
-            ## Convert lat. and lon. into 2D coordinates on the worldmap
-            lat = self._map_coordinates(float(entry.latitude),90,-90,0,self.height-1)
-            lon = self._map_coordinates(float(entry.longitude),-180,180,0,self.width-1)
+            markers = []
+            panel = {}
 
-            self.worldmap[lat][lon] = '\033[5;92m#\033[00m' ## Using ANSI escape codes to print color
+            ## Draw the ground track history below the current position
+            points = list(entry.track.items()) if self.track else []
+            for point in points:
+                markers.append((point.latitude, point.longitude, self.track_glyph))
 
+            ## Draw the other tracked satellites, labelled with a letter
+            fleet = [s for s in entry.fleet.items() if s.name and str(s.norad_id) != str(entry.id)]
+            for glyph, satellite in zip(self.fleet_glyphs, fleet):
+                markers.append((satellite.latitude, satellite.longitude, f"\033[93m{glyph}\033[00m"))
+                row = 16 + self.fleet_glyphs.index(glyph)
+                if row < self.height - 1:
+                    panel[row] = f"\t\033[93m{glyph}\033[00m {satellite.norad_id:>8} : {satellite.name} ({satellite.latitude}, {satellite.longitude})"
 
-            position = [1,2,3,4,5,6,7,8,9,10,11,12,13,14]
+            markers.append((entry.latitude, entry.longitude, self.current_glyph))
 
             data = [f"\tName        : {entry.name}",
                     f"\tId          : {entry.id}",
-                    f"\tTimestamp   : {entry.timestamp}",
+                    f"\tTimestamp   : {entry.timestamp}{self._restored(entry)}",
                     f"\tLatitude    : {entry.latitude}",
                     f"\tLongitude   : {entry.longitude}",
                     f"\tAltitude    : {entry.altitude}",
@@ -195,21 +687,256 @@ class WorldMapFormatter(Formatter):
                     f"\tUnits       : {entry.units}",
                     f"\tCharacter   : \033[92m'#'\033[00m"]
 
-            for i, row in enumerate(self.worldmap):
-                if i in position:
-                    line = "".join(row) + data[position.index(i)]
-                else:
-                    line = "".join(row)
-                yield line
-        else:
-            position = [1,2]
+            if self.track:
+                data.append(f"\tTrack       : {len(points)} samples \033[92m'.'\033[00m")
 
+            panel.update(enumerate(data, start=1))
+            return markers, panel
+        elif entry.id:
+            data = [f"\tSatellite {entry.id} is not tracked",
+                    f"\tAdd it to the satellite list to see it here"]
+
+            return [], dict(enumerate(data, start=1))
+        else:
             data = [f"\tWe have lost connection to the space station",
                     f"\tPlease contact your local astronaut!"]
 
-            for i, row in enumerate(self.worldmap):
-                if i in position:
-                    line = "".join(row) + data[position.index(i)]
-                else:
-                    line = "".join(row)
-                yield line
+            return [], dict(enumerate(data, start=1))
+
+    def _render_dots(self, markers, panel, max_width):
+        ## the ground track is drawn as dots, the other markers replace their cell
+        dotmap = DotMap.get(self.style, (max_width or 120) - self.panel_width)
+        points = [(m[0], m[1]) for m in markers if m[2] == self.track_glyph]
+        glyphs = [m for m in markers if m[2] != self.track_glyph]
+        rows = list(dotmap.render(points, glyphs))
+
+        blank = ' ' * dotmap.columns
+        for y in range(max(len(rows), max(panel, default=0) + 1)):
+            line = rows[y] if y < len(rows) else blank
+            text = panel.get(y)
+            yield line + text if text else line
+
+    def iter_format(self, entry, max_width):
+        if self.style == 'ascii':
+            yield from self.render(*self.frame(entry))
+        else:
+            yield from self._render_dots(*self.frame(entry), max_width)
+
+######################################################################
+#
+# High resolution world map 'DotMap'
+#
+######################################################################
+## Land mask of the earth: 360 x 180 bits of 1 degree from 90N 180W, row
+## by row, most significant bit first, zlib compressed and base64 encoded.
+## Rasterized from simplified outlines of the continents and large islands
+LAND_MASK = (
+    "eNrtmbFuHDcQhklTyLq4aBWkUWFolcrtAWkUQNG6zFvEbxCpUyGYCziAXbjIGyQPkoIBArgJ"
+    "oDadGahwSgZqVjC9DHm7XA7J4eouSRNAhARJd5/I4T/DmVkeIQ/jPxhtb7+NkduwzJgPxo2t"
+    "JjbT2Ab2rOnsH43eHqZG3Qe/H2Fh/+Bifv1w0ezAMbtIVZSn9TaP48ytYfoC3ERqsN5NvCXc"
+    "SDexyYXpLUhIbdkhGNXxccvJ3FzbBVUCD0HOadf1sHH1YL/dP/hV21j7aYrNr8xZ2hoXH+Mc"
+    "zHmF/mLgkIJ6r1EjjGB+4tq9xE08egbMahX1EWoF7002XgGYa+qFM/fBf1iJ7FetXSC9G24z"
+    "9tHoh824cbAi1cZvdT6vIWAXkinCrcnPnJ5tzg6Emijo22l/mi/D2gVkIyaHInAPYMnMGMEb"
+    "OLP5nfMW7yezR6/5UGGpDa2bxu6q8RZN0UXJV+nMgnD3TiUmU+yPKXKZeNQncEc2kbTywSSp"
+    "j04m9iVPJZ6PwPjO7GsLk1S1ALeTB6ezevi8rmJYu6MEj5659efh9LxJhTtOYePj8+vcJT+R"
+    "WdZ5639Op9fk8DMPzxb+Pur8EoHzpPhzstISrF4kCXUJli+g7lDnYwROiwDQOYMFkPJtG4Vy"
+    "Dncz3JjvIazWGewXq5ubaxNJIk+KcDPQG0MqGEfnGewts6XqwlSvCvsjyf4UeXIXiyEyuAvw"
+    "6gZafBXBPIUfX8ADeEW7DIa15CLSIoLbCGYv7Y7OgEtO6i6tUgFuhiia1JpDNWoDK09lYlh+"
+    "oZNeA6hZOxhkTMWgGOM7CuxAHEcwyWAJYA2TXY80G5IUwjmtx9/aV2L4g/mrBH9n1zqPnH9X"
+    "hp/a7a3hBszHUNtSmz+3Fq+hjkYb7SM67ZeohQ8ieODDZ8k59uMxD69UHj6ZtP41gfdaSZLM"
+    "1xrfb7zOWik5J9UJtsFlQ3fA2h4L13EC/tHO/NRJohD4cqqBHr62cGVbhQHpu9QlOYrMuN60"
+    "QV2LdKWuneIR/NY6ozJoCwta1dp3FIqwgbTDpvolRqukwtzaPMK0a7NWiB0JfGc2DSYz3Qpp"
+    "iRP4Y+/hT3K4TmHrU6oczBA9EtjpO8LY00Sis222NnCLtcO04zqqim5qReg+2jyLKc0wAFu7"
+    "90iorlHCA8dqjLZvrHWEihz+1KdzAK9sD0SYwDw+uRz049YfgmByUB/njeLhUB9IzIqNreOB"
+    "tEE/H+rV80rij23eASwc6v3zeht4eiZYN5gZVahuLNSj6geOwXUC+76NXxdgGeDpoFLJfyvA"
+    "OsD+7Kn2NdUobIKKPudctm9IHqYNSK8gd55Ub0ieaBpQ3wB8SPZJ06PwtCBItHs2F7MBtTmH"
+    "nbeZWYJ5gG3uQOAKh91Roe+7ZTgSgHVIIHmhW3PPYzoD0qUzH2PB750cw7THYeDBFXgAP0av"
+    "FlD4y36dwTyGj8Ib/Qn6PB9goYN9+hSN0QB3GsikUe0CHJ5MirDy5g8BruCdwH0wx251WAhM"
+    "V+UV1L/DYJHDVXz3ktvWAJhhDYqDNYAlhBUCqxnu42jsEVj+E7i+F67DpjNYL8AV2BEtzdzN"
+    "s8ldYFForgEc7ITHTaDwHFwwuVFjvS/zk9KHqh9ddTEMlsWUItNy3xZh6va73hImDj5NYFGC"
+    "G5LB/WIuPCz0geg4SNvi0nCtWWwjV0tw0nbw8sy2bau6bWHYUU6wWIKfJHC3w9X28sz/Ct7J"
+    "jF2u4892gY92gfd3gfcePhj5vw+2S0BXuwR0Xejf0Bx4lJTFnprk2q8U/TS5U07HFfZhU+kz"
+    "J43NWbhrqYbStWheCf1ldY3DOlFoWJjYl70q2kW9CINrSlmeeLSZxQJVSzBN1uIlWBbXfBgP"
+    "42/AK9KQ")
+
+class DotMap(object):
+    '''World map of columns x columns/4 terminal cells drawn with several
+    dots per cell: 2 x 4 with braille glyphs, 1 x 2 with half-block glyphs.
+
+    The coastline of the land mask, the base rows and the tables of the cell
+    and dot of every latitude and longitude (in tenths of degrees) are built
+    once per style and size.  Plotting a point is then two table lookups, and
+    only the rows with points or markers are rendered again.
+    '''
+
+    ## Dots per cell horizontally and vertically, glyph of every set of dots
+    styles = {
+        'braille': (2, 4, ''.join(chr(0x2800 + bits) for bits in range(256))),
+        'half-block': (1, 2, ' \u2580\u2584\u2588'),
+    }
+    ## Bit of every dot of a cell, by row then column
+    dot_bits = {
+        'braille': ((0x01, 0x08), (0x02, 0x10), (0x04, 0x20), (0x40, 0x80)),
+        'half-block': ((0x1,), (0x2,)),
+    }
+
+    ## DotMaps keyed by (style, columns), shared by all formatters
+    cache = {}
+    cache_size = 8
+    land = None
+
+    min_columns = 40
+    max_columns = 400
+
+    @classmethod
+    def get(cls, style, columns):
+        columns = min(max(columns, cls.min_columns), cls.max_columns)
+        key = (style, columns)
+        dotmap = cls.cache.get(key)
+        if dotmap is None:
+            if len(cls.cache) >= cls.cache_size:
+                cls.cache.clear()
+            dotmap = cls.cache[key] = cls(style, columns)
+        return dotmap
+
+    @classmethod
+    def _land(cls):
+        if cls.land is None:
+            cls.land = zlib.decompress(base64.b64decode(''.join(LAND_MASK)))
+        return cls.land
+
+    def __init__(self, style, columns):
+        dx, dy, self.glyphs = self.styles[style]
+        self.bits = self.dot_bits[style]
+        self.columns = columns
+        self.rows = max(1, columns // 4)
+        width, height = columns * dx, self.rows * dy
+
+        ## (cell, dot in the cell) of every tenth of degree
+        self.row_of = [divmod(min(i * height // 1800, height - 1), dy) for i in range(1801)]
+        self.column_of = [divmod(min(i * width // 3600, width - 1), dx) for i in range(3601)]
+
+        ## land dots, sampled from the mask at the center of every dot
+        land = self._land()
+        mask_x = [(x * 360 + 180) // width for x in range(width)]
+        dots = []
+        for y in range(height):
+            offset = ((y * 180 + 90) // height) * 45
+            dots.append([land[offset + (mx >> 3)] >> (7 - (mx & 7)) & 1 for mx in mask_x])
+
+        ## coastline: land dots next to a sea dot, the map wraps around east-west
+        self.base = [[0] * columns for _ in range(self.rows)]
+        for y in range(height):
+            above = dots[y - 1] if y else dots[y]
+            below = dots[y + 1] if y + 1 < height else dots[y]
+            row = dots[y]
+            cells = self.base[y // dy]
+            bits = self.bits[y % dy]
+            for x in range(width):
+                if row[x] and not (above[x] and below[x] and row[x - 1] and row[(x + 1) % width]):
+                    cells[x // dx] |= bits[x % dx]
+
+        self.base_rows = tuple(''.join(self.glyphs[bits] for bits in cells) for cells in self.base)
+
+    def render(self, points, markers, color='\033[92m'):
+        '''Yield the rows of the map.
+
+        points: iterable of (latitude, longitude) drawn as dots in color
+        markers: iterable of (latitude, longitude, glyph), every glyph
+        replaces the cell it falls in
+        '''
+        rows = {}
+        for latitude, longitude in points:
+            y, dot_y = self.row_of[int((90.0 - float(latitude)) * 10)]
+            x, dot_x = self.column_of[int((float(longitude) + 180.0) * 10)]
+            cells = rows.setdefault(y, {})
+            cells[x] = cells.get(x, 0) | self.bits[dot_y][dot_x]
+
+        glyphs = {}
+        for latitude, longitude, glyph in markers:
+            y = self.row_of[int((90.0 - float(latitude)) * 10)][0]
+            x = self.column_of[int((float(longitude) + 180.0) * 10)][0]
+            glyphs.setdefault(y, {})[x] = glyph
+
+        for y, base in enumerate(self.base_rows):
+            if y not in rows and y not in glyphs:
+                yield base
+                continue
+            line = list(base)
+            for x, bits in rows.get(y, {}).items():
+                line[x] = f"{color}{self.glyphs[self.base[y][x] | bits]}\033[00m"
+            for x, glyph in glyphs.get(y, {}).items():
+                line[x] = glyph
+            yield ''.join(line)
+
+######################################################################
+#
+# Incremental redraw 'WatchScreen' of 'show satellite watch'
+#
+######################################################################
+class WatchScreen(object):
+    '''Keep the world map of the previous refresh on the terminal and
+    only rewrite what changed.
+
+    Every map cell that differs from the previous frame is rewritten after
+    moving the cursor to it with an ANSI cursor position sequence, runs of
+    adjacent changed cells in one write.  A side panel row is rewritten and
+    the rest of the line erased when its text changed.  An unchanged frame
+    writes nothing.
+    '''
+
+    def __init__(self, formatter, out):
+        self.formatter = formatter
+        self.out = out
+        self.cells = None
+        self.panel = {}
+        self.column = formatter.width + 3
+
+    def _cells(self, markers):
+        rows = [list(base) for base in self.formatter.base_rows]
+        for latitude, longitude, glyph in markers:
+            y, x = self.formatter._cell(latitude, longitude)
+            rows[y][x] = glyph
+        return rows
+
+    def draw(self, markers, panel):
+        '''Update the terminal to the frame of markers and panel, as taken
+        by WorldMapFormatter.render(), return the number of characters written.'''
+        cells = self._cells(markers)
+        panel = {y: text.lstrip('\t') for y, text in panel.items()}
+        parts = []
+        if self.cells is None:
+            ## first frame: hide the cursor, clear the screen, draw every cell
+            parts.append('\033[?25l\033[2J')
+            previous = [[None] * len(row) for row in cells]
+        else:
+            previous = self.cells
+
+        for y, row in enumerate(cells):
+            before = previous[y]
+            x = 0
+            while x < len(row):
+                if row[x] == before[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < len(row) and row[x] != before[x]:
+                    x += 1
+                parts.append(f"\033[{y + 1};{start + 1}H")
+                parts.extend(row[start:x])
+
+            text = panel.get(y, '')
+            if text != self.panel.get(y, ''):
+                parts.append(f"\033[{y + 1};{self.column}H{text}\033[K")
+
+        self.cells = cells
+        self.panel = panel
+        if parts:
+            self.out.write(''.join(parts))
+            self.out.flush()
+        return sum(len(part) for part in parts)
+
+    def close(self):
+        '''Leave the cursor below the map and show it again.'''
+        self.out.write(f"\033[{len(self.formatter.base_rows) + 1};1H\033[?25h\n")
+        self.out.flush()
@@ -1,5 +1,8 @@
 import os
+import queue
+import threading
 import socket as socket_module
+import concurrent.futures
 
 # Python doesn't expose the `setns()` function manually, so
 # we'll use the `ctypes` module to make it available.
@@ -47,6 +50,11 @@ def socket(nspath, *args):
         return socket_module.socket(*args)
 
 
+## Namespace of the calling thread, which may differ from the
+## namespace of the process (/proc/<pid>/ns/net)
+THREAD_NS_PATH = '/proc/thread-self/ns/net'
+
+
 def get_ns_path(nspath=None, nsname=None, nspid=None):
     '''Generate a filesystem path from a namespace name or pid.
 
@@ -69,14 +77,15 @@ def get_ns_path(nspath=None, nsname=None, nspid=None):
 class NetNS (object):
     '''A context manager for running code inside a network namespace.
 
-    This is a context manager that on enter assigns the current process
+    This is a context manager that on enter assigns the current thread
     to an alternate network namespace (specified by name, filesystem path,
-    or pid) and then re-assigns the process to its original network
-    namespace on exit.
+    or pid) and then re-assigns the thread to its original network
+    namespace on exit.  The original namespace is the one of the calling
+    thread, so NetNS can be nested inside a NetNSExecutor worker.
     '''
 
     def __init__(self, nsname=None, nspath=None, nspid=None):
-        self.mypath = get_ns_path(nspid=os.getpid())
+        self.mypath = get_ns_path(THREAD_NS_PATH)
         self.targetpath = get_ns_path(nspath,
                                       nsname=nsname,
                                       nspid=nspid)
@@ -95,3 +104,85 @@ class NetNS (object):
     def __exit__(self, *args):
         setns(self.myns, CLONE_NEWNET)
         self.myns.close()
+
+
+class NetNSExecutor (concurrent.futures.Executor):
+    '''An executor running work items inside a network namespace.
+
+    This is a pool of worker threads that enter the target namespace
+    (specified by name, filesystem path, or pid) once when they start and
+    stay there.  The namespace file is opened once and its file descriptor
+    is shared by all workers.  Work items submitted to the executor run
+    without any namespace switch, and the other threads of the process are
+    never moved to the target namespace.  submit() returns a
+    concurrent.futures.Future.
+    '''
+
+    def __init__(self, nsname=None, nspath=None, nspid=None, max_workers=4):
+        self.targetpath = get_ns_path(nspath,
+                                      nsname=nsname,
+                                      nspid=nspid)
+        self.nsfd = os.open(self.targetpath, os.O_RDONLY)
+        self.work_queue = queue.Queue()
+        self.shutdown_lock = threading.Lock()
+        self.is_shutdown = False
+        self.threads = []
+
+        ready = queue.Queue()
+        for i in range(max_workers):
+            thread = threading.Thread(target=self._worker, args=(ready,),
+                                      name='netns-%d' % i, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        # wait for all workers to enter the namespace
+        errors = [e for e in (ready.get() for _ in self.threads) if e]
+        if errors:
+            self.shutdown()
+            raise errors[0]
+
+    def _worker(self, ready):
+        try:
+            setns(self.nsfd, CLONE_NEWNET)
+        except OSError as e:
+            ready.put(e)
+            return
+        ready.put(None)
+
+        while True:
+            item = self.work_queue.get()
+            if item is None:
+                # wake up the next worker and exit
+                self.work_queue.put(None)
+                return
+
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def submit(self, fn, *args, **kwargs):
+        with self.shutdown_lock:
+            if self.is_shutdown:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+
+            future = concurrent.futures.Future()
+            self.work_queue.put((future, fn, args, kwargs))
+            return future
+
+    def shutdown(self, wait=True):
+        with self.shutdown_lock:
+            if self.is_shutdown:
+                return
+            self.is_shutdown = True
+            self.work_queue.put(None)
+
+        if wait:
+            for thread in self.threads:
+                thread.join()
+        os.close(self.nsfd)
@@ -0,0 +1,91 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Gap backfill
+## Silences in the samples of a satellite (outages, restarts
+## of the agent) are recorded as gaps, filled afterwards in
+## the background with many timestamps per request, so the
+## ground tracks stay continuous
+############################################################
+import collections
+
+import sources
+
+## A silence longer than GAP_FACTOR sample intervals is a gap
+GAP_FACTOR = 2.5
+## Seconds between two backfill requests
+INTERVAL = 5
+## Requests left in the rate limit of the API for the live samples, a
+## backfill request is only sent when more are available
+SPARE_REQUESTS = 1
+
+## A gap in the samples of a satellite: timestamps of the last sample
+## before and of the first sample after the silence, the sample interval
+Gap = collections.namedtuple('Gap', ['norad_id', 'start', 'end', 'interval'])
+
+
+class GapTracker(object):
+    '''Record the gaps in the samples of every satellite and hand out the
+    timestamps filling them.
+
+    sample() is called with every fetched sample.  next_batch() returns the
+    oldest gap with up to MAX_TIMESTAMPS of its missing timestamps, one
+    interval apart, newest first since the ground track only keeps the
+    most recent samples.  filled() removes them from the gap once their
+    positions are known, a failed batch is handed out again.
+    '''
+
+    def __init__(self):
+        self.last = {}
+        self.gaps = collections.deque()
+
+    def __len__(self):
+        return len(self.gaps)
+
+    def sample(self, norad_id, timestamp, interval, capacity):
+        '''Record a sample of norad_id, return the Gap it ends or None.
+
+        Only the last capacity samples of the gap are recorded, older ones
+        would not be kept in the ground track.
+        '''
+        last = self.last.get(norad_id)
+        if last is None or timestamp > last:
+            self.last[norad_id] = timestamp
+        if last is None or not capacity or timestamp - last <= GAP_FACTOR * interval:
+            return None
+        gap = Gap(norad_id, max(last, timestamp - (capacity + 1) * interval), timestamp, interval)
+        self.gaps.append(gap)
+        return gap
+
+    def seed(self, norad_id, timestamp):
+        '''Set the last sample of norad_id, e.g. restored from a snapshot, so
+        the downtime of the agent is a gap.'''
+        if timestamp > self.last.get(norad_id, 0):
+            self.last[norad_id] = timestamp
+
+    def forget(self, norad_id):
+        '''Drop the gaps of a satellite that is no longer tracked.'''
+        self.last.pop(norad_id, None)
+        self.gaps = collections.deque(gap for gap in self.gaps if gap.norad_id != norad_id)
+
+    def next_batch(self, limit=sources.MAX_TIMESTAMPS):
+        '''Return the Gap to fill and its next timestamps, or None.'''
+        while self.gaps:
+            gap = self.gaps[0]
+            timestamps = []
+            t = gap.end - gap.interval
+            while t > gap.start and len(timestamps) < limit:
+                timestamps.append(int(round(t)))
+                t -= gap.interval
+            if timestamps:
+                return gap, timestamps
+            self.gaps.popleft()
+        return None
+
+    def filled(self, gap, timestamps):
+        '''Remove the timestamps of a batch of gap from the gap.'''
+        if self.gaps and self.gaps[0] is gap:
+            self.gaps[0] = gap._replace(end=min(timestamps))
@@ -0,0 +1,205 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Configuration of the agent
+## The config notifications of a commit are parsed into a
+## new immutable Config, which is validated and swapped in
+## as a whole once the commit ends
+############################################################
+import collections
+
+import logs
+import history
+import policy
+import recording
+import sources
+
+## Sources of the positions
+MODES = ('api', 'propagate')
+
+## Location of the router: degrees, degrees, km, minimum elevation in degrees
+Site = collections.namedtuple('Site', ['latitude', 'longitude', 'altitude', 'min_elevation'])
+
+## Capture of the API responses: path of the file, maximum size in bytes
+Capture = collections.namedtuple('Capture', ['file', 'max_size'])
+
+## Publishing policy (see policy.PublishPolicy): policy, deadband in km and
+## degrees, minimum and maximum seconds between updates of a satellite
+Publish = collections.namedtuple('Publish', ['policy', 'distance', 'angle', 'min_interval', 'max_interval'])
+
+## Proximity queries of the spatial index: km from the site of the
+## satellites reported as nearby, km between satellites reported as pairs
+## (0 disables the pairs)
+Proximity = collections.namedtuple('Proximity', ['distance', 'separation'])
+
+## An entry of the 'source' list: name, type (see sources.TYPES), url or
+## path, None for the public endpoint of the type
+Source = collections.namedtuple('Source', ['name', 'type', 'url'])
+
+## Requests to the sources: seconds before a request is abandoned and
+## before a second source is asked (0 disables hedging)
+Fetch = collections.namedtuple('Fetch', ['deadline', 'hedge_delay'])
+
+## Logging of the agent: level (see logs.LEVELS), size in bytes at which
+## the log file is rotated
+Log = collections.namedtuple('Log', ['level', 'max_size'])
+
+## The 'satellite' container of satellite.yang
+## norad_id is the satellite of the flat container, norad_ids the entries
+## of the 'satellite' list, site and capture are None when not configured,
+## sources are the entries of the 'source' list in the order they were
+## created, DEFAULT_SOURCES when the list is empty
+Config = collections.namedtuple('Config', ['interval', 'norad_id', 'norad_ids', 'mode', 'tle_refresh',
+                                           'extrapolation_interval', 'history_size', 'site', 'capture',
+                                           'publish', 'proximity', 'sources', 'fetch', 'backfill', 'log'])
+
+## The defaults of the YANG model
+DEFAULT_PUBLISH = Publish(policy='always', distance=1.0, angle=0.0, min_interval=0, max_interval=60)
+DEFAULT_PROXIMITY = Proximity(distance=2500.0, separation=50.0)
+DEFAULT_SOURCES = (Source(name='wheretheiss', type='wheretheiss', url=None),)
+DEFAULT_FETCH = Fetch(deadline=sources.DEADLINE, hedge_delay=sources.HEDGE_DELAY)
+DEFAULT_LOG = Log(level=logs.DEFAULT_LEVEL, max_size=logs.MAX_SIZE)
+DEFAULT = Config(interval=10, norad_id=25544, norad_ids=frozenset(), mode='api', tle_refresh=10800,
+                 extrapolation_interval=0, history_size=history.DEFAULT_CAPACITY, site=None, capture=None,
+                 publish=DEFAULT_PUBLISH, proximity=DEFAULT_PROXIMITY, sources=(), fetch=DEFAULT_FETCH,
+                 backfill=True, log=DEFAULT_LOG)
+
+
+def enum_value(value):
+    '''Return the name of an enumeration value of a config notification,
+    e.g. 'MODE_propagate' -> 'propagate'.'''
+    if isinstance(value, dict):
+        value = value['value']
+    prefix, _, name = value.partition('_')
+    return name if prefix.isupper() else value
+
+
+def leaf(data, name, default=None):
+    '''Return the value of a leaf of a config notification.'''
+    value = data.get(name)
+    if value is None:
+        return default
+    return value['value'] if isinstance(value, dict) else value
+
+
+def parse(config, js_path, keys, deleted, data):
+    '''Return config with the change of a config notification applied.
+
+    Raises ValueError or KeyError when the notification can not be parsed.
+    Notifications of other paths leave config unchanged.
+    '''
+    if js_path == '.satellite.satellite':
+        ## An entry of the tracked satellite list was created or deleted
+        key = int(keys[0])
+        if deleted:
+            return config._replace(norad_ids=config.norad_ids - {key})
+        return config._replace(norad_ids=config.norad_ids | {key})
+
+    if js_path == '.satellite.site':
+        if deleted:
+            return config._replace(site=None)
+        return config._replace(site=Site(float(leaf(data, 'latitude')),
+                                         float(leaf(data, 'longitude')),
+                                         ## meters in the model
+                                         int(leaf(data, 'altitude', 0)) / 1000.0,
+                                         float(leaf(data, 'min_elevation', 10))))
+
+    if js_path == '.satellite.capture':
+        if deleted:
+            return config._replace(capture=None)
+        max_size = int(leaf(data, 'max_size', recording.MAX_SIZE // 1048576))
+        return config._replace(capture=Capture(leaf(data, 'file', recording.CAPTURE_PATH), max_size * 1048576))
+
+    if js_path == '.satellite.publish':
+        if deleted:
+            return config._replace(publish=DEFAULT_PUBLISH)
+        default = DEFAULT_PUBLISH
+        ## hyphens of enumeration names may come as underscores, 'POLICY_on_change'
+        return config._replace(publish=Publish(enum_value(leaf(data, 'policy', default.policy)).replace('_', '-'),
+                                               float(leaf(data, 'distance', default.distance)),
+                                               float(leaf(data, 'angle', default.angle)),
+                                               int(leaf(data, 'min_interval', default.min_interval)),
+                                               int(leaf(data, 'max_interval', default.max_interval))))
+
+    if js_path == '.satellite.source':
+        name = keys[0]
+        if deleted:
+            return config._replace(sources=tuple(e for e in config.sources if e.name != name))
+        entry = Source(name, enum_value(leaf(data, 'type', 'wheretheiss')), leaf(data, 'url') or None)
+        if any(e.name == name for e in config.sources):
+            ## a changed entry keeps its place in the list
+            return config._replace(sources=tuple(entry if e.name == name else e for e in config.sources))
+        return config._replace(sources=config.sources + (entry,))
+
+    if js_path == '.satellite.fetch':
+        if deleted:
+            return config._replace(fetch=DEFAULT_FETCH)
+        ## milliseconds in the model
+        return config._replace(fetch=Fetch(int(leaf(data, 'deadline', DEFAULT_FETCH.deadline * 1000)) / 1000.0,
+                                           int(leaf(data, 'hedge_delay', DEFAULT_FETCH.hedge_delay * 1000)) / 1000.0))
+
+    if js_path == '.satellite.log':
+        if deleted:
+            return config._replace(log=DEFAULT_LOG)
+        ## MB in the model
+        max_size = int(leaf(data, 'max_size', DEFAULT_LOG.max_size // 1048576))
+        return config._replace(log=Log(enum_value(leaf(data, 'level', DEFAULT_LOG.level)), max_size * 1048576))
+
+    if js_path == '.satellite.proximity':
+        if deleted:
+            return config._replace(proximity=DEFAULT_PROXIMITY)
+        default = DEFAULT_PROXIMITY
+        return config._replace(proximity=Proximity(float(leaf(data, 'distance', default.distance)),
+                                                   float(leaf(data, 'separation', default.separation))))
+
+    if js_path != '.satellite':
+        return config
+
+    if deleted:
+        return DEFAULT
+
+    changes = {}
+    for name in ('interval', 'norad_id', 'tle_refresh', 'extrapolation_interval', 'history_size'):
+        if name in data:
+            changes[name] = int(leaf(data, name))
+    if 'mode' in data:
+        changes['mode'] = enum_value(data['mode'])
+    if 'backfill' in data:
+        changes['backfill'] = str(leaf(data, 'backfill')).lower() == 'true'
+    return config._replace(**changes)
+
+
+def validate(config):
+    '''Raise ValueError when config can not be applied.'''
+    if config.interval < 1:
+        raise ValueError(f"interval {config.interval} must be at least 1 second")
+    if config.mode not in MODES:
+        raise ValueError(f"unknown mode {config.mode}")
+    if config.tle_refresh < 1:
+        raise ValueError(f"tle-refresh {config.tle_refresh} must be at least 1 second")
+    if config.extrapolation_interval < 0:
+        raise ValueError(f"extrapolation-interval {config.extrapolation_interval} is negative")
+    if config.history_size < 0:
+        raise ValueError(f"history-size {config.history_size} is negative")
+    if config.publish.policy not in policy.POLICIES:
+        raise ValueError(f"unknown publish policy {config.publish.policy}")
+    if config.publish.max_interval and config.publish.max_interval < config.publish.min_interval:
+        raise ValueError(f"publish max-interval {config.publish.max_interval} is below min-interval")
+    if config.proximity.distance < 0 or config.proximity.separation < 0:
+        raise ValueError("proximity distance and separation must not be negative")
+    for entry in config.sources:
+        if entry.type not in sources.TYPES:
+            raise ValueError(f"unknown type {entry.type} of source {entry.name}")
+        if entry.type == 'file' and not entry.url:
+            raise ValueError(f"source {entry.name} of type file needs an url")
+    if not any(sources.POSITION in sources.CLASSES[e.type].kinds for e in config.sources or DEFAULT_SOURCES):
+        raise ValueError("no source of positions, add a source of type wheretheiss")
+    if config.log.level not in logs.LEVELS:
+        raise ValueError(f"unknown log level {config.log.level}")
+    if config.fetch.deadline <= 0:
+        raise ValueError("fetch deadline must be positive")
+    if config.site and not (-90 <= config.site.latitude <= 90 and -180 <= config.site.longitude <= 180):
+        raise ValueError(f"site {config.site.latitude}, {config.site.longitude} is not on earth")
@@ -0,0 +1,75 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Telemetry encoding of the samples
+## Every published leaf has a fixed formatter matching its
+## YANG type, a sample is encoded in a single pass over the
+## table of its leaves, straight from the API payload
+############################################################
+
+
+def decimal(digits):
+    '''Return the formatter of a decimal64 leaf rounded to digits fraction digits.'''
+    return ('%.' + str(digits) + 'f').__mod__
+
+
+def boolean(value):
+    return 'true' if value else 'false'
+
+
+integer = '%d'.__mod__
+
+## Degrees to ~0.1 m, km and km/h to the meter, julian dates to ~1 ms
+DEGREES = decimal(6)
+DISTANCE = decimal(3)
+DAYNUM = decimal(8)
+
+## (leaf, formatter) of the leaves of a sample, in the order of the YANG model
+SAMPLE_LEAVES = (
+    ('name', str),
+    ('id', str),
+    ('latitude', DEGREES),
+    ('longitude', DEGREES),
+    ('altitude', DISTANCE),
+    ('velocity', DISTANCE),
+    ('visibility', str),
+    ('footprint', DISTANCE),
+    ('timestamp', integer),
+    ('daynum', DAYNUM),
+    ('solar_lat', DEGREES),
+    ('solar_lon', DEGREES),
+    ('units', str),
+    ('estimated', boolean),
+    ('error_bound', DISTANCE),
+    ('restored', boolean),
+    ('age', integer),
+)
+
+## (leaf, formatter) of the leaves of a ground track entry
+TRACK_LEAVES = (
+    ('timestamp', integer),
+    ('latitude', DEGREES),
+    ('longitude', DEGREES),
+    ('altitude', DISTANCE),
+    ('velocity', DISTANCE),
+)
+
+
+def encode(sample):
+    '''Return the telemetry object of a sample (a payload of the position
+    endpoint, with the fields added by the agent).  Fields without a leaf
+    in the YANG model are left out.'''
+    return {leaf: {"value": fmt(sample[leaf])} for leaf, fmt in SAMPLE_LEAVES if leaf in sample}
+
+
+def encode_point(point):
+    '''Return the telemetry object of a history.Point.'''
+    return {leaf: {"value": fmt(getattr(point, leaf))} for leaf, fmt in TRACK_LEAVES}
+
+
+def encode_track(sample):
+    '''Return the telemetry object of the ground track entry of a sample.'''
+    return {leaf: {"value": fmt(sample[leaf])} for leaf, fmt in TRACK_LEAVES}
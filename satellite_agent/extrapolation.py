@@ -0,0 +1,123 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Position extrapolation between fetched fixes
+## Dead reckoning along the great circle through the last two
+## fixes, so positions can be published at a higher cadence
+## than the API is polled
+############################################################
+import math
+import collections
+
+## Mean earth radius in km
+EARTH_RADIUS = 6371.0
+## Error bound in km of an estimate right after a fix
+MIN_ERROR = 1.0
+## Estimates are not published longer than this after the last fix
+MAX_AGE = 600
+## Seconds between checks while the extrapolation is disabled
+IDLE_INTERVAL = 10
+## Relative error of the travelled distance, used as long as no
+## prediction could be checked against a real fix
+DEFAULT_RELATIVE_ERROR = 0.02
+
+## A fetched position: unix timestamp, degrees, degrees, km, km/h
+Fix = collections.namedtuple('Fix', ['timestamp', 'latitude', 'longitude', 'altitude', 'velocity'])
+
+
+def distance(lat1, lon1, lat2, lon2):
+    '''Return the great circle angle (radians) between two points in degrees.'''
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    '''Return the initial bearing (radians) from point 1 towards point 2.'''
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    y = math.sin(lon2 - lon1) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(lon2 - lon1)
+    return math.atan2(y, x)
+
+
+def destination(lat, lon, heading, angle):
+    '''Return the point reached from lat, lon (degrees) after travelling
+    angle (radians) along the great circle with the given heading.'''
+    lat, lon = math.radians(lat), math.radians(lon)
+    lat2 = math.asin(math.sin(lat) * math.cos(angle) +
+                     math.cos(lat) * math.sin(angle) * math.cos(heading))
+    lon2 = lon + math.atan2(math.sin(heading) * math.sin(angle) * math.cos(lat),
+                            math.cos(angle) - math.sin(lat) * math.sin(lat2))
+    lon2 = (math.degrees(lon2) + 540.0) % 360.0 - 180.0
+    return math.degrees(lat2), lon2
+
+
+def dead_reckon(previous, last, timestamp):
+    '''Return the latitude, longitude and altitude at timestamp, continuing
+    the great circle from previous through last at constant speed.'''
+    elapsed = last.timestamp - previous.timestamp
+    dt = timestamp - last.timestamp
+    rate = distance(previous.latitude, previous.longitude, last.latitude, last.longitude) / elapsed
+    ## heading at the last fix: reverse of the bearing back to the previous fix
+    heading = bearing(last.latitude, last.longitude, previous.latitude, previous.longitude) + math.pi
+    lat, lon = destination(last.latitude, last.longitude, heading, rate * dt)
+    alt = last.altitude + (last.altitude - previous.altitude) / elapsed * dt
+    return lat, lon, alt
+
+
+class Extrapolator(object):
+    '''Estimate positions of satellites between fetched fixes.
+
+    Keeps the last three fixes of every satellite.  Every new fix is
+    compared with the position predicted from the two fixes before it;
+    that residual, scaled with the square of the extrapolated time, is
+    the error bound of the next estimates.  Before a residual is known the
+    error bound is DEFAULT_RELATIVE_ERROR of the travelled distance.
+    '''
+
+    def __init__(self):
+        self.fixes = collections.defaultdict(lambda: collections.deque(maxlen=3))
+        self.error_rate = {}
+
+    def add(self, norad_id, timestamp, latitude, longitude, altitude, velocity):
+        fixes = self.fixes[norad_id]
+        if fixes and timestamp <= fixes[-1].timestamp:
+            return
+        fix = Fix(timestamp, latitude, longitude, altitude, velocity)
+
+        if len(fixes) >= 2:
+            ## check the prediction of the previous fixes against this one
+            lat, lon, _ = dead_reckon(fixes[-2], fixes[-1], timestamp)
+            residual = distance(lat, lon, latitude, longitude) * EARTH_RADIUS
+            self.error_rate[norad_id] = residual / (timestamp - fixes[-1].timestamp) ** 2
+
+        fixes.append(fix)
+
+    def remove(self, norad_id):
+        self.fixes.pop(norad_id, None)
+        self.error_rate.pop(norad_id, None)
+
+    def last_fix(self, norad_id):
+        fixes = self.fixes.get(norad_id)
+        return fixes[-1] if fixes else None
+
+    def estimate(self, norad_id, timestamp):
+        '''Return (latitude, longitude, altitude, error bound in km) at
+        timestamp, or None when less than two fixes are known.'''
+        fixes = self.fixes.get(norad_id)
+        if not fixes or len(fixes) < 2:
+            return None
+
+        last = fixes[-1]
+        dt = timestamp - last.timestamp
+        lat, lon, alt = dead_reckon(fixes[-2], last, timestamp)
+
+        if norad_id in self.error_rate:
+            error = self.error_rate[norad_id] * dt * dt
+        else:
+            error = last.velocity / 3600.0 * dt * DEFAULT_RELATIVE_ERROR
+        return lat, lon, alt, max(MIN_ERROR, error)
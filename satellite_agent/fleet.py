@@ -0,0 +1,73 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import time
+import asyncio
+import logging
+import concurrent.futures
+
+import metrics
+import sources
+
+############################################################
+## The position sources only serve one NORAD id per request,
+## so a fleet is fetched by issuing all requests of a cycle
+## concurrently
+############################################################
+
+## Upper bound of concurrent requests per cycle
+MAX_WORKERS = 8
+
+
+class FleetFetcher(object):
+    '''Fetch the current position of every tracked satellite.
+
+    All NORAD ids of a cycle are requested concurrently on a small pool
+    of worker threads, so the duration of a cycle is bound by the slowest
+    request instead of the sum of all requests.  Every position is asked
+    to a sources.SourcePool, hedged across its sources and bound by its
+    deadline.  Requests run on the given executor (e.g. a
+    netns.NetNSExecutor), or on a private thread pool when no executor is
+    given.  The time requests wait for a free worker is recorded in stats
+    as the 'executor' stage.
+    '''
+
+    def __init__(self, source_pool, executor=None, max_workers=MAX_WORKERS, stats=None):
+        self.sources = source_pool
+        self.stats = stats or metrics.Metrics()
+        self.own_pool = executor is None
+        if self.own_pool:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.pool = executor
+
+    async def fetch_all(self, norad_ids):
+        '''Return a dict mapping every NORAD id on its payload.
+
+        Ids for which the request failed are left out of the result.
+        '''
+
+        norad_ids = list(set(norad_ids))
+        futures = [self.sources.fetch_hedged(sources.POSITION, norad_id, self._submit) for norad_id in norad_ids]
+
+        results = {}
+        for norad_id, data in zip(norad_ids, await asyncio.gather(*futures, return_exceptions=True)):
+            if isinstance(data, Exception):
+                logging.error(f"Fetch of satellite {norad_id} raised: {data}")
+                continue
+            if data:
+                results[norad_id] = data
+
+        return results
+
+    def _submit(self, fn, *args):
+        return self.pool.submit(self._run, fn, args, time.monotonic())
+
+    def _run(self, fn, args, submitted):
+        self.stats.record('executor', time.monotonic() - submitted)
+        return fn(*args)
+
+    def shutdown(self):
+        if self.own_pool:
+            self.pool.shutdown(wait=False)
@@ -0,0 +1,174 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Ground track history
+## Fixed capacity ring buffers of the last samples of every
+## tracked satellite, stored in numeric arrays
+############################################################
+import array
+import base64
+import collections
+
+## Default number of samples kept per satellite
+DEFAULT_CAPACITY = 60
+
+## The columns of a ring buffer
+FIELDS = ('timestamp', 'latitude', 'longitude', 'altitude', 'velocity')
+
+## A sample of the history, slot is its position in the ring buffer
+Point = collections.namedtuple('Point', ('slot',) + FIELDS)
+
+
+class TrackHistory(object):
+    '''Fixed capacity ring buffer of the samples of one satellite.
+
+    Every field is a preallocated array of doubles, so memory stays constant
+    however long the agent runs.  append() overwrites the oldest sample once
+    the buffer is full and returns the slot it wrote.  Readers iterate over
+    the slots in place, or take memoryviews of the columns with segments(),
+    without copying the buffer.
+    '''
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.columns = {field: array.array('d', bytes(8 * capacity)) for field in FIELDS}
+        self.count = 0
+        self.head = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, latitude, longitude, altitude, velocity):
+        slot = self.head
+        columns = self.columns
+        columns['timestamp'][slot] = timestamp
+        columns['latitude'][slot] = latitude
+        columns['longitude'][slot] = longitude
+        columns['altitude'][slot] = altitude
+        columns['velocity'][slot] = velocity
+        self.head = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return slot
+
+    def last_timestamp(self):
+        if not self.count:
+            return None
+        return self.columns['timestamp'][(self.head - 1) % self.capacity]
+
+    def slots(self, last=None):
+        '''Return the slots of the samples, oldest first, optionally only the last ones.'''
+        count = self.count if last is None else min(last, self.count)
+        start = (self.head - count) % self.capacity
+        return ((start + i) % self.capacity for i in range(count))
+
+    def points(self, last=None):
+        '''Iterate over the samples as Points, oldest first.'''
+        c = self.columns
+        for slot in self.slots(last):
+            yield Point(slot, c['timestamp'][slot], c['latitude'][slot], c['longitude'][slot],
+                        c['altitude'][slot], c['velocity'][slot])
+
+    def segments(self, field):
+        '''Return the column of field as one or two memoryviews, oldest first.'''
+        view = memoryview(self.columns[field])
+        if self.count < self.capacity:
+            return [view[:self.count]]
+        return [view[self.head:], view[:self.head]]
+
+    def snapshot(self):
+        '''Return the samples as a JSON serializable dict, oldest first.'''
+        columns = {}
+        for field in FIELDS:
+            data = b''.join(segment.tobytes() for segment in self.segments(field))
+            columns[field] = base64.b64encode(data).decode('ascii')
+        return columns
+
+    def restore(self, columns):
+        '''Append the samples of a snapshot() that are newer than the last one.'''
+        values = [array.array('d', base64.b64decode(columns[field])) for field in FIELDS]
+        for sample in zip(*values):
+            last = self.last_timestamp()
+            if last is None or sample[0] > last:
+                self.append(*sample)
+
+
+class History(object):
+    '''The TrackHistory of every tracked satellite.'''
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.tracks = {}
+
+    def resize(self, capacity):
+        '''Change the capacity, the most recent samples are kept.
+
+        The samples are moved to new ring buffers, so their slots change.
+        '''
+        if capacity == self.capacity:
+            return
+        self.capacity = capacity
+        tracks = self.tracks
+        self.tracks = {}
+        if capacity:
+            for norad_id, track in tracks.items():
+                resized = self.tracks[norad_id] = TrackHistory(capacity)
+                for point in track.points(last=capacity):
+                    resized.append(*point[1:])
+
+    def append(self, norad_id, timestamp, latitude, longitude, altitude, velocity):
+        '''Add a sample, return its slot or None for a sample older than the last one.'''
+        if not self.capacity:
+            return None
+        track = self.tracks.get(norad_id)
+        if track is None:
+            track = self.tracks[norad_id] = TrackHistory(self.capacity)
+        last = track.last_timestamp()
+        if last is not None and timestamp <= last:
+            return None
+        return track.append(timestamp, latitude, longitude, altitude, velocity)
+
+    def merge(self, norad_id, samples):
+        '''Add samples older than the last one, e.g. filling an outage gap.
+
+        samples are (timestamp, latitude, longitude, altitude, velocity)
+        tuples, the samples of a known timestamp are ignored.  The track is
+        rebuilt in timestamp order, keeping the most recent samples, so the
+        slots of all its samples may change.  Return True when the track
+        changed.
+        '''
+        if not self.capacity:
+            return False
+        track = self.tracks.get(norad_id)
+        existing = [tuple(point[1:]) for point in track.points()] if track else []
+        known = {sample[0] for sample in existing}
+        added = [tuple(sample) for sample in samples if sample[0] not in known]
+        merged = sorted(existing + added, key=lambda sample: sample[0])[-self.capacity:]
+        if not added or merged == existing:
+            return False
+        rebuilt = self.tracks[norad_id] = TrackHistory(self.capacity)
+        for sample in merged:
+            rebuilt.append(*sample)
+        return True
+
+    def get(self, norad_id):
+        return self.tracks.get(norad_id)
+
+    def remove(self, norad_id):
+        self.tracks.pop(norad_id, None)
+
+    def snapshot(self):
+        return {str(k): track.snapshot() for k, track in self.tracks.items()}
+
+    def restore(self, data):
+        '''Restore the tracks of a snapshot(), in the current capacity.'''
+        if not self.capacity:
+            return
+        for key, columns in data.items():
+            norad_id = int(key)
+            track = self.tracks.get(norad_id)
+            if track is None:
+                track = self.tracks[norad_id] = TrackHistory(self.capacity)
+            track.restore(columns)
@@ -0,0 +1,227 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import collections
+import http.client
+import socket
+import threading
+import time
+import urllib.parse
+
+import netns
+
+import metrics
+
+## Response of a http request: status code, headers and raw body
+Response = collections.namedtuple('Response', ['status', 'headers', 'body'])
+
+## Seconds a resolved address is reused before asking DNS again
+DNS_TTL = 300
+## Maximum idle connections kept per host
+MAX_IDLE = 8
+## Default socket timeout in seconds
+TIMEOUT = 10
+## Errors of a keep-alive connection closed or reset by the server while
+## idle, the request is retried on a fresh connection. A timeout is not
+## retried, the upstream is slow rather than the connection stale
+STALE_ERRORS = (ConnectionError, http.client.BadStatusLine)
+
+
+class NetNSResolver(object):
+    '''Resolve host names inside a network namespace.
+
+    The DNS sockets are created in the calling thread, so the lookup has
+    to run inside the namespace, or in the namespace of the calling thread
+    when nspath is None.  Results are cached for DNS_TTL seconds to avoid a
+    namespace switch and DNS round-trip on every reconnect.
+    '''
+
+    def __init__(self, nspath, ttl=DNS_TTL):
+        self.nspath = nspath
+        self.ttl = ttl
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.cache.get((host, port))
+        if entry and now - entry[0] < self.ttl:
+            return entry[1]
+
+        if self.nspath is None:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        else:
+            with netns.NetNS(nspath=self.nspath):
+                infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+        with self.lock:
+            self.cache[(host, port)] = (now, infos)
+        return infos
+
+    def invalidate(self, host, port):
+        with self.lock:
+            self.cache.pop((host, port), None)
+
+
+class KeepAliveClient(object):
+    '''A pooled HTTP/1.1 keep-alive client pinned to a network namespace.
+
+    Sockets are created once inside the namespace with netns.socket() and
+    reused for the following requests, so a sample no longer pays for a
+    TCP connection, a TLS handshake and a DNS lookup.  A request that fails
+    on a reused connection closed or reset by the server while idle
+    (STALE_ERRORS) is retried on a fresh connection, within the time left
+    of the request.
+
+    Without nsname or nspath the sockets are created in the namespace of
+    the calling thread, e.g. when requests run on a netns.NetNSExecutor.
+
+    The duration and errors of every stage of a request (dns, connect, tls,
+    request and read) are recorded in stats, a metrics.Metrics.
+    '''
+
+    def __init__(self, nsname=None, nspath=None, timeout=TIMEOUT, max_idle=MAX_IDLE, stats=None):
+        self.nsname = nsname
+        self.nspath = nspath
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.stats = stats or metrics.Metrics()
+        self.resolver = None
+        self.idle = collections.defaultdict(list)
+        self.lock = threading.Lock()
+        ## duration of the last TCP connect of the calling thread
+        self.local = threading.local()
+
+    def _create_connection(self, address, timeout=None, source_address=None):
+        ## drop-in for socket.create_connection() used by http.client
+        host, port = address
+        if self.resolver is None:
+            nspath = None
+            if self.nsname is not None or self.nspath is not None:
+                nspath = netns.get_ns_path(self.nspath, nsname=self.nsname)
+            self.resolver = NetNSResolver(nspath)
+
+        with self.stats.timer('dns'):
+            infos = self.resolver.resolve(host, port)
+
+        start = time.monotonic()
+        error = None
+        for family, type_, proto, _, sockaddr in infos:
+            if self.resolver.nspath is None:
+                sock = socket.socket(family, type_, proto)
+            else:
+                sock = netns.socket(self.resolver.nspath, family, type_, proto)
+            try:
+                sock.settimeout(timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                self.local.connect = time.monotonic() - start
+                self.stats.record('connect', self.local.connect)
+                return sock
+            except OSError as e:
+                error = e
+                sock.close()
+
+        self.resolver.invalidate(host, port)
+        self.stats.record('connect', time.monotonic() - start, metrics.error_type(error))
+        raise error
+
+    def _connect(self, conn):
+        ## HTTPSConnection.connect() does the TLS handshake right after the
+        ## TCP connect, its duration is the remainder of connect()
+        tls = isinstance(conn, http.client.HTTPSConnection)
+        self.local.connect = None
+        start = time.monotonic()
+        try:
+            conn.connect()
+        except OSError as e:
+            if tls and self.local.connect is not None:
+                self.stats.record('tls', time.monotonic() - start - self.local.connect, metrics.error_type(e))
+            raise
+        if tls:
+            self.stats.record('tls', time.monotonic() - start - self.local.connect)
+
+    def _new_connection(self, scheme, netloc):
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        conn._create_connection = self._create_connection
+        return conn
+
+    def _acquire(self, key):
+        with self.lock:
+            if self.idle[key]:
+                return self.idle[key].pop(), True
+        return self._new_connection(*key), False
+
+    def _release(self, key, conn):
+        with self.lock:
+            if len(self.idle[key]) < self.max_idle:
+                self.idle[key].append(conn)
+                return
+        conn.close()
+
+    def get(self, url, headers=None, timeout=None):
+        '''Send a GET request and return a Response.
+
+        timeout (seconds) overrides the socket timeout of the client for
+        this request, e.g. the time left before the deadline of a sample.
+        It bounds the whole request, including the retries of stale
+        keep-alive connections.  Raises http.client.HTTPException or
+        OSError when the request fails on a fresh connection, times out or
+        runs out of time.
+        '''
+
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = {'Connection': 'keep-alive', 'Accept': 'application/json'}
+        if headers:
+            request_headers.update(headers)
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout('request deadline passed')
+            conn, reused = self._acquire(key)
+            conn.timeout = remaining
+            if conn.sock:
+                conn.sock.settimeout(remaining)
+            try:
+                if not reused:
+                    self._connect(conn)
+                with self.stats.timer('request'):
+                    conn.request('GET', path, headers=request_headers)
+                    response = conn.getresponse()
+                with self.stats.timer('read'):
+                    body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and isinstance(e, STALE_ERRORS):
+                    ## stale keep-alive connection, reconnect transparently
+                    continue
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+
+            return Response(response.status, response.headers, body)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle.clear()
@@ -0,0 +1,157 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Logging of the agent
+## Records are queued by the event loop and the fetch threads
+## and formatted and written by a background thread to a log
+## file rotated by size. Every call site is rate limited, so
+## a failing upstream does not flood the flash
+############################################################
+import os
+import queue
+import logging
+import threading
+import logging.handlers
+
+LOG_FILE = '/var/log/srlinux/stdout/hello-satellite.log'
+## Size in bytes at which the log file is rotated, rotated files kept
+MAX_SIZE = 4 * 1048576
+BACKUP_COUNT = 3
+## Records waiting for the writer, more are dropped
+QUEUE_SIZE = 10000
+
+## Every call site logs at most RATE_BURST records per RATE_WINDOW seconds,
+## then one of every RATE_SAMPLE records until the window ends
+RATE_WINDOW = 60.0
+RATE_BURST = 10
+RATE_SAMPLE = 100
+
+## Levels of the 'log level' leaf
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+DEFAULT_LEVEL = 'info'
+
+FORMAT = '%(asctime)s %(levelname)s %(threadName)s %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+
+def _annotate(record, note):
+    '''Append a note to the message of record, before its arguments are merged.'''
+    record.msg = f"{record.msg} ({note})"
+
+
+class RateLimit(logging.Filter):
+    '''Rate limit the records of every call site (file and line).
+
+    The messages are mostly f-strings, so records are grouped by where they
+    are logged rather than by their text.  The first record let through
+    after suppressed ones carries their count.
+    '''
+
+    def __init__(self, window=RATE_WINDOW, burst=RATE_BURST, sample=RATE_SAMPLE):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sample = sample
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                site = self.sites[key] = [now, 0, 0]
+            else:
+                suppressed = site[2]
+            site[1] += 1
+            count = site[1]
+            if count > self.burst and (count - self.burst) % self.sample:
+                site[2] += 1
+                return False
+            site[2] = 0
+
+        if suppressed:
+            _annotate(record, f"{suppressed} similar messages suppressed")
+        return True
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    '''Queue the records without formatting them, the writer thread does.
+
+    A full queue drops the record instead of blocking the caller, the next
+    queued record carries the number of dropped records.
+    '''
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        dropped = self.dropped
+        if dropped:
+            _annotate(record, f"{dropped} records dropped, log queue full")
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped -= dropped
+
+
+class LogWriter(object):
+    '''The logging pipeline of the agent: rate limit, queue, writer thread
+    and rotated log file.'''
+
+    def __init__(self, path=LOG_FILE, max_size=MAX_SIZE, backup_count=BACKUP_COUNT,
+                 queue_size=QUEUE_SIZE):
+        ## every start of the agent begins a new file, the previous runs are rotated
+        self.file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_size,
+                                                                 backupCount=backup_count, delay=True)
+        if self.file_handler.stream is None and _size(path):
+            self.file_handler.doRollover()
+        self.file_handler.setFormatter(logging.Formatter(FORMAT, DATE_FORMAT))
+
+        self.handler = QueueHandler(queue.Queue(queue_size))
+        self.handler.addFilter(RateLimit())
+        self.listener = logging.handlers.QueueListener(self.handler.queue, self.file_handler)
+
+    def start(self, level=DEFAULT_LEVEL):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        self.set_level(level)
+        self.listener.start()
+
+    def set_level(self, level):
+        logging.getLogger().setLevel(LEVELS[level])
+
+    def set_max_size(self, max_size):
+        ## read by the writer thread before every record
+        self.file_handler.maxBytes = max_size
+
+    def stop(self):
+        '''Write the queued records and close the log file.'''
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        self.file_handler.close()
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,123 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Per-stage latency and throughput statistics
+## Every stage of a sample (DNS, connect, TLS, request, JSON
+## decoding, telemetry RPCs, ...) records its duration and
+## errors, summarized over a rolling window
+############################################################
+import math
+import time
+import threading
+import collections
+
+## Number of most recent durations kept per stage
+WINDOW = 1024
+
+## Summary of a stage: totals since start, rate (per second), percentiles
+## and maximum (milliseconds) over the window, errors counted per type
+Summary = collections.namedtuple('Summary', ['count', 'errors', 'rate', 'p50', 'p99', 'max', 'error_types'])
+
+
+def error_type(exc):
+    '''Return a short name of the type of an exception, e.g. 'timeout'
+    or the status code name of a grpc.RpcError.'''
+    code = getattr(exc, 'code', None)
+    if callable(code):
+        try:
+            return code().name
+        except Exception:
+            pass
+    return type(exc).__name__
+
+
+def percentile(ordered, p):
+    '''Return the nearest-rank percentile p of a sorted sequence.'''
+    return ordered[max(0, math.ceil(p / 100.0 * len(ordered)) - 1)]
+
+
+class Stage(object):
+
+    def __init__(self, window):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.errors = collections.Counter()
+
+
+class Timer(object):
+    '''Context manager recording the duration of a stage, and the type
+    of the exception raised in it as an error.'''
+
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.stage, time.monotonic() - self.start,
+                            error_type(exc) if exc_type else None)
+        return False
+
+
+class Metrics(object):
+    '''Thread-safe collection of the statistics of every stage.
+
+    Recording only appends to a bounded deque under a lock, the
+    percentiles are computed when summary() is called.
+    '''
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def _stage(self, stage):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = Stage(self.window)
+        return entry
+
+    def timer(self, stage):
+        return Timer(self, stage)
+
+    def record(self, stage, seconds, error=None):
+        '''Record a duration in seconds, and an error of the given type.'''
+        now = time.monotonic()
+        with self.lock:
+            entry = self._stage(stage)
+            entry.count += 1
+            entry.samples.append((now, seconds))
+            if error:
+                entry.errors[error] += 1
+
+    def error(self, stage, error):
+        '''Count an error of a stage that has no duration.'''
+        with self.lock:
+            self._stage(stage).errors[error] += 1
+
+    def summary(self):
+        '''Return a dict mapping every stage on its Summary.'''
+        with self.lock:
+            stages = {name: (list(entry.samples), entry.count, dict(entry.errors))
+                      for name, entry in self.stages.items()}
+
+        summaries = {}
+        for name, (samples, count, errors) in stages.items():
+            durations = sorted(seconds * 1000.0 for _, seconds in samples)
+            span = samples[-1][0] - samples[0][0] if len(samples) > 1 else 0.0
+            summaries[name] = Summary(
+                count, sum(errors.values()),
+                (len(samples) - 1) / span if span > 0 else 0.0,
+                percentile(durations, 50) if durations else 0.0,
+                percentile(durations, 99) if durations else 0.0,
+                durations[-1] if durations else 0.0,
+                errors)
+        return summaries
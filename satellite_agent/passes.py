@@ -0,0 +1,199 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Pass prediction
+## Computes when the tracked satellites rise above and set
+## below the horizon of the router's site. The whole fleet
+## is searched at once on a coarse time grid, the crossings
+## and culminations found are then refined in a few
+## vectorized iterations.
+############################################################
+import math
+import time
+import collections
+
+import numpy as np
+
+import propagation
+import configuration
+
+## Prediction horizon in seconds
+HORIZON = 86400
+## Step in seconds of the coarse search, shorter than the shortest pass
+COARSE_STEP = 60
+## Precision in seconds of the refined times
+FINE_STEP = 1
+## Passes are recomputed once less than this part of the horizon is left
+REFRESH_FRACTION = 0.5
+## Maximum number of passes kept per satellite
+MAX_PASSES = 10
+
+## A predicted pass: unix timestamps, degrees, sunlit at the culmination
+Pass = collections.namedtuple('Pass', ['aos', 'los', 'max_elevation', 'max_elevation_time',
+                                       'aos_azimuth', 'los_azimuth', 'sunlit'])
+
+## Location of the observer: degrees, degrees, km, minimum elevation in degrees
+Site = configuration.Site
+
+GOLDEN = (math.sqrt(5.0) - 1.0) / 2.0
+
+
+def site_ecef(site):
+    '''Return the earth fixed position (km) of the site on the WGS-84 ellipsoid.'''
+    lat = math.radians(site.latitude)
+    lon = math.radians(site.longitude)
+    n = propagation.WGS84_A / math.sqrt(1.0 - propagation.WGS84_E2 * math.sin(lat) ** 2)
+    return np.array([(n + site.altitude) * math.cos(lat) * math.cos(lon),
+                     (n + site.altitude) * math.cos(lat) * math.sin(lon),
+                     (n * (1.0 - propagation.WGS84_E2) + site.altitude) * math.sin(lat)])
+
+
+def look_angles(r, site):
+    '''Return the elevation and azimuth (degrees) of the earth fixed
+    positions r, shape (..., 3), seen from the site.'''
+    lat = math.radians(site.latitude)
+    lon = math.radians(site.longitude)
+    rho = r - site_ecef(site)
+    x, y, z = rho[..., 0], rho[..., 1], rho[..., 2]
+    east = -math.sin(lon) * x + math.cos(lon) * y
+    north = (-math.sin(lat) * math.cos(lon) * x - math.sin(lat) * math.sin(lon) * y +
+             math.cos(lat) * z)
+    up = math.cos(lat) * math.cos(lon) * x + math.cos(lat) * math.sin(lon) * y + math.sin(lat) * z
+    elevation = np.degrees(np.arctan2(up, np.hypot(east, north)))
+    azimuth = np.mod(np.degrees(np.arctan2(east, north)), 360.0)
+    return elevation, azimuth
+
+
+def elevation(el, site, times):
+    '''Return the elevation (degrees, NaN when unknown) of the satellites of
+    el at times, shape (T,) or (N, T).'''
+    r, _ = propagation.sgp4(el, times)
+    return look_angles(propagation.teme_to_ecef(r, times), site)[0]
+
+
+def find_passes(el, site, start, horizon=HORIZON, step=COARSE_STEP):
+    '''Return a dict mapping every NORAD id of el on its passes over the site
+    between start and start + horizon.
+
+    A pass in progress at start has its AOS at start, a pass that has not
+    ended at the end of the horizon is left out.
+    '''
+    times = start + np.arange(0.0, horizon + step, step)
+    with np.errstate(invalid='ignore'):
+        coarse = elevation(el, site, times)
+        above = coarse >= site.min_elevation
+
+    ## rising and setting edges, padded so every rise has a matching set
+    padded = np.pad(above, ((0, 0), (1, 1)), mode='constant')
+    rise_sat, rise = np.nonzero(~padded[:, :-1] & padded[:, 1:])
+    set_sat, set_ = np.nonzero(padded[:, :-1] & ~padded[:, 1:])
+    complete = set_ < len(times)
+    sat, rise, set_ = rise_sat[complete], rise[complete], set_[complete]
+    if not len(sat):
+        return {}
+
+    sub = el.take(sat)
+    sub_site = lambda t: elevation(sub, site, t.reshape(-1, 1))[:, 0]
+
+    ## refine the crossings by bisection between the coarse samples around them
+    in_progress = rise == 0
+    aos = _bisect(sub_site, site.min_elevation, times[np.maximum(rise - 1, 0)], times[rise], rising=True)
+    aos[in_progress] = start
+    los = _bisect(sub_site, site.min_elevation, times[set_ - 1], times[set_], rising=False)
+
+    ## the culmination lies within a coarse step of the highest coarse sample
+    index = np.arange(len(times))
+    inside = (index >= rise[:, np.newaxis]) & (index < set_[:, np.newaxis])
+    peak = times[np.argmax(np.where(inside, coarse[sat], -np.inf), axis=1)]
+    tmax = _golden(sub_site, np.maximum(peak - step, aos), np.minimum(peak + step, los))
+
+    ## look angles at AOS, LOS and the culmination in a single propagation
+    moments = np.stack((aos, los, tmax), axis=1)
+    r, _ = propagation.sgp4(sub, moments)
+    angles_el, angles_az = look_angles(propagation.teme_to_ecef(r, moments), site)
+    sun, _, _ = propagation.sun_position(tmax)
+    lit = propagation.sunlit(r[:, 2, :], sun)
+
+    passes = collections.defaultdict(list)
+    for k, i in enumerate(sat):
+        passes[el.norad_ids[i]].append(Pass(
+            int(round(aos[k])), int(round(los[k])),
+            round(float(angles_el[k, 2]), 1), int(round(tmax[k])),
+            round(float(angles_az[k, 0]), 1), round(float(angles_az[k, 1]), 1),
+            bool(lit[k])))
+    return dict(passes)
+
+
+def _bisect(f, level, lo, hi, rising):
+    ## narrow [lo, hi] down to FINE_STEP around the crossing of level by f
+    lo = lo.copy()
+    hi = hi.copy()
+    while np.any(hi - lo > FINE_STEP):
+        mid = (lo + hi) / 2.0
+        with np.errstate(invalid='ignore'):
+            above = f(mid) >= level
+        ## the crossing is below mid when mid is on the far side of it
+        move_hi = above == rising
+        hi = np.where(move_hi, mid, hi)
+        lo = np.where(move_hi, lo, mid)
+    return (lo + hi) / 2.0
+
+
+def _golden(f, lo, hi):
+    ## golden section search of the maximum of f on [lo, hi]
+    a = lo.copy()
+    b = hi.copy()
+    c = b - GOLDEN * (b - a)
+    d = a + GOLDEN * (b - a)
+    fc = f(c)
+    fd = f(d)
+    while np.any(b - a > FINE_STEP):
+        left = fc > fd
+        b = np.where(left, d, b)
+        a = np.where(left, a, c)
+        c, d = np.where(left, b - GOLDEN * (b - a), d), np.where(left, c, a + GOLDEN * (b - a))
+        fc, fd = np.where(left, f(c), fd), np.where(left, fc, f(d))
+    return (a + b) / 2.0
+
+
+class PassPredictor(object):
+    '''Cache of the upcoming passes of the fleet over the site.
+
+    Passes are computed for HORIZON seconds ahead and kept until the
+    orbital elements of the propagator change, the site changes, or less
+    than REFRESH_FRACTION of the horizon is left.  Passes that ended are
+    dropped from the results without recomputing.
+    '''
+
+    def __init__(self, propagator, horizon=HORIZON):
+        self.propagator = propagator
+        self.horizon = horizon
+        self.site = None
+        self.elements = None
+        self.computed = 0.0
+        self.passes = {}
+
+    def set_site(self, site):
+        if site != self.site:
+            self.site = site
+            self.passes = {}
+            self.elements = None
+
+    def predict(self, norad_ids, now=None):
+        '''Return a dict mapping the NORAD ids on their upcoming passes.'''
+        now = time.time() if now is None else now
+        if self.site is None:
+            return {}
+
+        elements = self.propagator.elements
+        stale = now - self.computed > self.horizon * REFRESH_FRACTION
+        if elements is not None and (elements is not self.elements or stale):
+            self.passes = find_passes(elements, self.site, now, self.horizon)
+            self.elements = elements
+            self.computed = now
+
+        return {k: [p for p in v if p.los > now][:MAX_PASSES]
+                for k, v in self.passes.items() if k in norad_ids}
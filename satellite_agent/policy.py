@@ -0,0 +1,92 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Publishing policy
+## Decides which samples are worth a telemetry update, so
+## the state datastore and the gNMI subscribers downstream
+## only see the changes that matter
+############################################################
+import math
+
+import extrapolation
+
+## Policies of the 'publish' container
+POLICIES = ('always', 'on-change', 'deadband')
+
+## Leaves that change with every sample, whether the satellite moved or not
+TIME_FIELDS = ('timestamp', 'daynum', 'age', 'solar_lat', 'solar_lon')
+## Position leaves, compared against the deadband
+POSITION_FIELDS = ('latitude', 'longitude', 'altitude', 'velocity', 'footprint', 'error_bound')
+
+
+def moved(previous, sample):
+    '''Return the distance (km) and the largest latitude or longitude
+    change (degrees) between two samples.'''
+    lat1, lon1, alt1 = float(previous['latitude']), float(previous['longitude']), float(previous['altitude'])
+    lat2, lon2, alt2 = float(sample['latitude']), float(sample['longitude']), float(sample['altitude'])
+    ground = extrapolation.distance(lat1, lon1, lat2, lon2) * (extrapolation.EARTH_RADIUS + (alt1 + alt2) / 2)
+    dlon = abs((lon2 - lon1 + 180.0) % 360.0 - 180.0)
+    return math.hypot(ground, alt2 - alt1), max(abs(lat2 - lat1), dlon)
+
+
+class PublishPolicy(object):
+    '''Select the samples to publish, per satellite.
+
+    settings is a configuration.Publish:
+    - 'always' publishes every sample
+    - 'on-change' publishes a sample when any leaf other than the time
+      leaves (TIME_FIELDS) changed
+    - 'deadband' publishes a sample when the satellite moved more than
+      distance km or angle degrees of latitude or longitude (0 disables a
+      bound) since the last published sample, or when a status leaf
+      (e.g. visibility or estimated) changed
+    A satellite is not published more often than every min_interval
+    seconds, and at least every max_interval seconds (0 disables them), so
+    its timestamp and age stay fresh whatever the policy.  forget() has to
+    be called when the published state of a satellite is deleted, its next
+    sample is then always published.
+    '''
+
+    def __init__(self):
+        self.last = {}
+
+    def select(self, samples, now, settings):
+        '''Return the samples (a dict keyed by NORAD id) to publish at time now.'''
+        selected = {}
+        for key, sample in samples.items():
+            if self._due(self.last.get(key), sample, now, settings):
+                selected[key] = sample
+                self.last[key] = (now, sample)
+        return selected
+
+    def forget(self, key=None):
+        '''Forget the last published sample of key, or of all satellites.'''
+        if key is None:
+            self.last.clear()
+        else:
+            self.last.pop(key, None)
+
+    def _due(self, last, sample, now, settings):
+        if last is None:
+            return True
+        published, previous = last
+        elapsed = now - published
+        if elapsed < settings.min_interval:
+            return False
+        if settings.policy == 'always' or (settings.max_interval and elapsed >= settings.max_interval):
+            return True
+
+        if settings.policy == 'on-change':
+            return any(sample.get(f) != previous.get(f) for f in sample if f not in TIME_FIELDS)
+
+        ## deadband
+        if any(sample.get(f) != previous.get(f) for f in sample if f not in TIME_FIELDS + POSITION_FIELDS):
+            return True
+        if not settings.distance and not settings.angle:
+            return any(sample.get(f) != previous.get(f) for f in POSITION_FIELDS)
+        distance, angle = moved(previous, sample)
+        return bool((settings.distance and distance > settings.distance) or
+                    (settings.angle and angle > settings.angle))
@@ -0,0 +1,521 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Local orbit propagation
+## Computes satellite positions from Two Line Elements (TLE)
+## with a NumPy implementation of the SGP4 model, so samples
+## no longer cost a http request. All functions operate on
+## the whole fleet at many timestamps in a single call:
+## element arrays have shape (N, 1) and times shape (T,),
+## results have shape (N, T).
+############################################################
+import math
+import time
+import calendar
+import logging
+import threading
+
+import numpy as np
+
+## WGS-72 constants used by SGP4
+MU = 398600.8
+RADIUS_EARTH = 6378.135
+XKE = 60.0 / math.sqrt(RADIUS_EARTH ** 3 / MU)
+J2 = 0.001082616
+J3 = -0.00000253881
+J4 = -0.00000165597
+J3OJ2 = J3 / J2
+X2O3 = 2.0 / 3.0
+TWOPI = 2.0 * math.pi
+
+## WGS-84 ellipsoid used for the geodetic coordinates
+WGS84_A = 6378.137
+WGS84_F = 1.0 / 298.257223563
+WGS84_E2 = WGS84_F * (2.0 - WGS84_F)
+
+## Orbits with a period of 225 minutes or more need the deep space
+## (SDP4) perturbations, which are not implemented here
+DEEP_SPACE_PERIOD = 225.0
+
+## Delay in seconds before the first retry of a failed TLE fetch, doubled
+## after every further failure up to the refresh interval
+TLE_RETRY = 60
+
+
+def parse_tle(line1, line2):
+    '''Return a dict with the orbital elements of a TLE.
+
+    Angles are converted to radians, the mean motion to radians per
+    minute and the epoch to a unix timestamp.
+    '''
+
+    year = int(line1[18:20])
+    year += 1900 if year >= 57 else 2000
+    days = float(line1[20:32])
+    epoch = calendar.timegm((year, 1, 1, 0, 0, 0)) + (days - 1.0) * 86400.0
+
+    bstar = float(line1[53] + '.' + line1[54:59].strip() + 'e' + line1[59:61])
+
+    return {
+        'norad_id': int(line1[2:7]),
+        'epoch': epoch,
+        'bstar': bstar,
+        'inclo': math.radians(float(line2[8:16])),
+        'nodeo': math.radians(float(line2[17:25])),
+        'ecco': float('0.' + line2[26:33].strip()),
+        'argpo': math.radians(float(line2[34:42])),
+        'mo': math.radians(float(line2[43:51])),
+        'no_kozai': float(line2[52:63]) * TWOPI / 1440.0,
+    }
+
+
+class Elements(object):
+    '''SGP4 initialisation of a set of TLEs.
+
+    Holds one column vector per initialised quantity so that sgp4() can
+    broadcast every satellite against every timestamp.  Satellites that
+    need the deep space model are flagged in self.deep_space and yield
+    NaN positions.
+    '''
+
+    def __init__(self, tles):
+        col = lambda key: np.array([t[key] for t in tles], dtype=float).reshape(-1, 1)
+
+        self.norad_ids = [t['norad_id'] for t in tles]
+        self.epoch = col('epoch')
+        self.bstar = bstar = col('bstar')
+        self.inclo = inclo = col('inclo')
+        self.nodeo = col('nodeo')
+        self.ecco = ecco = col('ecco')
+        self.argpo = argpo = col('argpo')
+        self.mo = mo = col('mo')
+        no_kozai = col('no_kozai')
+
+        ## recover the original mean motion and semi major axis
+        eccsq = ecco * ecco
+        omeosq = 1.0 - eccsq
+        rteosq = np.sqrt(omeosq)
+        cosio = np.cos(inclo)
+        cosio2 = cosio * cosio
+        ak = (XKE / no_kozai) ** X2O3
+        d1 = 0.75 * J2 * (3.0 * cosio2 - 1.0) / (rteosq * omeosq)
+        delta = d1 / (ak * ak)
+        adel = ak * (1.0 - delta * delta - delta * (1.0 / 3.0 + 134.0 * delta * delta / 81.0))
+        delta = d1 / (adel * adel)
+        self.no_unkozai = no = no_kozai / (1.0 + delta)
+
+        ao = (XKE / no) ** X2O3
+        sinio = np.sin(inclo)
+        po = ao * omeosq
+        con42 = 1.0 - 5.0 * cosio2
+        self.con41 = con41 = -con42 - cosio2 - cosio2
+        posq = po * po
+        rp = ao * (1.0 - ecco)
+
+        self.deep_space = (TWOPI / no >= DEEP_SPACE_PERIOD).ravel()
+        self.isimp = rp < (220.0 / RADIUS_EARTH + 1.0)
+
+        ## atmospheric drag parameters, adjusted for low perigees
+        perige = (rp - 1.0) * RADIUS_EARTH
+        sfour = np.where(perige < 156.0, np.where(perige < 98.0, 20.0, perige - 78.0), 78.0)
+        qzms24 = ((120.0 - sfour) / RADIUS_EARTH) ** 4
+        sfour = sfour / RADIUS_EARTH + 1.0
+
+        pinvsq = 1.0 / posq
+        tsi = 1.0 / (ao - sfour)
+        self.eta = eta = ao * ecco * tsi
+        etasq = eta * eta
+        eeta = ecco * eta
+        psisq = np.abs(1.0 - etasq)
+        coef = qzms24 * tsi ** 4
+        coef1 = coef / psisq ** 3.5
+        cc2 = coef1 * no * (ao * (1.0 + 1.5 * etasq + eeta * (4.0 + etasq)) +
+                            0.375 * J2 * tsi / psisq * con41 * (8.0 + 3.0 * etasq * (8.0 + etasq)))
+        self.cc1 = cc1 = bstar * cc2
+        circular = ecco <= 1.0e-4
+        safe_ecco = np.where(circular, 1.0, ecco)
+        cc3 = np.where(circular, 0.0, -2.0 * coef * tsi * J3OJ2 * no * sinio / safe_ecco)
+        self.x1mth2 = x1mth2 = 1.0 - cosio2
+        self.cc4 = 2.0 * no * coef1 * ao * omeosq * (
+            eta * (2.0 + 0.5 * etasq) + ecco * (0.5 + 2.0 * etasq) -
+            J2 * tsi / (ao * psisq) * (-3.0 * con41 * (1.0 - 2.0 * eeta + etasq * (1.5 - 0.5 * eeta)) +
+                                      0.75 * x1mth2 * (2.0 * etasq - eeta * (1.0 + etasq)) * np.cos(2.0 * argpo)))
+        self.cc5 = 2.0 * coef1 * ao * omeosq * (1.0 + 2.75 * (etasq + eeta) + eeta * etasq)
+
+        ## secular rates of the mean anomaly, perigee and node
+        cosio4 = cosio2 * cosio2
+        temp1 = 1.5 * J2 * pinvsq * no
+        temp2 = 0.5 * temp1 * J2 * pinvsq
+        temp3 = -0.46875 * J4 * pinvsq * pinvsq * no
+        self.mdot = no + 0.5 * temp1 * rteosq * con41 + 0.0625 * temp2 * rteosq * (13.0 - 78.0 * cosio2 + 137.0 * cosio4)
+        self.argpdot = (-0.5 * temp1 * con42 + 0.0625 * temp2 * (7.0 - 114.0 * cosio2 + 395.0 * cosio4) +
+                        temp3 * (3.0 - 36.0 * cosio2 + 49.0 * cosio4))
+        xhdot1 = -temp1 * cosio
+        self.nodedot = xhdot1 + (0.5 * temp2 * (4.0 - 19.0 * cosio2) + 2.0 * temp3 * (3.0 - 7.0 * cosio2)) * cosio
+        self.omgcof = bstar * cc3 * np.cos(argpo)
+        safe_eeta = np.where(circular, 1.0, eeta)
+        self.xmcof = np.where(circular, 0.0, -X2O3 * coef * bstar / safe_eeta)
+        self.nodecf = 3.5 * omeosq * xhdot1 * cc1
+        self.t2cof = 1.5 * cc1
+        divisor = np.where(np.abs(cosio + 1.0) > 1.5e-12, 1.0 + cosio, 1.5e-12)
+        self.xlcof = -0.25 * J3OJ2 * sinio * (3.0 + 5.0 * cosio) / divisor
+        self.aycof = -0.5 * J3OJ2 * sinio
+        self.delmo = (1.0 + eta * np.cos(mo)) ** 3
+        self.sinmao = np.sin(mo)
+        self.x7thm1 = 7.0 * cosio2 - 1.0
+
+        ## higher order drag terms, not used for very low perigees
+        full = ~self.isimp
+        cc1sq = cc1 * cc1
+        d2 = 4.0 * ao * tsi * cc1sq
+        temp = d2 * tsi * cc1 / 3.0
+        d3 = (17.0 * ao + sfour) * temp
+        d4 = 0.5 * temp * ao * tsi * (221.0 * ao + 31.0 * sfour) * cc1
+        self.d2 = np.where(full, d2, 0.0)
+        self.d3 = np.where(full, d3, 0.0)
+        self.d4 = np.where(full, d4, 0.0)
+        self.t3cof = np.where(full, d2 + 2.0 * cc1sq, 0.0)
+        self.t4cof = np.where(full, 0.25 * (3.0 * d3 + cc1 * (12.0 * d2 + 10.0 * cc1sq)), 0.0)
+        self.t5cof = np.where(full, 0.2 * (3.0 * d4 + 12.0 * cc1 * d3 + 6.0 * d2 * d2 +
+                                           15.0 * cc1sq * (2.0 * d2 + cc1sq)), 0.0)
+
+    def take(self, index):
+        '''Return the Elements of the satellites at index (an integer array),
+        a satellite may be taken several times.'''
+        el = object.__new__(Elements)
+        for name, value in vars(self).items():
+            setattr(el, name, value[index] if isinstance(value, np.ndarray) else value)
+        el.norad_ids = [self.norad_ids[i] for i in index]
+        return el
+
+
+def sgp4(el, times):
+    '''Propagate all satellites of el to the unix timestamps in times.
+
+    Return position (km) and velocity (km/s) in the TEME frame as two
+    arrays of shape (N, T, 3).  Satellites that cannot be propagated at a
+    given time (deep space orbits or decayed orbits) are set to NaN.
+    times is either shared by all satellites, shape (T,), or holds the
+    timestamps of every satellite, shape (N, T).
+    '''
+
+    times = np.asarray(times, dtype=float)
+    if times.ndim < 2:
+        times = times.reshape(1, -1)
+    t = (times - el.epoch) / 60.0
+
+    ## secular gravity and atmospheric drag
+    xmdf = el.mo + el.mdot * t
+    argpdf = el.argpo + el.argpdot * t
+    nodedf = el.nodeo + el.nodedot * t
+    t2 = t * t
+    nodem = nodedf + el.nodecf * t2
+
+    full = ~el.isimp
+    delomg = el.omgcof * t
+    delm = el.xmcof * ((1.0 + el.eta * np.cos(xmdf)) ** 3 - el.delmo)
+    temp = np.where(full, delomg + delm, 0.0)
+    mm = xmdf + temp
+    argpm = argpdf - temp
+    t3 = t2 * t
+    t4 = t3 * t
+    tempa = 1.0 - el.cc1 * t - el.d2 * t2 - el.d3 * t3 - el.d4 * t4
+    tempe = el.bstar * el.cc4 * t + np.where(full, el.bstar * el.cc5 * (np.sin(mm) - el.sinmao), 0.0)
+    templ = el.t2cof * t2 + el.t3cof * t3 + t4 * (el.t4cof + t * el.t5cof)
+
+    am = (XKE / el.no_unkozai) ** X2O3 * tempa * tempa
+    nm = XKE / am ** 1.5
+    em = el.ecco - tempe
+    invalid = (em >= 1.0) | (em < -0.001) | (am < 0.95)
+    em = np.maximum(em, 1.0e-6)
+    mm = mm + el.no_unkozai * templ
+    xlm = mm + argpm + nodem
+
+    nodem = np.fmod(nodem, TWOPI)
+    argpm = np.fmod(argpm, TWOPI)
+    xlm = np.fmod(xlm, TWOPI)
+    mm = np.fmod(xlm - argpm - nodem, TWOPI)
+
+    ## long period periodics
+    axnl = em * np.cos(argpm)
+    temp = 1.0 / (am * (1.0 - em * em))
+    aynl = em * np.sin(argpm) + temp * el.aycof
+    xl = mm + argpm + nodem + temp * el.xlcof * axnl
+
+    ## solve kepler's equation
+    u = np.fmod(xl - nodem, TWOPI)
+    eo1 = u
+    for _ in range(10):
+        sineo1 = np.sin(eo1)
+        coseo1 = np.cos(eo1)
+        tem5 = (u - aynl * coseo1 + axnl * sineo1 - eo1) / (1.0 - coseo1 * axnl - sineo1 * aynl)
+        eo1 = eo1 + np.clip(tem5, -0.95, 0.95)
+        if np.all(np.abs(tem5) < 1.0e-12):
+            break
+    sineo1 = np.sin(eo1)
+    coseo1 = np.cos(eo1)
+
+    ## short period preliminary quantities
+    ecose = axnl * coseo1 + aynl * sineo1
+    esine = axnl * sineo1 - aynl * coseo1
+    el2 = axnl * axnl + aynl * aynl
+    pl = am * (1.0 - el2)
+    invalid |= pl < 0.0
+    pl = np.where(invalid, 1.0, pl)
+    rl = am * (1.0 - ecose)
+    rdotl = np.sqrt(am) * esine / rl
+    rvdotl = np.sqrt(pl) / rl
+    betal = np.sqrt(1.0 - el2)
+    temp = esine / (1.0 + betal)
+    sinu = am / rl * (sineo1 - aynl - axnl * temp)
+    cosu = am / rl * (coseo1 - axnl + aynl * temp)
+    su = np.arctan2(sinu, cosu)
+    sin2u = (cosu + cosu) * sinu
+    cos2u = 1.0 - 2.0 * sinu * sinu
+    temp = 1.0 / pl
+    temp1 = 0.5 * J2 * temp
+    temp2 = temp1 * temp
+
+    ## update for short period periodics
+    cosip = np.cos(el.inclo)
+    sinip = np.sin(el.inclo)
+    mrt = rl * (1.0 - 1.5 * temp2 * betal * el.con41) + 0.5 * temp1 * el.x1mth2 * cos2u
+    su = su - 0.25 * temp2 * el.x7thm1 * sin2u
+    xnode = nodem + 1.5 * temp2 * cosip * sin2u
+    xinc = el.inclo + 1.5 * temp2 * cosip * sinip * cos2u
+    mvt = rdotl - nm * temp1 * el.x1mth2 * sin2u / XKE
+    rvdot = rvdotl + nm * temp1 * (el.x1mth2 * cos2u + 1.5 * el.con41) / XKE
+
+    ## orientation vectors
+    sinsu = np.sin(su)
+    cossu = np.cos(su)
+    snod = np.sin(xnode)
+    cnod = np.cos(xnode)
+    sini = np.sin(xinc)
+    cosi = np.cos(xinc)
+    xmx = -snod * cosi
+    xmy = cnod * cosi
+    ux = xmx * sinsu + cnod * cossu
+    uy = xmy * sinsu + snod * cossu
+    uz = sini * sinsu
+    vx = xmx * cossu - cnod * sinsu
+    vy = xmy * cossu - snod * sinsu
+    vz = sini * cossu
+
+    invalid |= mrt < 1.0
+    invalid |= el.deep_space.reshape(-1, 1)
+
+    vkmpersec = RADIUS_EARTH * XKE / 60.0
+    r = np.stack((ux, uy, uz), axis=-1) * (mrt * RADIUS_EARTH)[..., np.newaxis]
+    v = (np.stack((ux, uy, uz), axis=-1) * mvt[..., np.newaxis] +
+         np.stack((vx, vy, vz), axis=-1) * rvdot[..., np.newaxis]) * vkmpersec
+
+    r[invalid] = np.nan
+    v[invalid] = np.nan
+    return r, v
+
+
+def julian_date(times):
+    '''Return the julian date of unix timestamps.'''
+    return np.asarray(times, dtype=float) / 86400.0 + 2440587.5
+
+
+def gmst(times):
+    '''Return the Greenwich mean sidereal time (radians) of unix timestamps.'''
+    tut1 = (julian_date(times) - 2451545.0) / 36525.0
+    seconds = (-6.2e-6 * tut1 ** 3 + 0.093104 * tut1 * tut1 +
+               (876600.0 * 3600.0 + 8640184.812866) * tut1 + 67310.54841)
+    return np.mod(np.radians(seconds / 240.0), TWOPI)
+
+
+def teme_to_ecef(r, times):
+    '''Rotate TEME positions of shape (..., T, 3) into the earth fixed frame.'''
+    theta = gmst(times)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+    x = cos_t * r[..., 0] + sin_t * r[..., 1]
+    y = -sin_t * r[..., 0] + cos_t * r[..., 1]
+    return np.stack((x, y, r[..., 2]), axis=-1)
+
+
+def ecef_to_geodetic(r):
+    '''Return WGS-84 latitude (deg), longitude (deg) and altitude (km).'''
+    x = r[..., 0]
+    y = r[..., 1]
+    z = r[..., 2]
+    lon = np.arctan2(y, x)
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1.0 - WGS84_E2))
+    for _ in range(5):
+        sin_lat = np.sin(lat)
+        n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+        lat = np.arctan2(z + WGS84_E2 * n * sin_lat, p)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    alt = p / np.cos(lat) - n
+    return np.degrees(lat), np.degrees(lon), alt
+
+
+def sun_position(times):
+    '''Return the unit vector towards the sun (TEME) and its right ascension
+    and declination (radians), using the low precision formulas of the
+    Astronomical Almanac (accurate to about 0.01 degree).'''
+    n = julian_date(times) - 2451545.0
+    mean_lon = np.radians(280.460 + 0.9856474 * n)
+    g = np.radians(357.528 + 0.9856003 * n)
+    ecl_lon = mean_lon + np.radians(1.915) * np.sin(g) + np.radians(0.020) * np.sin(2.0 * g)
+    obliquity = np.radians(23.439 - 0.0000004 * n)
+    x = np.cos(ecl_lon)
+    y = np.cos(obliquity) * np.sin(ecl_lon)
+    z = np.sin(obliquity) * np.sin(ecl_lon)
+    return np.stack((x, y, z), axis=-1), np.arctan2(y, x), np.arcsin(z)
+
+
+def sunlit(r, sun):
+    '''Return True for TEME positions outside the (cylindrical) shadow of the earth.'''
+    along = np.sum(r * sun, axis=-1)
+    across = np.linalg.norm(r - along[..., np.newaxis] * sun, axis=-1)
+    return (along > 0.0) | (across > RADIUS_EARTH)
+
+
+def footprint(alt):
+    '''Return the diameter (km) of the area on earth that sees a satellite at alt.'''
+    return 2.0 * WGS84_A * np.arccos(WGS84_A / (WGS84_A + alt))
+
+
+class Propagator(object):
+    '''Compute satellite positions locally from periodically fetched TLEs.
+
+    TLEs are refreshed at most once every refresh seconds, fetch(norad_id)
+    returns the TLE payload (line1, line2 and name) of a satellite or an
+    empty dict.  When a refresh fails, the previous elements are kept so
+    positions keep flowing during internet outages, and the fetch is
+    retried after TLE_RETRY seconds, doubling up to the refresh interval.
+    positions() returns payloads with the same keys as
+    the wheretheiss position endpoint, so they can be published as is.
+    '''
+
+    def __init__(self, fetch, refresh=10800):
+        self.fetch = fetch
+        self.refresh = refresh
+        self.tles = {}
+        self.names = {}
+        self.fetched = {}
+        ## NORAD id -> (time of the next attempt, consecutive failures)
+        self.retries = {}
+        self.elements = None
+        self.lock = threading.Lock()
+
+    def update(self, norad_ids, now=None):
+        '''Fetch the TLEs of new satellites or older than the refresh interval.
+
+        Several tasks share the propagator, updates run one at a time.
+        '''
+        now = time.time() if now is None else now
+        with self.lock:
+            self._update(norad_ids, now)
+
+    def _update(self, norad_ids, now):
+        changed = False
+
+        for norad_id in norad_ids:
+            if now - self.fetched.get(norad_id, 0) < self.refresh:
+                continue
+            retry_at, failures = self.retries.get(norad_id, (0, 0))
+            if now < retry_at:
+                continue
+            data = self.fetch(norad_id)
+            if not data:
+                delay = min(self.refresh, TLE_RETRY * 2 ** failures)
+                self.retries[norad_id] = (now + delay, failures + 1)
+                logging.error(f"TLE fetch failed for satellite {norad_id}, retry in {delay}s")
+                continue
+            self.retries.pop(norad_id, None)
+            ## an invalid TLE is not fetched again until the next refresh
+            self.fetched[norad_id] = now
+            try:
+                tle = parse_tle(data['line1'], data['line2'])
+            except (KeyError, ValueError) as e:
+                logging.error(f"Invalid TLE for satellite {norad_id}: {e}")
+                continue
+            self.tles[norad_id] = tle
+            self.names[norad_id] = data.get('name', str(norad_id))
+            changed = True
+
+        if changed:
+            self.elements = Elements([self.tles[k] for k in sorted(self.tles)])
+
+    def snapshot(self):
+        '''Return the TLEs as a JSON serializable dict.'''
+        with self.lock:
+            return {str(k): {'tle': tle, 'name': self.names[k], 'fetched': self.fetched.get(k, 0)}
+                    for k, tle in self.tles.items()}
+
+    def restore(self, data):
+        '''Use the TLEs of a snapshot() until they are refreshed.'''
+        with self.lock:
+            for key, entry in data.items():
+                norad_id = int(key)
+                if norad_id in self.tles:
+                    continue
+                self.tles[norad_id] = entry['tle']
+                self.names[norad_id] = entry['name']
+                self.fetched[norad_id] = entry['fetched']
+            if self.tles:
+                self.elements = Elements([self.tles[k] for k in sorted(self.tles)])
+
+    def propagate(self, times):
+        '''Return the NORAD ids and their TEME position and velocity at times.'''
+        if self.elements is None:
+            return [], None, None
+        r, v = sgp4(self.elements, times)
+        return self.elements.norad_ids, r, v
+
+    def positions(self, times):
+        '''Return a dict mapping every NORAD id on a list of payloads, one
+        payload per timestamp in times.
+
+        The payloads carry whole seconds, the positions are computed at the
+        published timestamp rather than at the fractional times.
+        '''
+        times = np.floor(np.asarray(times, dtype=float).ravel())
+        norad_ids, r, v = self.propagate(times)
+        if not norad_ids:
+            return {}
+
+        lat, lon, alt = ecef_to_geodetic(teme_to_ecef(r, times))
+        speed = np.linalg.norm(v, axis=-1) * 3600.0
+        sun, sun_ra, sun_dec = sun_position(times)
+        lit = sunlit(r, sun)
+        covered = footprint(alt)
+        solar_lon = np.mod(np.degrees(sun_ra - gmst(times)), 360.0)
+        solar_lat = np.degrees(sun_dec)
+        daynum = julian_date(times)
+
+        results = {}
+        for i, norad_id in enumerate(norad_ids):
+            samples = []
+            for j, timestamp in enumerate(times):
+                if np.isnan(alt[i, j]):
+                    continue
+                samples.append({
+                    'name': self.names[norad_id],
+                    'id': norad_id,
+                    'latitude': float(lat[i, j]),
+                    'longitude': float(lon[i, j]),
+                    'altitude': float(alt[i, j]),
+                    'velocity': float(speed[i, j]),
+                    'visibility': 'daylight' if lit[i, j] else 'eclipsed',
+                    'footprint': float(covered[i, j]),
+                    'timestamp': int(timestamp),
+                    'daynum': float(daynum[j]),
+                    'solar_lat': float(solar_lat[j]),
+                    'solar_lon': float(solar_lon[j]),
+                    'units': 'kilometers',
+                })
+            if samples:
+                results[norad_id] = samples
+        return results
@@ -0,0 +1,160 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import json
+import asyncio
+import logging
+import collections
+
+import grpc
+
+import telemetry_service_pb2
+import telemetry_service_pb2_grpc
+
+import metrics
+
+## Maximum number of pending publish requests
+QUEUE_SIZE = 16
+
+
+class TelemetryPublisher(object):
+    '''Publish objects in the state datastore from a background task.
+
+    publish() and delete() only queue the request, the RPCs to sdk_mgr are
+    sent by the run() task using a single grpc.aio telemetry stub, so they
+    overlap with the fetches of the caller.  Consecutive updates are merged
+    while they wait in the bounded queue (newer objects take precedence),
+    so run() sends a single TelemetryUpdateRequest for all of them and
+    publish() only waits when maxsize deletes are pending.  Only the leaves
+    that differ from the last published state of a js_path are sent;
+    sdk_mgr merges them into the object it already holds.  The first
+    update of a js_path, and the first update after its deletion, carries
+    all leaves.
+
+    Objects are dicts of leaf name on value, e.g. {"latitude": {"value": "1.0"}}.
+    The RPCs are timed in stats as the 'telemetry-update' and
+    'telemetry-delete' stages.
+    '''
+
+    def __init__(self, channel, metadata, maxsize=QUEUE_SIZE, stats=None):
+        self.stub = telemetry_service_pb2_grpc.SdkMgrTelemetryServiceStub(channel)
+        self.metadata = metadata
+        self.stats = stats or metrics.Metrics()
+        self.maxsize = maxsize
+        self.queue = collections.deque()
+        self.cond = asyncio.Condition()
+        self.published = {}
+
+    async def stop(self):
+        '''Queue the end of the run() task, after all pending requests.'''
+        await self._put(None)
+
+    async def publish(self, path_obj_list):
+        '''Queue an update of a list of (js_path, object) tuples.'''
+        await self._put(('update', dict(path_obj_list)))
+
+    async def delete(self, js_paths):
+        '''Queue a delete of a list of js_paths, including their children.'''
+        await self._put(('delete', list(js_paths)))
+
+    async def _put(self, item):
+        async with self.cond:
+            tail = self.queue[-1] if self.queue else None
+            if item and tail and item[0] == 'update' and tail[0] == 'update':
+                tail[1].update(item[1])
+                return
+            await self.cond.wait_for(lambda: len(self.queue) < self.maxsize)
+            self.queue.append(item)
+            self.cond.notify_all()
+
+    async def _get(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.queue)
+            item = self.queue.popleft()
+            self.cond.notify_all()
+            return item
+
+    async def run(self):
+        while True:
+            item = await self._get()
+            if item is None:
+                return
+            op, payload = item
+            if op == 'update':
+                await self._send_update(payload)
+            else:
+                await self._send_delete(payload)
+
+    def _delta(self, js_path, obj):
+        last = self.published.get(js_path)
+        if last is None:
+            return obj
+        return {k: v for k, v in obj.items() if last.get(k) != v}
+
+    ############################################################
+    ## update objects in the state datastore
+    ## using the telemetry grpc service
+    ## All changed objects are sent in a single TelemetryUpdateRequest
+    ############################################################
+    async def _send_update(self, pending):
+        changes = {}
+        for js_path, obj in pending.items():
+            delta = self._delta(js_path, obj)
+            if delta:
+                changes[js_path] = delta
+        if not changes:
+            return
+
+        # Build an telemetry update service request
+        telemetry_update_request = telemetry_service_pb2.TelemetryUpdateRequest()
+
+        # Add the YANG Path and Attribute/Value pair to the request
+        for js_path, delta in changes.items():
+            telemetry_info = telemetry_update_request.state.add()
+            telemetry_info.key.js_path = js_path
+            telemetry_info.data.json_content = json.dumps(delta)
+
+        ## formatted by the log writer thread, only when debug is enabled
+        logging.debug("Telemetry_Update_Request ::\n%s", telemetry_update_request)
+
+        # Call the telemetry RPC
+        try:
+            with self.stats.timer('telemetry-update'):
+                await self.stub.TelemetryAddOrUpdate(request=telemetry_update_request, metadata=self.metadata)
+        except grpc.RpcError as e:
+            ## keep the last published state, the changes are resent next time
+            logging.error(f"TelemetryAddOrUpdate failed: {e}")
+            return
+
+        for js_path, delta in changes.items():
+            self.published.setdefault(js_path, {}).update(delta)
+
+    ############################################################
+    ## delete objects in the state datastore
+    ## using the telemetry grpc service
+    ############################################################
+    async def _send_delete(self, js_paths):
+        # Build an telemetry delete service request
+        telemetry_del_request = telemetry_service_pb2.TelemetryDeleteRequest()
+
+        # Specify which YANG path to delete
+        for path in js_paths:
+            telemetry_key = telemetry_del_request.key.add()
+            telemetry_key.js_path = path
+
+        logging.debug("Telemetry_Delete_Request :: %s", telemetry_del_request)
+
+        # Call the telemetry RPC
+        try:
+            with self.stats.timer('telemetry-delete'):
+                await self.stub.TelemetryDelete(request=telemetry_del_request, metadata=self.metadata)
+        except grpc.RpcError as e:
+            logging.error(f"TelemetryDelete failed: {e}")
+
+        ## forget the deleted objects and their children
+        for path in js_paths:
+            for js_path in list(self.published):
+                if js_path == path or js_path.startswith(path + '.'):
+                    del self.published[js_path]
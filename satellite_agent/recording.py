@@ -0,0 +1,141 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Capture and replay of API responses
+## Raw responses are appended to a compact binary file with
+## the time they were received, so an incident can be
+## reproduced, or the telemetry path soak tested, by feeding
+## them back through the agent without network access
+############################################################
+import time
+import struct
+import logging
+import threading
+import collections
+
+## Default location of the capture file
+CAPTURE_PATH = '/var/log/srlinux/satellite/capture.rec'
+## Default upper bound in bytes of the capture file, capture stops there
+MAX_SIZE = 100 * 1024 * 1024
+
+## The file starts with MAGIC, followed by the records, each one a
+## HEADER (received time, HTTP status, url and body length) then the
+## url and the raw body. Status 0 is a request without response, its
+## body is the error
+MAGIC = b'SATREC1\n'
+HEADER = struct.Struct('<dHHI')
+
+## Records received within BATCH_WINDOW seconds of the first record of a
+## batch belong to the same fetch cycle and are replayed together, a
+## batch ends earlier at the second response of an url
+BATCH_WINDOW = 1.0
+
+## A captured response
+Record = collections.namedtuple('Record', 'received url status body')
+
+
+class Recorder(object):
+    '''Append captured responses to the file at path.
+
+    record() is called from the worker threads doing the requests, every
+    record is flushed as a whole so a crash loses at most the last one.
+    Capture stops once the file reaches max_size bytes.
+    '''
+
+    def __init__(self, path=CAPTURE_PATH, max_size=MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+            self.file.flush()
+
+    def record(self, url, status, body, received=None):
+        url = url.encode('utf-8')
+        record = HEADER.pack(received or time.time(), status, len(url), len(body)) + url + body
+        with self.lock:
+            if self.file is None:
+                return
+            if self.file.tell() + len(record) > self.max_size:
+                logging.error(f"Capture file {self.path} reached {self.max_size} bytes, capture stopped")
+                self.file.close()
+                self.file = None
+                return
+            self.file.write(record)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def read(path):
+    '''Yield the records of the capture file at path in order.
+
+    A record truncated by a crash during capture ends the file.
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            received, status, url_length, body_length = HEADER.unpack(header)
+            url = f.read(url_length)
+            body = f.read(body_length)
+            if len(url) < url_length or len(body) < body_length:
+                logging.error(f"Capture file {path} ends with a truncated record")
+                return
+            yield Record(received, url.decode('utf-8'), status, body)
+
+
+class Replayer(object):
+    '''Replay captured responses with their original timing.
+
+    batches() groups the records of a fetch cycle and yields them with the
+    delay to wait before the batch, the captured gaps divided by speed (0
+    replays as fast as possible).  latest() returns the last replayed
+    record of an url, it answers the other requests of the agent (e.g.
+    the TLEs) without network access.
+    '''
+
+    def __init__(self, records, speed=1.0):
+        self.records = records
+        self.speed = speed
+        self.replayed = {}
+        self.clock = None
+
+    def batches(self):
+        batch = []
+        urls = set()
+        previous = None
+        for record in self.records:
+            if batch and (record.received - batch[0].received > BATCH_WINDOW or record.url in urls):
+                yield self._delay(previous, batch[0]), batch
+                previous = batch[0].received
+                batch = []
+                urls.clear()
+            batch.append(record)
+            urls.add(record.url)
+        if batch:
+            yield self._delay(previous, batch[0]), batch
+
+    def _delay(self, previous, first):
+        if previous is None or not self.speed:
+            return 0.0
+        return max(0.0, first.received - previous) / self.speed
+
+    def replay(self, record):
+        '''Mark record as replayed, its receive time becomes the replay clock.'''
+        self.replayed[record.url] = record
+        self.clock = record.received
+
+    def latest(self, url):
+        return self.replayed.get(url)
@@ -4,11 +4,34 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 # coding=utf-8
-import urllib.request
-import urllib.error
+import http.client
 import netns
+import fleet
+import httpclient
+import publisher
+import scheduler
+import extrapolation
+import history
+import snapshot
+import metrics
+import recording
+import encoder
+import configuration
+import policy
+import spatial
+import sources
+import backfill
+import logs
+try:
+    import propagation
+    import passes
+except ImportError:
+    ## NumPy is required for the 'propagate' mode and the pass prediction only
+    propagation = None
+    passes = None
 
 import grpc
+import asyncio
 import datetime
 import sys
 import logging
@@ -17,15 +40,16 @@ import os
 import ipaddress
 import signal
 import time
-import threading
 import json
+import argparse
+import functools
+import urllib.parse
+import concurrent.futures
 
 import sdk_service_pb2
 import sdk_service_pb2_grpc
 import sdk_common_pb2
 import config_service_pb2
-import telemetry_service_pb2
-import telemetry_service_pb2_grpc
 
 ############################################################
 ## Agent will start with this name
@@ -35,62 +59,170 @@ metadata = [('agent_name', agent_name)]
 
 ############################################################
 ## Global parameters:
-## Open a GRPC channel to connect to the SR Linux sdk_mgr
-## sdk_mgr will be listening on 50053
-## and create an SDK service client stub
+## The agent runs as asyncio tasks on a single event loop
+## The GRPC channel to the SR Linux sdk_mgr (listening on 50053)
+## and the SDK service client stubs are created in run_agent(),
+## grpc.aio channels must be created inside the event loop
 ############################################################
 
-channel = grpc.insecure_channel('127.0.0.1:50053')
-stub = sdk_service_pb2_grpc.SdkMgrServiceStub(channel)
-sdk_notification_service_client = sdk_service_pb2_grpc.SdkNotificationServiceStub(channel)
-
-## Verify that SIGTERM signal was received
-sigterm_exit = False
-interval = 10
+SDK_MGR_ADDRESS = '127.0.0.1:50053'
+channel = None
+stub = None
+sdk_notification_service_client = None
+
+## Network namespace with internet access, None runs the requests
+## in the namespace of the agent (e.g. benchmarks outside SR Linux)
+MGMT_NAMESPACE = 'srbase-mgmt'
+
+## Latency and errors of every stage of the agent, published
+## under '.satellite.statistics' every STATISTICS_INTERVAL seconds
+stats = metrics.Metrics()
+STATISTICS_INTERVAL = 10
+
+## Keep-alive http client, requests run on the 'executor' workers so
+## its sockets are created in the mgmt network namespace
+http_client = httpclient.KeepAliveClient(stats=stats)
+## Worker threads pinned to the mgmt network namespace
+executor = None
+## Upstreams of the positions and TLEs, the entries of the 'source' list,
+## asked with a deadline in the order of their health score
+source_pool = None
+
+## Publishes the state datastore from its own task with one
+## telemetry stub, sending only the leaves that changed
+telemetry = None
+
+## Running configuration (configuration.Config), replaced as a whole at
+## the end of every commit. Readers take one reference of it per cycle
+## mode 'api' polls every sample over http, 'propagate' computes
+## the positions locally from TLEs
+config = configuration.DEFAULT
+## Configuration of the commit being received, applied at '.commit.end'
+pending = None
+## Error of a notification of the commit being received, rejects the commit
+pending_error = None
+
+## The wheretheiss API does not allow polling faster than this
+API_MIN_INTERVAL = 3
+## Requests per second (and burst) allowed by the wheretheiss API,
+## shared by all tracked satellites
+API_RATE = 1
+API_BURST = 4
+rate_limiter = scheduler.RateLimiter(API_RATE, API_BURST)
+
+## Schedules of the fetch and extrapolation tasks, woken when a new
+## configuration changes what or how often they publish
+fetch_schedule = None
+extrapolate_schedule = None
+
+## Latest sample of every tracked satellite
+last_samples = {}
+## Last fixes of every tracked satellite, estimating the positions between samples
+extrapolator = extrapolation.Extrapolator()
+## Selects the fetched and estimated samples worth publishing, following
+## the 'publish' container
+publish_policy = policy.PublishPolicy()
+
+## Ground track history of every tracked satellite
+track_history = history.History()
+## Satellites whose published entry was deleted along with its ground track
+## and passes after a failed fetch, all of them are published again with
+## the next sample
+deleted_entries = set()
+## Gaps of the ground tracks left by outages and restarts, filled by the
+## backfill task on its schedule, which is woken when a gap is recorded
+gaps = backfill.GapTracker()
+backfill_schedule = None
+
+## Current earth fixed position of every tracked satellite, fetched or
+## estimated, answering the queries of the 'nearby' container
+spatial_index = spatial.SpatialIndex()
+## JSON paths of the published 'nearby' entries
+published_nearby = set()
+
+## Upcoming passes are only predicted while the 'site' container is configured
+## Cadence in seconds at which the upcoming passes are checked,
+## they are only recomputed when the TLEs or the site change
+PASS_INTERVAL = 60
+## Schedule of the pass prediction task, woken when the site changes
+pass_schedule = None
+## Number of passes published at every JSON path
+published_passes = {}
+
+## Set when the configuration of a commit is complete ('.commit.end'),
+## sampling starts and the restored state is published once the initial
+## configuration is known
+config_ready = None
+## Seconds to wait for the initial configuration before starting anyway
+CONFIG_WAIT = 2
+## Seconds the last known positions stay published, with their age,
+## while no sample can be fetched
+STALE_AGE = 600
+
+## Appends the raw API responses to a capture file while the 'capture'
+## container is configured
+recorder = None
+## Capture file replayed instead of polling the API (--replay), at
+## REPLAY_SPEED times the captured pace (0 replays as fast as possible)
+REPLAY_FILE = None
+REPLAY_SPEED = 1.0
+## Answers the requests from the replayed responses, no network access
+replayer = None
+
+## Queue, writer thread and rotated file of the log, started in __main__
+log_writer = None
 
 ############################################################
 ## Gracefully handle SIGTERM signal (SIGTERM number = 15)
-## When called, will unregister Agent and gracefully exit
+## When called, cancels the agent tasks. run_agent() will
+## then unregister the agent and exit
 ############################################################
-def exit_gracefully(signum, frame):
+def exit_gracefully(signum, tasks):
     logging.info("Caught signal :: {}\n will unregister satellite agent".format(signum))
+    for task in tasks:
+        task.cancel()
+
+############################################################
+## Unregister the agent from sdk_mgr
+############################################################
+async def unregister_agent():
     try:
-        # Set global sigterm_exit to true
-        global sigterm_exit
-        sigterm_exit = True
         logging.info(f"Unregister Agent")
 
         # Unregister agent
         unregister_request = sdk_service_pb2.AgentRegistrationRequest()
-        unregister_response = stub.AgentUnRegister(request=unregister_request, metadata=metadata)
+        unregister_response = await stub.AgentUnRegister(request=unregister_request, metadata=metadata)
         logging.info(f"Unregister response:: {sdk_common_pb2.SdkMgrStatus.Name(unregister_response.status)}")
-    except grpc._channel._Rendezvous as err:
+    except grpc.RpcError as err:
         logging.error('GOING TO EXIT NOW: {}'.format(err))
-        sys.exit()
-
-## Keep Alive thread: send a keep every 10 seconds via gRPC call
-def send_keep_alive():
-    ## exit the thread when sigterm is received
-    while not sigterm_exit:
-        global interval
-        logging.info("Send Keep Alive")
+
+## Keep Alive task: send a keep every 10 seconds via gRPC call
+async def send_keep_alive():
+    ## the task is cancelled when sigterm is received
+    while True:
+        logging.debug("Send Keep Alive")
         keepalive_request = sdk_service_pb2.KeepAliveRequest()
-        keepalive_response = stub.KeepAlive(request=keepalive_request, metadata=metadata)
-        if keepalive_response.status == sdk_common_pb2.SdkMgrStatus.Value("kSdkMgrFailed"):
-            logging.error("Keep Alive failed")
-        time.sleep(10)
+        try:
+            with stats.timer('keepalive'):
+                keepalive_response = await stub.KeepAlive(request=keepalive_request, metadata=metadata)
+            if keepalive_response.status == sdk_common_pb2.SdkMgrStatus.Value("kSdkMgrFailed"):
+                stats.error('keepalive', 'kSdkMgrFailed')
+                logging.error("Keep Alive failed")
+        except grpc.RpcError as err:
+            logging.error(f"Keep Alive raised with error: {err}")
+        await asyncio.sleep(10)
 
 #####################################
 ## Create an SDK notification stream
 #####################################
-def create_sdk_stream():
+async def create_sdk_stream():
 
     # build Create request
     op = sdk_service_pb2.NotificationRegisterRequest.Create
     request=sdk_service_pb2.NotificationRegisterRequest(op=op)
 
     # call SDK RPC to create a new stream
-    notification_response = stub.NotificationRegister(
+    notification_response = await stub.NotificationRegister(
         request=request,
         metadata=metadata)
 
@@ -106,7 +238,7 @@ def create_sdk_stream():
 #########################################################
 ## Use notification stream to subscribe to 'config events
 #########################################################
-def add_sdk_config_subscription(stream_id):
+async def add_sdk_config_subscription(stream_id):
 
     # Build subscription request for config events
     subs_request=sdk_service_pb2.NotificationRegisterRequest(
@@ -115,7 +247,7 @@ def add_sdk_config_subscription(stream_id):
         config=config_service_pb2.ConfigSubscriptionRequest())
 
     # Call RPC
-    subscription_response = stub.NotificationRegister(
+    subscription_response = await stub.NotificationRegister(
         request=subs_request,
         metadata=metadata)
 
@@ -147,166 +279,771 @@ def start_notification_stream(stream_id):
 ########################################################
 ## Process the received notification stream
 ## Only config events are expected
-## Exit the loop if SIGTERM is received
+## The task is cancelled when SIGTERM is received
 #########################################################
-def process_notification(notification):
+async def process_notifications(notification_stream):
+    try:
+        async for notification in notification_stream:
+            await process_notification(notification)
+    except asyncio.CancelledError:
+        logging.info("Agent Stopped Time :: {}".format(datetime.datetime.now()))
+        raise
+
+async def process_notification(notification):
     for obj in notification.notification:
         if obj.HasField("config"):
             ## Process config notification
             logging.info("--> Received config notification")
-            process_config_notification(obj)
+            await process_config_notification(obj)
         else:
             logging.info("--> Received unexpected notification")
-        if sigterm_exit:
-            ## exit loop if agent has been stopped
-            logging.info("Agent Stopped Time :: {}".format(datetime.datetime.now()))
-            return
 
 ########################################################
 ## Process specifically a config notification
-## Expects that 'interval' from 'satellite' branch has been configured
-## Will set 'response' string as a response
+## The notifications of a commit are staged in a new configuration,
+## which is validated and applied as a whole at '.commit.end'
 #########################################################
-def process_config_notification(obj):
+async def process_config_notification(obj):
+    global pending, pending_error
 
     # Convert received JSON string into a dictionary
-    data = json.loads(obj.config.data.json)
-    logging.info(f"Data :: {data}" )
-
-    # Check if the expected 'interval' filed is present
-    if 'interval' in data:
-
-        # extract its value from dictionary
-        global interval
-        interval = data['interval']['value']
-
-
-############################################################
-## update a object in the state datastore
-## using the telemetry grpc service
-## Input parameters:
-## - js_path: JSON Path = the base YANG container
-## - js_data: JSON attribute/value pair(s) based on the YANG model
-############################################################
-def update_state_datastore( js_path, js_data ):
-
-    # create gRPC client stub for the Telemetry Service
-    telemetry_stub = telemetry_service_pb2_grpc.SdkMgrTelemetryServiceStub(channel)
-
-    # Build an telemetry update service request
-    telemetry_update_request = telemetry_service_pb2.TelemetryUpdateRequest()
-
-    # Add the YANG Path and Attribute/Value pair to the request
-    # for js_path,js_data in path_obj_list:
-    telemetry_info = telemetry_update_request.state.add()
-    telemetry_info.key.js_path = js_path
-    telemetry_info.data.json_content = js_data
-
-    # Log the request
-    logging.info(f"Telemetry_Update_Request ::\n{telemetry_update_request}")
-
-    # Call the telemetry RPC
-    telemetry_response = telemetry_stub.TelemetryAddOrUpdate(
-        request=telemetry_update_request,
-        metadata=metadata)
-
-    return telemetry_response
-
-############################################################
-## delete a object in the state datastore
-## using the telemetry grpc service
-## Input parameters:
-## - js_path: JSON Path = the base YANG container
-############################################################
-def delete_state_datastore(js_paths):
-
-    # create gRPC client stub for the Telemetry Service
-    telemetry_stub = telemetry_service_pb2_grpc.SdkMgrTelemetryServiceStub(channel)
-
-    # Build an telemetry delete service request
-    telemetry_del_request = telemetry_service_pb2.TelemetryDeleteRequest()
-
-    # Specify which YANG path to delete
-    for path in js_paths:
-      telemetry_key = telemetry_del_request.key.add()
-      telemetry_key.js_path = path
-
-    # Log the request
-    logging.info(f"Telemetry_Delete_Request :: {telemetry_del_request}")
-
-    # Call the telemetry RPC
-    telemetry_response = telemetry_stub.TelemetryDelete(request=telemetry_del_request, metadata=metadata)
-    return telemetry_response
-
-## Fetch data with http request.
-def http_request(url):
-    ## switch namespace when making http request
-    with netns.NetNS(nsname="srbase-mgmt"):
-        try:
-            response = urllib.request.urlopen(url).read()
-            data = response.decode('utf-8')
-            data = json.loads(data)
-
-        except urllib.error.HTTPError as e:
-            logging.error(f"HTTPError raised with error: {e}")
-            data = {}
-        except urllib.error.URLError as e:
-            logging.error(f"URLError raised with error: {e}")
-            data = {}
-
-    return data
-
-## Get satellite data thread: fetch data every X seconds. X defined by user. default 10 seconds
-def get_satellite_data():
-    ## exit the thread when sigterm is received
-    while not sigterm_exit:
-        ## make the http request
-        url = "https://api.wheretheiss.at/v1/satellites/25544"
-        response = http_request(url)
-
-        if response:
-            ## Convert dict to a dict TelemtryUpdateRequests understands
-            data = {k:{"value":str(v)} for k,v in response.items()}
-
-            logging.info(f"DATA for Telemetry :: {data}")
-
-            ## Convert epoch timestamp and update dictionary
-            date = datetime.datetime.fromtimestamp( int(data['timestamp']['value']) )
-            data['timestamp']['value'] = str(date)
-
-            ## Update State datastore
-            logging.info(f"name         = {data['name']['value']}")
-            logging.info(f"id           = {data['id']['value']}")
-            logging.info(f"latitude     = {data['latitude']['value']}")
-            logging.info(f"longitude    = {data['longitude']['value']}")
-            logging.info(f"altitude     = {data['altitude']['value']}")
-            logging.info(f"velocity     = {data['velocity']['value']}")
-            logging.info(f"visibility   = {data['visibility']['value']}")
-            logging.info(f"footprint    = {data['footprint']['value']}")
-            logging.info(f"timestamp    = {data['timestamp']['value']}")
-            logging.info(f"daynum       = {data['daynum']['value']}")
-            logging.info(f"solar_lat    = {data['solar_lat']['value']}")
-            logging.info(f"solar_lon    = {data['solar_lon']['value']}")
-            logging.info(f"units        = {data['units']['value']}")
-
-            update_state_datastore( js_path='.satellite',js_data=json.dumps(data))
+    # Delete notifications come without data
+    data = json.loads(obj.config.data.json) if obj.config.data.json else {}
+    logging.debug("Data :: %s", data)
+
+    js_path = obj.config.key.js_path
+    if js_path == '.commit.end':
+        ## All notifications of a commit (or of the initial configuration) are received
+        staged, error = pending, pending_error
+        pending = pending_error = None
+        if error:
+            logging.error(f"Configuration rejected, keeping the running configuration: {error}")
+        elif staged:
+            try:
+                configuration.validate(staged)
+            except ValueError as e:
+                logging.error(f"Configuration rejected, keeping the running configuration: {e}")
+            else:
+                await apply_config(staged)
+        config_ready.set()
+        return
+
+    deleted = obj.config.op == sdk_common_pb2.SdkMgrOperation.Value("Delete")
+    try:
+        pending = configuration.parse(pending or config, js_path, obj.config.key.keys, deleted, data)
+    except (KeyError, TypeError, ValueError) as e:
+        pending_error = f"{js_path}: {e}"
+
+## Apply a new configuration: swap it in, then re-plan once for the whole
+## commit. The state of satellites (or JSON paths) no longer tracked is deleted
+## and the tasks affected by the change are woken, so it takes effect now
+async def apply_config(new):
+    global config
+    old, config = config, new
+
+    stale = []
+    for key in sorted(tracked_ids(old)):
+        paths = satellite_paths(key, new)
+        if paths != satellite_paths(key, old):
+            ## published at other JSON paths, the next sample is sent in full
+            publish_policy.forget(key)
+        for path in satellite_paths(key, old):
+            if path in paths:
+                continue
+            if path == '.satellite':
+                ## the flat container shows another satellite, drop the
+                ## children of the previous one
+                track = track_history.get(key)
+                stale += [track_js_path(path, slot) for slot in range(len(track) if track else 0)]
+                stale += [pass_js_path(path, index) for index in range(published_passes.get(path, 0))]
+            else:
+                stale.append(path)
+            published_passes.pop(path, None)
+        if not paths:
+            track_history.remove(key)
+            deleted_entries.discard(key)
+            last_samples.pop(key, None)
+            extrapolator.remove(key)
+            spatial_index.remove(key)
+            gaps.forget(key)
+    if stale:
+        await telemetry.delete(stale)
+
+    ## satellites published at a new JSON path bring their ground track along
+    moved = [key for key in sorted(tracked_ids(new) & tracked_ids(old))
+             if set(satellite_paths(key, new)) - set(satellite_paths(key, old))]
+    path_obj_list = [obj for key in moved for obj in history_objects(key)]
+    if path_obj_list:
+        await telemetry.publish(path_obj_list)
+
+    if new.history_size != old.history_size:
+        await resize_history(new.history_size)
+
+    if new.capture != old.capture:
+        open_recorder(new.capture)
+
+    if log_writer and new.log != old.log:
+        log_writer.set_level(new.log.level)
+        log_writer.set_max_size(new.log.max_size)
+
+    if source_pool and (new.sources, new.fetch) != (old.sources, old.fetch):
+        source_pool.configure(build_sources(new), new.fetch.deadline, new.fetch.hedge_delay)
+
+    tracked_changed = tracked_ids(new) != tracked_ids(old)
+    if tracked_changed or (new.site, new.proximity) != (old.site, old.proximity):
+        ## the cells are at least as large as the separation of the pairs
+        spatial_index.resize(max(new.proximity.separation, spatial.CELL_SIZE))
+        await publish_nearby()
+
+    if fetch_schedule and (tracked_changed or (new.interval, new.mode) != (old.interval, old.mode)):
+        fetch_schedule.set_interval(sample_interval())
+        fetch_schedule.wake()
+    if extrapolate_schedule and (new.extrapolation_interval, new.mode) != (old.extrapolation_interval, old.mode):
+        extrapolate_schedule.set_interval(new.extrapolation_interval or extrapolation.IDLE_INTERVAL)
+        extrapolate_schedule.wake()
+    if pass_schedule and (tracked_changed or (new.site, new.tle_refresh) != (old.site, old.tle_refresh)):
+        pass_schedule.wake()
+
+## Return the sources.Source of the entries of the 'source' list
+## The requests to the public wheretheiss API wait for its rate limit
+def build_sources(cfg=None):
+    cfg = cfg or config
+    limiters = {urllib.parse.urlsplit(sources.WHERETHEISS_URL).netloc: rate_limiter}
+    return [sources.create(entry.name, entry.type, entry.url, limiters)
+            for entry in cfg.sources or configuration.DEFAULT_SOURCES]
+
+## Start, change or stop the capture of the API responses
+def open_recorder(capture):
+    global recorder
+    previous = recorder
+    recorder = None
+    if previous:
+        previous.close()
+    if not capture:
+        return
+    try:
+        os.makedirs(os.path.dirname(capture.file), exist_ok=True)
+        recorder = recording.Recorder(capture.file, capture.max_size)
+        logging.info(f"Capturing API responses in {capture.file}")
+    except OSError as e:
+        logging.error(f"Opening capture file {capture.file} failed: {e}")
+
+## Change the capacity of the ground track history
+## The published track entries are deleted, they belong to the old ring buffers
+## The kept samples are published again in their new slots
+async def resize_history(capacity):
+    if capacity == track_history.capacity:
+        return
+    paths = [track_js_path(path, slot)
+             for key, track in track_history.tracks.items()
+             for path in satellite_paths(key)
+             for slot in range(len(track))]
+    track_history.resize(capacity)
+    if paths:
+        await telemetry.delete(paths)
+
+    path_obj_list = [obj for key in list(track_history.tracks) for obj in history_objects(key)]
+    if path_obj_list:
+        await telemetry.publish(path_obj_list)
+
+## Return the set of satellites which have to be fetched every cycle
+def tracked_ids(cfg=None):
+    cfg = cfg or config
+    return cfg.norad_ids | {cfg.norad_id}
+
+## Return the JSON path of a list entry of the tracked satellites
+def satellite_js_path(key):
+    return '.satellite.satellite{.norad_id==%d}' % key
+
+## Return the JSON paths at which satellite key is published
+def satellite_paths(key, cfg=None):
+    cfg = cfg or config
+    paths = []
+    if key in cfg.norad_ids:
+        paths.append(satellite_js_path(key))
+    if key == cfg.norad_id:
+        paths.append('.satellite')
+    return paths
+
+## Return the JSON path of a ground track history entry
+def track_js_path(path, slot):
+    return '%s.track{.index==%d}' % (path, slot)
+
+## Return the JSON path of an upcoming pass
+def pass_js_path(path, index):
+    return '%s.passes{.index==%d}' % (path, index)
+
+## Return the JSON path of a satellite near the site
+def nearby_js_path(key):
+    return '.satellite.nearby.satellite{.norad_id==%d}' % key
+
+## Return the JSON path of a pair of satellites close to each other
+def pair_js_path(key, other):
+    return '.satellite.nearby.pair{.name=="%d-%d"}' % (key, other)
+
+
+## Send a GET request to url, return the status and raw body of the
+## response, status 0 and the error when no response was received.
+## Must run on an 'executor' worker, which lives in the srbase-mgmt namespace
+## The connection is reused between requests, its sockets time out at
+## the deadline of the request (time.monotonic()), measured once the rate
+## limit let it through
+## While replaying, the latest replayed response of url is returned instead
+def http_get(url, deadline=None, limiter=None):
+    if replayer:
+        record = replayer.latest(url)
+        return (record.status, record.body) if record else (0, b'not captured')
+
+    ## wait for the rate limit of the API, unless the request would be sent
+    ## after its deadline: give up without taking a token
+    if limiter:
+        with stats.timer('rate-limit'):
+            sent = limiter.acquire(deadline)
+        if not sent:
+            stats.error('rate-limit', 'deadline')
+            return 0, b'rate limited past the deadline'
+    timeout = None
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return 0, b'deadline passed before the request was sent'
+
+    capture = recorder
+    try:
+        response = http_client.get(url, timeout=timeout)
+    except (http.client.HTTPException, OSError) as e:
+        if capture:
+            capture.record(url, 0, str(e).encode('utf-8'))
+        return 0, str(e).encode('utf-8')
+
+    if capture:
+        capture.record(url, response.status, response.body)
+
+    if response.status in (429, 503) and limiter:
+        ## too many requests, stop all requests for the time asked by the server
+        retry_after = scheduler.parse_retry_after(response.headers.get('Retry-After'))
+        logging.error(f"HTTP Error {response.status}, pausing requests for {retry_after} seconds")
+        limiter.pause(retry_after)
+
+    return response.status, response.body
+
+## Return the latest position of every satellite in ids
+## In 'propagate' mode positions are computed locally, satellites without
+## usable TLEs (unknown or deep space orbits) fall back to the API
+async def fetch_positions(ids, fetcher, propagator):
+    responses = {}
+
+    cfg = config
+    if cfg.mode == 'propagate' and propagator:
+        ## TLE refreshes are http requests, run them on the executor
+        propagator.refresh = cfg.tle_refresh
+        await asyncio.wrap_future(executor.submit(propagator.update, ids))
+        with stats.timer('propagate'):
+            positions = propagator.positions([time.time()])
+        responses = {k:v[-1] for k,v in positions.items() if k in ids}
+
+    missing = ids - responses.keys()
+    if missing:
+        responses.update(await fetcher.fetch_all(missing))
+
+    return responses
+
+## Build the (js_path, object) list of a dict of samples keyed by NORAD id
+def sample_objects(samples):
+    path_obj_list = []
+    for key in sorted(samples):
+        data = encoder.encode(samples[key])
+        for path in satellite_paths(key):
+            path_obj_list.append((path, data))
+    return path_obj_list
+
+## Add a sample to the ground track history, return the (js_path, object)
+## list of the track entry it overwrote
+def track_objects(key, sample):
+    slot = track_history.append(key, int(sample['timestamp']), float(sample['latitude']),
+                                float(sample['longitude']), float(sample['altitude']), float(sample['velocity']))
+    if slot is None:
+        return []
+
+    data = encoder.encode_track(sample)
+    return [(track_js_path(path, slot), data) for path in satellite_paths(key)]
+
+## Return the (js_path, object) list of all track entries of satellite key
+def history_objects(key):
+    track = track_history.get(key)
+    if not track:
+        return []
+
+    path_obj_list = []
+    for point in track.points():
+        data = encoder.encode_point(point)
+        path_obj_list += [(track_js_path(path, point.slot), data) for path in satellite_paths(key)]
+    return path_obj_list
+
+## Return the sample interval, the API can not be polled faster than API_MIN_INTERVAL
+## nor faster than its rate limit allows for a request per tracked satellite
+def sample_interval(cfg=None):
+    cfg = cfg or config
+    if cfg.mode == 'propagate':
+        return float(cfg.interval)
+    return max(float(cfg.interval), API_MIN_INTERVAL, len(tracked_ids(cfg)) / rate_limiter.rate)
+
+## Get satellite data task: fetch data every X seconds. X defined by user. default 10 seconds
+## Samples are taken at fixed deadlines, failures back off exponentially
+## A new configuration wakes the schedule, the next sample is taken right away
+## Publishing only queues the update, the RPC overlaps with the next fetch
+async def get_satellite_data(fetcher, propagator, extrapolator):
+    schedule = fetch_schedule
+    await wait_config()
+
+    ## the task is cancelled when sigterm is received
+    while True:
+        await schedule.wait()
+
+        ## make the http requests
+        ids = tracked_ids()
+        with stats.timer('fetch'):
+            responses = await fetch_positions(ids, fetcher, propagator)
+
+        if responses:
+            await publish_samples(responses, extrapolator, time.time())
+
+            failed = [satellite_js_path(key) for key in sorted(ids - responses.keys()) if key in config.norad_ids]
+            if failed:
+                logging.error(f"HTTP request failed for {failed}")
+                for key in ids - responses.keys():
+                    if key in config.norad_ids:
+                        publish_policy.forget(key)
+                        spatial_index.remove(key)
+                        deleted_entries.add(key)
+                await telemetry.delete(failed)
+                await publish_nearby()
+
+            schedule.set_interval(sample_interval())
+            schedule.success()
         else:
             logging.error("HTTP request failed. Please verify DNS settings or internet connectivity")
-            delete_state_datastore(['.satellite'])
-
-        # Set sample interval
-        global interval
-        time.sleep(float(interval))
+            await publish_last_known(ids, int(time.time()))
+
+            schedule.set_interval(sample_interval())
+            schedule.failure(rate_limiter.remaining_pause())
+
+## Publish the last known positions of satellites ids while none can be fetched
+## Estimated positions keep flowing while extrapolation is enabled, otherwise
+## the last samples are published again with their age. Both stop once the
+## samples are older than STALE_AGE, then the satellites are deleted
+async def publish_last_known(ids, now):
+    known = {key: dict(last_samples[key], age=max(0, now - int(last_samples[key]['timestamp'])))
+             for key in ids if key in last_samples}
+    recent = {key: sample for key, sample in known.items() if sample['age'] <= STALE_AGE}
+    if not recent:
+        publish_policy.forget()
+        published_nearby.clear()
+        deleted_entries.update(ids)
+        await telemetry.delete(['.satellite'])
+    elif not extrapolation_enabled():
+        await telemetry.publish(sample_objects(recent))
+
+## Publish the fetched samples of a cycle, keyed by NORAD id, received at time now
+## Fetched samples are exact, they feed the extrapolation and the ground tracks
+## A satellite whose entry was deleted gets its whole track and passes back
+async def publish_samples(samples, extrapolator, now):
+    ## satellites removed by a commit during the fetch are dropped
+    tracked = tracked_ids()
+    samples = {key: sample for key, sample in samples.items() if key in tracked}
+
+    path_obj_list = []
+    for key in sorted(samples):
+        sample = samples[key]
+        sample.update(estimated=False, error_bound=0, restored=False,
+                      age=max(0, int(now) - int(sample['timestamp'])))
+        last_samples[key] = sample
+        extrapolator.add(key, int(sample['timestamp']), float(sample['latitude']),
+                         float(sample['longitude']), float(sample['altitude']), float(sample['velocity']))
+        objects = track_objects(key, sample)
+        if key in deleted_entries:
+            deleted_entries.discard(key)
+            objects = history_objects(key)
+            if pass_schedule:
+                pass_schedule.wake()
+        path_obj_list += objects
+        index_sample(key, sample)
+        if backfill_schedule and config.backfill and \
+                gaps.sample(key, int(sample['timestamp']), sample_interval(), track_history.capacity):
+            backfill_schedule.wake()
+
+    ## Update State datastore with all satellites in one request
+    ## The ground track keeps every sample, the policy selects the positions
+    selected = publish_policy.select(samples, now, config.publish)
+    path_obj_list = sample_objects(selected) + path_obj_list
+    if path_obj_list:
+        await telemetry.publish(path_obj_list)
+    await publish_nearby()
+
+## Move satellite key to the position of a sample in the spatial index
+def index_sample(key, sample):
+    spatial_index.update(key, spatial.ecef(float(sample['latitude']), float(sample['longitude']),
+                                           float(sample['altitude'])))
+
+## Publish the satellites near the site or in view of it and the pairs of
+## satellites closer than the separation, as answered by the spatial index,
+## then delete the entries that are no longer near
+async def publish_nearby():
+    cfg = config
+    path_obj_list = []
+
+    if cfg.site:
+        center = spatial.ecef(cfg.site.latitude, cfg.site.longitude, cfg.site.altitude)
+        in_view = dict(spatial_index.in_view(cfg.site))
+        near = {key for key, _ in spatial_index.within(center, cfg.proximity.distance)}
+        for key in sorted(near | in_view.keys()):
+            angles = in_view.get(key) or spatial.look_angles(cfg.site, spatial_index.positions[key])
+            path_obj_list.append((nearby_js_path(key),
+                                  {"name": {"value": str(last_samples.get(key, {}).get('name', ''))},
+                                   "distance": {"value": encoder.DISTANCE(angles.distance)},
+                                   "elevation": {"value": encoder.DEGREES(angles.elevation)},
+                                   "azimuth": {"value": encoder.DEGREES(angles.azimuth)},
+                                   "in_view": {"value": encoder.boolean(key in in_view)}}))
+
+    if cfg.proximity.separation:
+        for key, other, distance in spatial_index.pairs(cfg.proximity.separation):
+            path_obj_list.append((pair_js_path(key, other),
+                                  {"norad_id": {"value": str(key)},
+                                   "other_norad_id": {"value": str(other)},
+                                   "distance": {"value": encoder.DISTANCE(distance)}}))
+
+    paths = {path for path, _ in path_obj_list}
+    stale = sorted(published_nearby - paths)
+    published_nearby.clear()
+    published_nearby.update(paths)
+
+    if path_obj_list:
+        await telemetry.publish(path_obj_list)
+    if stale:
+        await telemetry.delete(stale)
+
+## Replay task: feed the captured responses through the same decode and
+## publish path as the fetched ones, with the captured timing scaled by
+## REPLAY_SPEED. Only the positions of tracked satellites are published
+async def replay_responses(extrapolator):
+    ## the configuration tells which satellites are tracked
+    await wait_config()
+
+    count = 0
+    try:
+        for delay, batch in replayer.batches():
+            ## also yields to the other tasks when replaying as fast as possible
+            await asyncio.sleep(delay)
+
+            samples = {}
+            for record in batch:
+                replayer.replay(record)
+                data = source_pool.decode(record.url, record.status, record.body)
+                if 'latitude' in data and int(data.get('id', 0)) in tracked_ids():
+                    samples[int(data['id'])] = data
+                elif 'line1' in data and pass_schedule:
+                    ## the TLEs are answered by http_get(), predict with the replayed ones
+                    pass_schedule.wake()
+            count += len(batch)
+
+            if samples:
+                await publish_samples(samples, extrapolator, replayer.clock)
+    except (OSError, ValueError) as e:
+        logging.error(f"Replay of {REPLAY_FILE} failed: {e}")
+        return
+
+    logging.info(f"Replay of {count} responses from {REPLAY_FILE} finished")
+
+## Extrapolation only makes sense for positions polled from the API,
+## propagated positions can be sampled at any cadence
+def extrapolation_enabled():
+    return config.extrapolation_interval > 0 and config.mode != 'propagate'
+
+## Extrapolation task: publish estimated positions between the samples
+## every 'extrapolation-interval' seconds, flagged as estimated and
+## with an error bound in km
+async def extrapolate_positions(extrapolator):
+    schedule = extrapolate_schedule
+
+    ## the task is cancelled when sigterm is received
+    while True:
+        await schedule.wait()
+        cfg = config
+        schedule.set_interval(cfg.extrapolation_interval or extrapolation.IDLE_INTERVAL)
+        schedule.success()
+
+        if extrapolation_enabled():
+            await publish_estimates(extrapolator, time.time())
+
+## Publish the positions of the tracked satellites estimated at time now,
+## flagged as estimated, with the age of the fix they continue
+async def publish_estimates(extrapolator, now):
+    cfg = config
+    estimates = {}
+    for key in tracked_ids(cfg):
+        fix = extrapolator.last_fix(key)
+        if not fix or key not in last_samples:
+            continue
+        ## only estimate between samples, up to MAX_AGE after the last one
+        if not cfg.extrapolation_interval <= now - fix.timestamp <= extrapolation.MAX_AGE:
+            continue
+        estimate = extrapolator.estimate(key, now)
+        if estimate:
+            lat, lon, alt, error = estimate
+            estimates[key] = dict(last_samples[key], latitude=round(lat, 6), longitude=round(lon, 6),
+                                  altitude=round(alt, 3), timestamp=int(now),
+                                  age=max(0, int(now) - int(fix.timestamp)),
+                                  estimated=True, error_bound=round(error, 3))
+            index_sample(key, estimates[key])
+
+    selected = publish_policy.select(estimates, now, cfg.publish)
+    if selected:
+        await telemetry.publish(sample_objects(selected))
+    if estimates:
+        await publish_nearby()
+
+## Return the samples of satellite key at timestamps computed from its TLEs,
+## and the timestamps they do not cover: all of them when its TLEs are
+## unknown or its orbit can not be propagated
+def propagated_samples(propagator, key, timestamps):
+    if not propagator or key not in propagator.tles:
+        return [], list(timestamps)
+    samples = propagator.positions([float(t) for t in timestamps]).get(key, [])
+    covered = {int(s['timestamp']) for s in samples}
+    return samples, [t for t in timestamps if int(t) not in covered]
+
+## Add the samples of a filled gap to the ground track of satellite key
+## The whole track is published again, the slots of its samples changed
+async def merge_samples(key, samples):
+    points = []
+    for sample in samples:
+        try:
+            points.append((int(sample['timestamp']), float(sample['latitude']), float(sample['longitude']),
+                           float(sample['altitude']), float(sample['velocity'])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if key in tracked_ids() and track_history.merge(key, points):
+        await telemetry.publish(history_objects(key))
+
+## Backfill task: fill the gaps of the ground tracks in the background
+## Gaps are computed locally when the TLEs of the satellite are known, the
+## timestamps they do not cover are asked to the positions endpoint, many
+## timestamps per request, one request every backfill.INTERVAL seconds and
+## only while the rate limit of the API has spare requests, so live sampling
+## is never delayed
+async def backfill_gaps(propagator):
+    schedule = backfill_schedule
+
+    ## the task is cancelled when sigterm is received
+    while True:
+        await schedule.wait()
+
+        batch = gaps.next_batch()
+        if not batch or not config.backfill:
+            schedule.success()
+            continue
+        gap, timestamps = batch
+
+        start = time.monotonic()
+        samples, missing = propagated_samples(propagator, gap.norad_id, timestamps)
+        if samples:
+            await merge_samples(gap.norad_id, samples)
+        if missing:
+            ## the timestamps newer than the first one left to fetch are filled
+            covered = timestamps[:timestamps.index(missing[0])]
+            if rate_limiter.available() < backfill.SPARE_REQUESTS + 1:
+                if covered:
+                    gaps.filled(gap, covered)
+                schedule.success()
+                continue
+            data = await asyncio.wrap_future(executor.submit(source_pool.fetch, sources.POSITIONS,
+                                                             gap.norad_id, missing))
+            if not data:
+                if covered:
+                    gaps.filled(gap, covered)
+                stats.record('backfill', time.monotonic() - start, 'no positions')
+                schedule.failure(rate_limiter.remaining_pause())
+                continue
+            await merge_samples(gap.norad_id, data['positions'])
+
+        gaps.filled(gap, timestamps)
+        stats.record('backfill', time.monotonic() - start)
+        schedule.success()
+        if not missing:
+            ## no request was sent, carry on with the next batch
+            schedule.wake()
+
+## Convert a predicted pass into a dict TelemetryUpdateRequests understands
+def pass_data(p):
+    date = lambda t: str(datetime.datetime.fromtimestamp(t))
+    return {"aos": {"value": date(p.aos)},
+            "los": {"value": date(p.los)},
+            "duration": {"value": str(p.los - p.aos)},
+            "max_elevation": {"value": str(p.max_elevation)},
+            "max_elevation_time": {"value": date(p.max_elevation_time)},
+            "aos_azimuth": {"value": str(p.aos_azimuth)},
+            "los_azimuth": {"value": str(p.los_azimuth)},
+            "sunlit": {"value": str(p.sunlit).lower()}}
+
+## Publish the upcoming passes of every tracked satellite and delete
+## the entries of passes that ended or are no longer predicted
+async def publish_passes(predicted):
+    counts = {}
+    path_obj_list = []
+    for key in sorted(tracked_ids()):
+        data = [pass_data(p) for p in predicted.get(key, [])]
+        for path in satellite_paths(key):
+            counts[path] = len(data)
+            path_obj_list += [(pass_js_path(path, index), d) for index, d in enumerate(data)]
+
+    stale = [pass_js_path(path, index)
+             for path, count in published_passes.items()
+             for index in range(counts.get(path, 0), count)]
+    published_passes.clear()
+    published_passes.update(counts)
+
+    if path_obj_list:
+        await telemetry.publish(path_obj_list)
+    if stale:
+        await telemetry.delete(stale)
+
+## Pass prediction task: keep the upcoming passes over the site published
+## The passes are cached by the predictor, they are only recomputed when
+## new TLEs are fetched or the site changes
+async def predict_passes(propagator, predictor):
+    loop = asyncio.get_event_loop()
+
+    ## the task is cancelled when sigterm is received
+    while True:
+        await pass_schedule.wait()
+        pass_schedule.success()
+
+        cfg = config
+        predictor.set_site(cfg.site)
+        predicted = {}
+        if cfg.site:
+            ## TLE refreshes are http requests, run them on the executor
+            ids = tracked_ids(cfg)
+            propagator.refresh = cfg.tle_refresh
+            await asyncio.wrap_future(executor.submit(propagator.update, ids))
+            ## the search is CPU bound, keep it off the event loop
+            predicted = await loop.run_in_executor(None, predictor.predict, ids)
+
+        await publish_passes(predicted)
+
+## Return the last known state to save in the snapshot
+def snapshot_data(propagator):
+    return {'samples': {str(k): v for k, v in last_samples.items() if k in tracked_ids()},
+            'history': track_history.snapshot(),
+            'tles': propagator.snapshot() if propagator else {}}
+
+## Restore the last known state of the previous run of the agent
+## Return the restored samples keyed by NORAD id
+def restore_snapshot(data, propagator, extrapolator):
+    samples = {int(k): dict(v, restored=True) for k, v in data.get('samples', {}).items()}
+    last_samples.update(samples)
+    ## the downtime of the agent is a gap of the ground tracks
+    for key, sample in samples.items():
+        gaps.seed(key, int(sample['timestamp']))
+    track_history.restore(data.get('history', {}))
+    if propagator:
+        propagator.restore(data.get('tles', {}))
+
+    ## continue the extrapolation from the last samples of the history
+    for key in samples:
+        track = track_history.get(key)
+        for point in (track.points(last=3) if track else []):
+            extrapolator.add(key, int(point.timestamp), point.latitude, point.longitude,
+                             point.altitude, point.velocity)
+
+    logging.info(f"Restored snapshot of {len(samples)} satellites saved at {data.get('saved')}")
+    return samples
+
+## Publish the restored state of the satellites that are still tracked
+## once the initial configuration is received, flagged as restored with
+## the age of the sample. Samples already replaced by a fetch are skipped
+async def publish_restored(samples):
+    await wait_config()
+
+    now = int(time.time())
+    restored = {}
+    path_obj_list = []
+    for key in tracked_ids():
+        if key in samples and last_samples.get(key) is samples[key]:
+            restored[key] = dict(samples[key], age=max(0, now - int(samples[key]['timestamp'])))
+            path_obj_list += history_objects(key)
+
+    if restored:
+        await telemetry.publish(sample_objects(restored) + path_obj_list)
+
+## Wait for the initial configuration, at most CONFIG_WAIT seconds
+async def wait_config():
+    try:
+        await asyncio.wait_for(config_ready.wait(), CONFIG_WAIT)
+    except asyncio.TimeoutError:
+        pass
+
+## Save the last known state, the file is written on a thread
+async def save_snapshot(propagator):
+    if not last_samples:
+        return
+    data = snapshot_data(propagator)
+    await asyncio.get_event_loop().run_in_executor(None, snapshot.save, data)
+
+## Snapshot task: save the last known state every SNAPSHOT_INTERVAL seconds
+async def save_snapshots(propagator):
+    ## the task is cancelled when sigterm is received
+    while True:
+        await asyncio.sleep(snapshot.SNAPSHOT_INTERVAL)
+        await save_snapshot(propagator)
+
+## Return the JSON path of the statistics of a stage
+def statistics_js_path(stage):
+    return '.satellite.statistics.stage{.name=="%s"}' % stage
+
+## Build the (js_path, object) list of the statistics of all stages
+## Durations are in milliseconds
+def statistics_objects(summaries):
+    path_obj_list = []
+    for stage, summary in sorted(summaries.items()):
+        path = statistics_js_path(stage)
+        path_obj_list.append((path, {"count": {"value": str(summary.count)},
+                                     "errors": {"value": str(summary.errors)},
+                                     "rate": {"value": "%.3f" % summary.rate},
+                                     "p50": {"value": "%.3f" % summary.p50},
+                                     "p99": {"value": "%.3f" % summary.p99},
+                                     "max": {"value": "%.3f" % summary.max}}))
+        for kind, count in sorted(summary.error_types.items()):
+            path_obj_list.append(('%s.error{.type=="%s"}' % (path, kind), {"count": {"value": str(count)}}))
+    return path_obj_list
+
+## Statistics task: publish the statistics of all stages every
+## STATISTICS_INTERVAL seconds, only the changed leaves are sent
+async def publish_statistics():
+    ## the task is cancelled when sigterm is received
+    while True:
+        await asyncio.sleep(STATISTICS_INTERVAL)
+        path_obj_list = statistics_objects(stats.summary())
+        if path_obj_list:
+            await telemetry.publish(path_obj_list)
 
 ## Agent function
-def run_agent():
+async def run_agent():
+    global channel, stub, sdk_notification_service_client, telemetry, executor, pass_schedule, config_ready, replayer
+    global fetch_schedule, extrapolate_schedule, source_pool, backfill_schedule
+
+    ## Open a GRPC channel to connect to the SR Linux sdk_mgr
+    ## and create the SDK service client stubs
+    channel = grpc.aio.insecure_channel(SDK_MGR_ADDRESS)
+    stub = sdk_service_pb2_grpc.SdkMgrServiceStub(channel)
+    sdk_notification_service_client = sdk_service_pb2_grpc.SdkNotificationServiceStub(channel)
 
     ## Build register agent request
     register_request = sdk_service_pb2.AgentRegistrationRequest()
     register_request.agent_liveliness=10
 
     ## Call AgentRegister RPC
-    register_response = stub.AgentRegister(request=register_request, metadata=metadata)
+    register_response = await stub.AgentRegister(request=register_request, metadata=metadata)
 
     ## Process AgentRegister response
     if register_response.status == sdk_common_pb2.SdkMgrStatus.Value("kSdkMgrFailed"):
@@ -314,39 +1051,121 @@ def run_agent():
     else:
         logging.info(f"Agent Registration successful. App ID: {register_response.app_id}")
 
-    ## Start separate thread to send keep alive every 10 seconds
-    thread = threading.Thread(target=send_keep_alive)
-    thread.start()
+    ## Start publishing telemetry in its own task
+    telemetry = publisher.TelemetryPublisher(channel, metadata, stats=stats)
+    publish_task = asyncio.ensure_future(telemetry.run())
 
-    ## Start separate thread to fetch satellite data every X seconds
-    thread2 = threading.Thread(target=get_satellite_data)
-    thread2.start()
+    ## Start the workers doing all network I/O in the mgmt namespace
+    if MGMT_NAMESPACE:
+        executor = netns.NetNSExecutor(nsname=MGMT_NAMESPACE, max_workers=fleet.MAX_WORKERS)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=fleet.MAX_WORKERS)
+
+    ## fetch all tracked satellites concurrently, from the healthiest sources
+    source_pool = sources.SourcePool(build_sources(), http_get, config.fetch.deadline, config.fetch.hedge_delay,
+                                     stats=stats)
+    fetcher = fleet.FleetFetcher(source_pool, executor, stats=stats)
+
+    if propagation:
+        propagator = propagation.Propagator(functools.partial(source_pool.fetch, sources.TLES),
+                                            refresh=config.tle_refresh)
+    else:
+        logging.error("NumPy not available, 'propagate' mode and pass prediction are disabled")
+        propagator = None
+
+    ## Restore the last known state of the previous run, it is published
+    ## as soon as the configuration tells which satellites are tracked
+    ## A replay neither restores nor overwrites the snapshot of the live agent
+    config_ready = asyncio.Event()
+    data = snapshot.load() if not REPLAY_FILE else None
+    restored = restore_snapshot(data, propagator, extrapolator) if data else {}
 
     ## Create a new SDK notification stream
-    stream_id = create_sdk_stream()
+    stream_id = await create_sdk_stream()
 
     ## Subscribe to 'config' notifications
     ## Only configuration of satellite YANG data models will be received
-    add_sdk_config_subscription(stream_id)
+    await add_sdk_config_subscription(stream_id)
 
     ## Start listening for notifications from SR Linux
     notification_stream  = start_notification_stream(stream_id)
 
-    ## process received notifications
-    for notification in notification_stream:
-        process_notification(notification)
+    ## Schedules of the tasks, a new configuration wakes them
+    fetch_schedule = scheduler.Scheduler(sample_interval())
+    extrapolate_schedule = scheduler.Scheduler(config.extrapolation_interval or extrapolation.IDLE_INTERVAL)
+
+    ## Keep alive every 10 seconds, fetch satellite data every X seconds
+    ## (or replay the captured responses) and process received notifications
+    ## as concurrent tasks
+    tasks = [asyncio.ensure_future(send_keep_alive()),
+             asyncio.ensure_future(extrapolate_positions(extrapolator)),
+             asyncio.ensure_future(process_notifications(notification_stream)),
+             asyncio.ensure_future(publish_statistics())]
+
+    if REPLAY_FILE:
+        replayer = recording.Replayer(recording.read(REPLAY_FILE), REPLAY_SPEED)
+        tasks.append(asyncio.ensure_future(replay_responses(extrapolator)))
+    else:
+        backfill_schedule = scheduler.Scheduler(backfill.INTERVAL)
+        tasks += [asyncio.ensure_future(get_satellite_data(fetcher, propagator, extrapolator)),
+                  asyncio.ensure_future(save_snapshots(propagator)),
+                  asyncio.ensure_future(backfill_gaps(propagator))]
 
+    if restored:
+        tasks.append(asyncio.ensure_future(publish_restored(restored)))
 
-if __name__ == '__main__':
+    ## predict the passes over the site from the same TLEs
+    if propagator:
+        pass_schedule = scheduler.Scheduler(PASS_INTERVAL)
+        tasks.append(asyncio.ensure_future(predict_passes(propagator, passes.PassPredictor(propagator))))
 
     ## configure SIGTERM handler
-    signal.signal(signal.SIGTERM, exit_gracefully)
+    asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, exit_gracefully, signal.SIGTERM, tasks)
 
-    ## configure log file
-    log_filename = '/var/log/srlinux/stdout/hello-satellite.log'
-    logging.basicConfig(filename=log_filename, filemode='w',datefmt='%H:%M:%S', level=logging.INFO)
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        ## save the last known state for the next start
+        if not REPLAY_FILE:
+            await save_snapshot(propagator)
+        if recorder:
+            recorder.close()
+
+        ## flush pending telemetry, then release all resources
+        await telemetry.stop()
+        await publish_task
+        await unregister_agent()
+        await asyncio.wrap_future(executor.submit(http_client.close))
+        executor.shutdown(wait=False)
+        await channel.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='SR Linux satellite tracker agent')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='publish the responses of a capture file instead of polling the API')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay at SPEED times the captured pace, 0 replays as fast as possible')
+    args = parser.parse_args()
+    REPLAY_FILE = args.replay
+    REPLAY_SPEED = args.speed
+
+    ## configure log file, written by a background thread
+    log_writer = logs.LogWriter()
+    log_writer.start()
     logging.info("Agent Start Time :: {}".format(datetime.datetime.now()))
 
     ## Run agent function
-    run_agent()
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(run_agent())
+        loop.close()
+    finally:
+        log_writer.stop()
     sys.exit()
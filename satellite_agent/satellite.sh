@@ -29,7 +29,7 @@ source "${virtual_env}"
 export  PYTHONPATH="$PYTHONPATH:/etc/opt/srlinux/helper:/etc/opt/srlinux/appmgr/satellite_agent:/opt/srlinux/bin:/usr/lib/python3.6/site-packages/sdk_protos"
 
 # start the agent in the background (as a child process)
-python3 ${main_module} &
+python3 ${main_module} "$@" &
 
 # save its process id
 child=$!
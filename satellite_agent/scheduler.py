@@ -0,0 +1,168 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import time
+import math
+import random
+import asyncio
+import datetime
+import threading
+import email.utils
+
+## Upper bound in seconds of the delay between retries after failures
+MAX_BACKOFF = 300
+
+
+class Scheduler(object):
+    '''Drift-free polling schedule on the monotonic clock.
+
+    Ticks happen at fixed deadlines origin + k * interval, independent of
+    the time spent in a cycle.  When a cycle overruns one or more deadlines
+    the missed ticks are skipped instead of being run back to back.  After
+    a failed cycle the next tick is delayed with an exponential backoff
+    with jitter, starting at one interval and bounded by MAX_BACKOFF (or the
+    interval when larger).  A Retry-After delay of the server is honoured.
+    wake() starts the next tick immediately.
+    '''
+
+    def __init__(self, interval, max_backoff=MAX_BACKOFF):
+        self.interval = float(interval)
+        self.max_backoff = max_backoff
+        self.origin = time.monotonic()
+        self.deadline = self.origin
+        self.failures = 0
+        self.skipped = 0
+        self.event = asyncio.Event()
+
+    def set_interval(self, interval):
+        '''Change the interval, the new grid starts at the next tick.'''
+        interval = float(interval)
+        if interval != self.interval:
+            self.interval = interval
+            self.origin = self.deadline
+
+    def wake(self):
+        '''Run the next tick now.'''
+        self.event.set()
+
+    async def wait(self):
+        '''Wait for the next deadline or wake(), return the wall clock time of the tick.'''
+        timeout = self.deadline - time.monotonic()
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.event.is_set():
+            ## a woken tick starts a new grid
+            self.event.clear()
+            self.origin = time.monotonic()
+        return time.time()
+
+    def success(self):
+        '''Schedule the next tick on the first deadline after now.'''
+        self.failures = 0
+        now = time.monotonic()
+        ticks = math.floor((now - self.origin) / self.interval) + 1
+        deadline = self.origin + ticks * self.interval
+        ## count the deadlines that passed while the cycle was running
+        self.skipped += max(0, round((deadline - self.deadline) / self.interval) - 1)
+        self.deadline = deadline
+
+    def failure(self, retry_after=0):
+        '''Schedule the next tick after the backoff delay of a failed cycle.'''
+        self.failures += 1
+        cap = max(self.max_backoff, self.interval)
+        backoff = min(cap, self.interval * 2 ** self.failures)
+        delay = max(random.uniform(backoff / 2, backoff), retry_after)
+        self.deadline = time.monotonic() + delay
+        self.origin = self.deadline
+
+
+class RateLimiter(object):
+    '''Thread-safe token bucket shared by all requests to an API.
+
+    acquire() blocks the calling thread until a request may be sent, at
+    most rate requests per second with bursts of burst requests.  A request
+    which could not be sent before its deadline gives up right away without
+    taking a token, so abandoned requests neither sleep on their worker nor
+    delay the next ones.  pause()
+    stops all requests for a while, e.g. after a 429 Too Many Requests
+    response carrying a Retry-After header.
+    '''
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return now
+
+    def _reserve(self, deadline):
+        ## take a token, return the seconds to wait before using it, None
+        ## when it could only be used after deadline (time.monotonic())
+        with self.lock:
+            now = self._refill()
+            wait = (1.0 - self.tokens) / self.rate if self.tokens < 1.0 else 0.0
+            wait = max(wait, self.paused_until - now)
+            if deadline is not None and now + wait > deadline:
+                return None
+            self.tokens -= 1.0
+            return wait
+
+    def acquire(self, deadline=None):
+        '''Wait until a request may be sent, return False without waiting
+        when that is after deadline (time.monotonic()).'''
+        delay = self._reserve(deadline)
+        if delay is None:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def pause(self, seconds):
+        with self.lock:
+            now = self._refill()
+            if now + seconds > self.paused_until:
+                ## drain the bucket, requests resume one by one after the pause
+                self.tokens = min(self.tokens, 1.0) - max(0, now + seconds - max(now, self.paused_until)) * self.rate
+                self.paused_until = now + seconds
+
+    def remaining_pause(self):
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def available(self):
+        '''Return the tokens in the bucket, 0 while paused, so background
+        requests can be sent only when they do not delay the others.'''
+        with self.lock:
+            now = self._refill()
+            if now < self.paused_until:
+                return 0.0
+            return max(0.0, self.tokens)
+
+
+def parse_retry_after(value, default=60):
+    '''Return the delay in seconds of a Retry-After header (seconds or http date).'''
+    if not value:
+        return default
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if date.tzinfo is None:
+        ## '-0000' dates are UTC without a known zone, parsed as naive datetimes
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
@@ -0,0 +1,71 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Last known state snapshot
+## The latest samples, TLEs and ground track history are
+## saved periodically, so a restarted agent can publish them
+## right away instead of waiting for the first fetch
+############################################################
+import os
+import json
+import time
+import logging
+
+## Location of the snapshot, kept across restarts of the agent and the router
+SNAPSHOT_PATH = '/etc/opt/srlinux/satellite/snapshot.json'
+## Seconds between two snapshots
+SNAPSHOT_INTERVAL = 60
+## Format of the snapshot, files of another version are ignored
+VERSION = 1
+
+
+def save(data, path=None):
+    '''Write data as the snapshot at path (SNAPSHOT_PATH by default).
+
+    The snapshot is written to a temporary file which replaces the previous
+    snapshot once it is on disk, so a crash never leaves a partial snapshot.
+    Blocks on disk I/O, run it on a thread.
+    '''
+    path = path or SNAPSHOT_PATH
+    data = dict(data, version=VERSION, saved=time.time())
+    directory = os.path.dirname(path)
+    tmp = path + '.tmp'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        ## persist the rename itself
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logging.error(f"Saving snapshot {path} failed: {e}")
+        return False
+    return True
+
+
+def load(path=None):
+    '''Return the snapshot saved at path (SNAPSHOT_PATH by default), or None
+    when there is no usable one.'''
+    path = path or SNAPSHOT_PATH
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.error(f"Loading snapshot {path} failed: {e}")
+        return None
+
+    if not isinstance(data, dict) or data.get('version') != VERSION:
+        logging.error(f"Ignoring snapshot {path} of an unknown version")
+        return None
+    return data
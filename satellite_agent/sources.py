@@ -0,0 +1,391 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Upstream sources of the positions and TLEs
+## Every request has a deadline, sources are tried in the
+## order of their health score, and a second source is
+## fired when the first one is slow (hedged request), so a
+## hung or degraded provider neither stalls a worker nor
+## the samples of the fleet
+############################################################
+import os
+import abc
+import json
+import time
+import asyncio
+import logging
+import threading
+import urllib.parse
+
+import metrics
+
+## Kinds of requests: the current position, the positions at up to
+## MAX_TIMESTAMPS timestamps in one request, the TLEs
+POSITION = 'position'
+POSITIONS = 'positions'
+TLES = 'tles'
+MAX_TIMESTAMPS = 10
+
+## Types of the entries of the 'source' list
+TYPES = ('wheretheiss', 'celestrak', 'file')
+
+## Default base URL of the wheretheiss API and of the CelesTrak GP query
+WHERETHEISS_URL = 'https://api.wheretheiss.at/v1/satellites'
+CELESTRAK_URL = 'https://celestrak.org/NORAD/elements/gp.php'
+
+## Default seconds before a request is abandoned, and before a second
+## source is asked while the first one did not answer (0 disables hedging)
+DEADLINE = 5.0
+HEDGE_DELAY = 1.0
+## Upper bound of the sources asked concurrently for the same request
+MAX_IN_FLIGHT = 2
+
+## Weight of the latest request in the moving averages of a source
+HEALTH_WEIGHT = 0.2
+## Consecutive failures after which a source is only asked when the other
+## sources failed, for COOLDOWN seconds doubling with every further failure
+MAX_FAILURES = 3
+COOLDOWN = 30
+MAX_COOLDOWN = 600
+
+
+class Health(object):
+    '''Health of a source: moving averages of its latency and success.
+
+    score() is the expected time to a good answer, lower is better.  A
+    source is down after MAX_FAILURES consecutive failures.
+    '''
+
+    def __init__(self):
+        self.latency = None
+        self.success = 1.0
+        self.failures = 0
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, duration, ok, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.latency is None:
+                self.latency = duration
+            else:
+                self.latency += HEALTH_WEIGHT * (duration - self.latency)
+            self.success += HEALTH_WEIGHT * ((1.0 if ok else 0.0) - self.success)
+            self.failures = 0 if ok else self.failures + 1
+            if self.failures >= MAX_FAILURES:
+                cooldown = min(COOLDOWN * 2 ** (self.failures - MAX_FAILURES), MAX_COOLDOWN)
+                self.down_until = max(self.down_until, now + cooldown)
+
+    def down(self, now=None):
+        return (time.monotonic() if now is None else now) < self.down_until
+
+    def score(self):
+        ## sources never asked score best, so every source gets measured
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(self.success, 0.05)
+
+
+def parse_tles(text):
+    '''Yield a dict (name, id, line1, line2) for every TLE of a text in
+    the two or three line format.'''
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for index, line in enumerate(lines[:-1]):
+        following = lines[index + 1]
+        if line.startswith('1 ') and following.startswith('2 ') and line[2:7] == following[2:7]:
+            previous = lines[index - 1] if index > 0 else ''
+            name = previous if previous and not previous.startswith(('1 ', '2 ')) else line[2:7].strip()
+            yield {'name': name, 'id': int(line[2:7]), 'line1': line, 'line2': following}
+
+
+class Source(abc.ABC):
+    '''An upstream answering some kinds of requests, the base class of the
+    source types registered in CLASSES.
+
+    url() returns the URL of a request, decode() turns the raw body of the
+    response into the payload of the wheretheiss API: the position endpoint
+    for POSITION, the tles endpoint (line1, line2) for TLES, and the
+    positions endpoint as {'positions': [position, ...]} for POSITIONS.
+    Requests to a source with a limiter (a scheduler.RateLimiter) wait for it.
+    '''
+
+    ## kinds of requests the source answers
+    kinds = ()
+
+    def __init__(self, name, url, limiter=None):
+        self.name = name
+        self.url_base = url.rstrip('/')
+        self.limiter = limiter
+        self.health = Health()
+
+    @abc.abstractmethod
+    def url(self, kind, norad_id, timestamps=()):
+        '''Return the URL of a request of one of kinds.'''
+
+    def owns(self, url):
+        '''Return the kind of the request of url when it was built by this source.'''
+        return None
+
+    def decode(self, kind, norad_id, body):
+        return json.loads(body.decode('utf-8'))
+
+
+class WhereTheIss(Source):
+    '''The wheretheiss API, or a stand-in serving the same endpoints.'''
+
+    kinds = (POSITION, POSITIONS, TLES)
+
+    def url(self, kind, norad_id, timestamps=()):
+        if kind == TLES:
+            return '%s/%d/tles' % (self.url_base, norad_id)
+        if kind == POSITIONS:
+            return '%s/%d/positions?timestamps=%s&units=kilometers' % (
+                self.url_base, norad_id, ','.join('%d' % t for t in timestamps))
+        return '%s/%d' % (self.url_base, norad_id)
+
+    def owns(self, url):
+        if not url.startswith(self.url_base + '/'):
+            return None
+        if url.endswith('/tles'):
+            return TLES
+        return POSITIONS if '/positions?' in url else POSITION
+
+    def decode(self, kind, norad_id, body):
+        data = json.loads(body.decode('utf-8'))
+        if kind == POSITIONS:
+            return {'positions': data} if isinstance(data, list) else {}
+        return data
+
+
+class Celestrak(Source):
+    '''The GP query of CelesTrak, TLEs only.'''
+
+    kinds = (TLES,)
+
+    def url(self, kind, norad_id, timestamps=()):
+        return '%s?CATNR=%d&FORMAT=TLE' % (self.url_base, norad_id)
+
+    def owns(self, url):
+        return TLES if url.startswith(self.url_base + '?') else None
+
+    def decode(self, kind, norad_id, body):
+        for tle in parse_tles(body.decode('utf-8', 'replace')):
+            if tle['id'] == norad_id:
+                return tle
+        return {}
+
+
+class TleFile(Source):
+    '''A local file of TLEs, e.g. a catalog copied on the router, TLEs only.
+
+    The file is parsed again when it changes.
+    '''
+
+    kinds = (TLES,)
+
+    def __init__(self, name, url, limiter=None):
+        super().__init__(name, url)
+        self.path = urllib.parse.urlsplit(url).path if url.startswith('file:') else url
+        self.loaded = None
+        self.tles = {}
+
+    def url(self, kind, norad_id, timestamps=()):
+        return 'file://%s#%d' % (self.path, norad_id)
+
+    def owns(self, url):
+        return TLES if url.startswith('file://%s#' % self.path) else None
+
+    def read(self, norad_id):
+        mtime = os.stat(self.path).st_mtime
+        if mtime != self.loaded:
+            with open(self.path, encoding='utf-8', errors='replace') as f:
+                self.tles = {tle['id']: tle for tle in parse_tles(f.read())}
+            self.loaded = mtime
+        return self.tles.get(norad_id, {})
+
+
+## Classes of the types of the 'source' list
+CLASSES = {'wheretheiss': WhereTheIss, 'celestrak': Celestrak, 'file': TleFile}
+
+
+def create(name, type_, url=None, limiters=None):
+    '''Return the Source of an entry of the 'source' list.  url defaults to
+    the public endpoint of the type, limiters maps a host on the
+    scheduler.RateLimiter its requests wait for.'''
+    if not url:
+        if type_ == 'file':
+            raise ValueError(f"source {name} of type file needs an url")
+        url = WHERETHEISS_URL if type_ == 'wheretheiss' else CELESTRAK_URL
+    limiter = (limiters or {}).get(urllib.parse.urlsplit(url).netloc)
+    return CLASSES[type_](name, url, limiter)
+
+
+class SourcePool(object):
+    '''Fetch positions and TLEs from the healthiest source that answers.
+
+    get(url, deadline, limiter) sends a GET request and returns the status
+    and raw body of the response, status 0 when no response was received
+    or it could not be sent before deadline, on the time.monotonic() clock
+    (see http_get() in satellite.py).
+
+    fetch() tries the sources one after the other until one answers, it
+    runs on a worker thread.  fetch_hedged() runs on the event loop: it
+    asks the best source, then the next one as soon as the previous failed
+    or did not answer within hedge_delay seconds, at most MAX_IN_FLIGHT at
+    a time, and returns the first answer.  Both give up after deadline
+    seconds, the timeout of the sockets of every request is the remainder
+    of the deadline once it may be sent, and a request which has not
+    started by the deadline is dropped.  Every request is recorded in stats as a
+    'source-<name>' stage, every hedge as a 'hedge' stage.
+    '''
+
+    def __init__(self, sources, get, deadline=DEADLINE, hedge_delay=HEDGE_DELAY, stats=None):
+        self.get = get
+        self.stats = stats or metrics.Metrics()
+        self.sources = []
+        self.configure(sources, deadline, hedge_delay)
+
+    def configure(self, sources, deadline=DEADLINE, hedge_delay=HEDGE_DELAY):
+        '''Replace the sources, a source with the same name, type and url
+        keeps its health.'''
+        health = {(s.name, type(s), s.url_base): s.health for s in self.sources}
+        for source in sources:
+            source.health = health.get((source.name, type(source), source.url_base), source.health)
+        self.sources = list(sources)
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+
+    def ranked(self, kind, now=None):
+        '''Return the sources of kind, healthiest first, the sources that
+        are down last.  Ties keep the configuration order.'''
+        now = time.monotonic() if now is None else now
+        candidates = [s for s in self.sources if kind in s.kinds]
+        return sorted(candidates, key=lambda s: (s.health.down(now), s.health.score()))
+
+    def decode(self, url, status, body):
+        '''Return the payload of a response to url (e.g. a replayed one), or
+        an empty dict.  Responses of unknown sources are decoded as JSON.'''
+        ## the NORAD id of the TLE sources is the last number of the url,
+        ## the CATNR parameter or the fragment
+        digits = ''.join(c if c.isdigit() else ' ' for c in url).split()
+        norad_id = int(digits[-1]) if digits else 0
+        for source in self.sources:
+            kind = source.owns(url)
+            if kind:
+                return self._decode(source, kind, norad_id, url, status, body)
+        return self._decode(None, None, norad_id, url, status, body)
+
+    def _decode(self, source, kind, norad_id, url, status, body):
+        if status == 0:
+            logging.error(f"Request to {url} raised with error: {body.decode('utf-8', 'replace')}")
+            return {}
+
+        if status != 200:
+            self.stats.error('request', f"HTTP {status}")
+            logging.error(f"HTTPError raised with error: HTTP Error {status} from {url}")
+            return {}
+
+        try:
+            with self.stats.timer('json'):
+                if source:
+                    data = source.decode(kind, norad_id, body)
+                else:
+                    data = json.loads(body.decode('utf-8'))
+        except ValueError as e:
+            logging.error(f"Invalid response received from {url}: {e}")
+            data = {}
+        return data if isinstance(data, dict) else {}
+
+    def attempt(self, source, kind, norad_id, deadline, timestamps=()):
+        '''Ask source once before deadline (time.monotonic()), return the
+        payload or an empty dict.'''
+        start = time.monotonic()
+        if start >= deadline:
+            ## queued on a busy worker until its answer was no longer awaited
+            self.stats.error(f"source-{source.name}", 'deadline')
+            return {}
+        data = {}
+        error = None
+        try:
+            if isinstance(source, TleFile):
+                data = source.read(norad_id)
+            elif source.limiter and start + source.limiter.remaining_pause() >= deadline:
+                ## told to retry after the deadline, leave it to the other sources
+                error = 'paused'
+            else:
+                url = source.url(kind, norad_id, timestamps)
+                status, body = self.get(url, deadline, source.limiter)
+                data = self._decode(source, kind, norad_id, url, status, body)
+                if status in (429, 503):
+                    error = f"HTTP {status}"
+                elif not data:
+                    error = f"HTTP {status}" if status else 'no response'
+        except (OSError, ValueError) as e:
+            error = metrics.error_type(e)
+            logging.error(f"Request to source {source.name} raised with error: {e}")
+
+        if not data and not error:
+            error = 'not found'
+        duration = time.monotonic() - start
+        ## a satellite unknown to a source that answered is no failure of the source
+        source.health.record(duration, error in (None, 'not found'))
+        self.stats.record(f"source-{source.name}", duration, error)
+        return data
+
+    def fetch(self, kind, norad_id, timestamps=()):
+        '''Return the payload of kind of satellite norad_id (at timestamps
+        for POSITIONS) from the first source that answers within the
+        deadline, or an empty dict.'''
+        deadline = time.monotonic() + self.deadline
+        for source in self.ranked(kind):
+            if time.monotonic() >= deadline:
+                break
+            data = self.attempt(source, kind, norad_id, deadline, timestamps)
+            if data:
+                return data
+        return {}
+
+    async def fetch_hedged(self, kind, norad_id, submit):
+        '''Return the payload of kind of satellite norad_id, asking the next
+        source when the previous one failed or is slow, or an empty dict.
+
+        submit(fn, *args) runs fn on a worker and returns a
+        concurrent.futures.Future.  The requests share one deadline: a
+        request still waiting for a worker or the rate limit then is
+        dropped, one already sent times out with it.
+        '''
+        start = time.monotonic()
+        deadline = start + self.deadline
+        candidates = self.ranked(kind)
+        running = set()
+
+        while candidates or running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if candidates and len(running) < MAX_IN_FLIGHT:
+                if running:
+                    self.stats.record('hedge', time.monotonic() - start)
+                source = candidates.pop(0)
+                running.add(asyncio.wrap_future(submit(self.attempt, source, kind, norad_id, deadline)))
+
+            ## without hedging the next source is only asked on failure
+            timeout = remaining
+            if candidates and len(running) < MAX_IN_FLIGHT and self.hedge_delay:
+                timeout = min(remaining, self.hedge_delay)
+            done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    data = future.result()
+                except Exception as e:
+                    logging.error(f"Fetch of satellite {norad_id} raised: {e}")
+                    continue
+                if data:
+                    return data
+
+        logging.error(f"No source answered the {kind} of satellite {norad_id}")
+        return {}
@@ -0,0 +1,231 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Spatial index of the tracked fleet
+## Earth fixed (ECEF) positions in two hashed uniform grids,
+## updated incrementally at every sample, answering the
+## proximity and visibility queries without comparing every
+## satellite with every other one
+############################################################
+import math
+import collections
+
+## WGS-84 ellipsoid
+WGS84_A = 6378.137
+WGS84_F = 1.0 / 298.257223563
+WGS84_E2 = WGS84_F * (2.0 - WGS84_F)
+
+## Default edge in km of a grid cell
+CELL_SIZE = 100.0
+## Smallest edge in km of a grid cell, bounds the cells of a query
+MIN_CELL_SIZE = 10.0
+## Edge in km of the cells of the coarse grid, answering the queries of a
+## larger radius (the site queries span thousands of km)
+COARSE_CELL_SIZE = 1000.0
+
+## A satellite seen from the site: km, degrees, degrees
+LookAngles = collections.namedtuple('LookAngles', ['distance', 'elevation', 'azimuth'])
+
+
+def norm(vector):
+    return math.sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
+
+
+def ecef(latitude, longitude, altitude):
+    '''Return the earth fixed position (km) of a geodetic position in
+    degrees, degrees and km above the WGS-84 ellipsoid.'''
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    sin_lat = math.sin(lat)
+    n = WGS84_A / math.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    return ((n + altitude) * math.cos(lat) * math.cos(lon),
+            (n + altitude) * math.cos(lat) * math.sin(lon),
+            (n * (1.0 - WGS84_E2) + altitude) * sin_lat)
+
+
+def look_angles(site, position):
+    '''Return the LookAngles of an ECEF position seen from a configuration.Site.'''
+    x, y, z = ecef(site.latitude, site.longitude, site.altitude)
+    dx, dy, dz = position[0] - x, position[1] - y, position[2] - z
+    lat = math.radians(site.latitude)
+    lon = math.radians(site.longitude)
+    east = -math.sin(lon) * dx + math.cos(lon) * dy
+    north = -math.sin(lat) * math.cos(lon) * dx - math.sin(lat) * math.sin(lon) * dy + math.cos(lat) * dz
+    up = math.cos(lat) * math.cos(lon) * dx + math.cos(lat) * math.sin(lon) * dy + math.sin(lat) * dz
+    distance = norm((dx, dy, dz))
+    elevation = math.degrees(math.asin(up / distance)) if distance else 90.0
+    azimuth = math.degrees(math.atan2(east, north)) % 360.0
+    return LookAngles(distance, elevation, azimuth)
+
+
+def slant_range(radius, min_elevation):
+    '''Return the largest distance (km) from a site on earth to a satellite
+    at radius km from the center of the earth, seen above min_elevation.'''
+    elevation = math.radians(min_elevation)
+    r = WGS84_A * math.cos(elevation)
+    if radius <= r:
+        return 0.0
+    return math.sqrt(radius * radius - r * r) - WGS84_A * math.sin(elevation)
+
+
+class Grid(object):
+    '''Hashed uniform grid: the keys of the satellites in every occupied
+    cube of edge size.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.cells = collections.defaultdict(set)
+        self.where = {}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def cell(self, position):
+        size = self.size
+        return (int(math.floor(position[0] / size)),
+                int(math.floor(position[1] / size)),
+                int(math.floor(position[2] / size)))
+
+    def update(self, key, position):
+        cell = self.cell(position)
+        previous = self.where.get(key)
+        if previous != cell:
+            if previous is not None:
+                self._leave(key, previous)
+            self.cells[cell].add(key)
+            self.where[key] = cell
+
+    def remove(self, key):
+        cell = self.where.pop(key, None)
+        if cell is not None:
+            self._leave(key, cell)
+
+    def _leave(self, key, cell):
+        members = self.cells[cell]
+        members.discard(key)
+        if not members:
+            del self.cells[cell]
+
+    def candidates(self, position, radius):
+        '''Yield the keys of the cells overlapping the cube around the
+        search sphere, looking at the occupied cells when they are fewer.'''
+        cx, cy, cz = self.cell(position)
+        reach = int(math.ceil(radius / self.size))
+        if (2 * reach + 1) ** 3 > len(self.cells):
+            cells = [cell for cell in self.cells
+                     if abs(cell[0] - cx) <= reach and abs(cell[1] - cy) <= reach and abs(cell[2] - cz) <= reach]
+        else:
+            cells = [(x, y, z)
+                     for x in range(cx - reach, cx + reach + 1)
+                     for y in range(cy - reach, cy + reach + 1)
+                     for z in range(cz - reach, cz + reach + 1)
+                     if (x, y, z) in self.cells]
+        for cell in cells:
+            yield from self.cells[cell]
+
+
+class SpatialIndex(object):
+    '''Uniform grids over the ECEF positions of the satellites.
+
+    Every satellite lives in the cell of edge cell_size containing its
+    position, and in the cell of the coarse grid of edge COARSE_CELL_SIZE.
+    update() only moves a satellite to another cell when it left its cell,
+    so keeping the index current costs a dict operation per sample.
+    Queries look at the cells overlapping the search sphere, in the fine
+    grid for a radius up to a coarse cell (the close pairs) and in the
+    coarse grid beyond (the site queries), so they neither scan every
+    occupied cell nor grow with the fleet when satellites are spread over
+    the sky.
+    '''
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = max(float(cell_size), MIN_CELL_SIZE)
+        self.grid = Grid(self.cell_size)
+        self.coarse = Grid(max(COARSE_CELL_SIZE, self.cell_size))
+        self.positions = {}
+        ## farthest satellite from the center of the earth and its distance,
+        ## the distance is None when it has to be searched again
+        self.max_key = None
+        self.max_radius = 0.0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def update(self, key, position):
+        '''Set the ECEF position (km) of satellite key.'''
+        self.grid.update(key, position)
+        self.coarse.update(key, position)
+        self.positions[key] = position
+
+        radius = norm(position)
+        if self.max_radius is not None and radius >= self.max_radius:
+            self.max_key, self.max_radius = key, radius
+        elif key == self.max_key:
+            ## the farthest satellite came closer
+            self.max_radius = None
+
+    def remove(self, key):
+        if key not in self.positions:
+            return
+        self.grid.remove(key)
+        self.coarse.remove(key)
+        del self.positions[key]
+        if key == self.max_key:
+            self.max_radius = None
+
+    def resize(self, cell_size):
+        '''Change the edge of the cells, all satellites are indexed again.'''
+        cell_size = max(float(cell_size), MIN_CELL_SIZE)
+        if cell_size == self.cell_size:
+            return
+        positions = self.positions
+        self.__init__(cell_size)
+        for key, position in positions.items():
+            self.update(key, position)
+
+    def farthest(self):
+        '''Return the largest distance (km) of a satellite from the center of the earth.'''
+        if self.max_radius is None:
+            self.max_key, self.max_radius = max(((norm(p), k) for k, p in self.positions.items()),
+                                                default=(0.0, None))[::-1]
+        return self.max_radius
+
+    def within(self, position, radius):
+        '''Return the (key, distance) of the satellites at most radius km
+        from an ECEF position, nearest first.'''
+        grid = self.grid if radius <= self.coarse.size else self.coarse
+        found = []
+        for key in grid.candidates(position, radius):
+            other = self.positions[key]
+            distance = norm((position[0] - other[0], position[1] - other[1], position[2] - other[2]))
+            if distance <= radius:
+                found.append((key, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def pairs(self, radius):
+        '''Return the (key, other key, distance) of all pairs of satellites
+        at most radius km from each other, key < other key.'''
+        found = []
+        for key, position in self.positions.items():
+            for other, distance in self.within(position, radius):
+                if key < other:
+                    found.append((key, other, distance))
+        found.sort(key=lambda item: (item[2], item[0], item[1]))
+        return found
+
+    def in_view(self, site):
+        '''Return the (key, LookAngles) of the satellites above the minimum
+        elevation of a configuration.Site, highest first.'''
+        radius = slant_range(self.farthest(), site.min_elevation)
+        center = ecef(site.latitude, site.longitude, site.altitude)
+        found = []
+        for key, _ in self.within(center, radius):
+            angles = look_angles(site, self.positions[key])
+            if angles.elevation >= site.min_elevation:
+                found.append((key, angles))
+        found.sort(key=lambda item: -item[1].elevation)
+        return found
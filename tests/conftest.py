@@ -0,0 +1,98 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## Unit tests of the agent modules, run from the repository
+## root with
+##   python3 -m pytest tests
+## The tests of satellite.py itself need grpcio and the NDK
+## protobuf bindings on the PYTHONPATH and are skipped
+## without them, the propagation and pass prediction tests
+## need numpy and sgp4
+############################################################
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'satellite_agent'),
+                os.path.join(ROOT, 'netns')]
+
+
+@pytest.fixture
+def agent():
+    '''The satellite.py module, skipped without the NDK bindings.'''
+    pytest.importorskip('grpc')
+    pytest.importorskip('sdk_service_pb2')
+    import satellite
+    return satellite
+
+
+class FakeClock(object):
+    '''Stand-in for time.monotonic and time.sleep, sleeping advances it.'''
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    '''Replace the monotonic clock of the time module by a FakeClock.'''
+    fake = FakeClock()
+    monkeypatch.setattr('time.monotonic', fake.monotonic)
+    monkeypatch.setattr('time.sleep', fake.sleep)
+    return fake
+
+
+class FakeTelemetry(object):
+    '''Stand-in for the TelemetryPublisher, keeps the published state.'''
+
+    def __init__(self):
+        self.state = {}
+        self.updates = []
+        self.deletes = []
+
+    async def publish(self, path_obj_list):
+        self.updates.append(dict(path_obj_list))
+        for path, obj in path_obj_list:
+            self.state.setdefault(path, {}).update(obj)
+
+    async def delete(self, paths):
+        self.deletes.append(list(paths))
+        for path in paths:
+            for js_path in list(self.state):
+                if js_path == path or js_path.startswith(path + '.'):
+                    del self.state[js_path]
+
+
+@pytest.fixture
+def telemetry(agent, monkeypatch):
+    '''Fresh state of the agent publishing to a FakeTelemetry.'''
+    import history
+    import policy
+    import spatial
+    import backfill
+    fake = FakeTelemetry()
+    monkeypatch.setattr(agent, 'telemetry', fake)
+    monkeypatch.setattr(agent, 'last_samples', {})
+    monkeypatch.setattr(agent, 'deleted_entries', set())
+    monkeypatch.setattr(agent, 'published_nearby', set())
+    monkeypatch.setattr(agent, 'published_passes', {})
+    monkeypatch.setattr(agent, 'track_history', history.History())
+    monkeypatch.setattr(agent, 'publish_policy', policy.PublishPolicy())
+    monkeypatch.setattr(agent, 'spatial_index', spatial.SpatialIndex())
+    monkeypatch.setattr(agent, 'gaps', backfill.GapTracker())
+    monkeypatch.setattr(agent, 'backfill_schedule', None)
+    monkeypatch.setattr(agent, 'pass_schedule', None)
+    return fake
@@ -0,0 +1,167 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import asyncio
+import concurrent.futures
+
+import pytest
+
+import backfill
+
+
+def test_silences_longer_than_the_gap_factor_are_gaps():
+    gaps = backfill.GapTracker()
+    assert gaps.sample(25544, 1000, 10, 60) is None
+    assert gaps.sample(25544, 1025, 10, 60) is None
+    ## samples arriving out of order do not move the last sample back
+    assert gaps.sample(25544, 1020, 10, 60) is None
+    assert gaps.sample(25544, 1100, 10, 60) == backfill.Gap(25544, 1025, 1100, 10)
+    assert gaps.sample(20580, 5000, 10, 0) is None
+    assert gaps.sample(20580, 9000, 10, 0) is None
+    assert len(gaps) == 1
+
+
+def test_only_the_kept_samples_are_backfilled():
+    gaps = backfill.GapTracker()
+    gaps.seed(25544, 1000)
+    gaps.seed(25544, 900)
+    assert gaps.sample(25544, 100000, 10, 5) == backfill.Gap(25544, 99940, 100000, 10)
+
+
+def test_batches_fill_the_gap_newest_first():
+    gaps = backfill.GapTracker()
+    gaps.sample(25544, 1000, 10, 60)
+    gap = gaps.sample(25544, 1100, 10, 60)
+    assert gaps.next_batch(limit=4) == (gap, [1090, 1080, 1070, 1060])
+    ## a failed batch is handed out again
+    assert gaps.next_batch(limit=4) == (gap, [1090, 1080, 1070, 1060])
+    gaps.filled(gap, [1090, 1080, 1070, 1060])
+    gap, timestamps = gaps.next_batch(limit=4)
+    assert timestamps == [1050, 1040, 1030, 1020]
+    gaps.filled(gap, timestamps)
+    gap, timestamps = gaps.next_batch(limit=4)
+    assert timestamps == [1010]
+    gaps.filled(gap, timestamps)
+    assert gaps.next_batch() is None
+    assert len(gaps) == 0
+
+
+def test_forget():
+    gaps = backfill.GapTracker()
+    for norad_id in (25544, 20580):
+        gaps.sample(norad_id, 1000, 10, 60)
+        gaps.sample(norad_id, 1100, 10, 60)
+    gaps.forget(25544)
+    gap, _ = gaps.next_batch()
+    assert gap.norad_id == 20580
+    assert len(gaps) == 1
+    assert gaps.sample(25544, 2000, 10, 60) is None
+
+
+class PartialPropagator(object):
+    '''Stand-in for propagation.Propagator covering only some timestamps.'''
+
+    def __init__(self, norad_id, covered):
+        self.norad_id = norad_id
+        self.tles = {norad_id: {}}
+        self.covered = set(covered)
+
+    def positions(self, times):
+        return {self.norad_id: [position(t) for t in times if t in self.covered]}
+
+
+def position(timestamp):
+    return {'timestamp': int(timestamp), 'latitude': 1.0, 'longitude': 2.0, 'altitude': 420.0, 'velocity': 27600.0}
+
+
+class OneBatch(object):
+    '''Stand-in for the backfill scheduler, the task ends at the second wait.'''
+
+    def __init__(self):
+        self.waits = 0
+        self.results = []
+
+    async def wait(self):
+        self.waits += 1
+        if self.waits > 1:
+            raise asyncio.CancelledError()
+
+    def success(self):
+        self.results.append('success')
+
+    def failure(self, delay=None):
+        self.results.append('failure')
+
+    def wake(self):
+        self.results.append('wake')
+
+
+class Pool(object):
+    '''Stand-in for the source pool answering the positions endpoint.'''
+
+    def __init__(self, answer=True):
+        self.answer = answer
+        self.requested = []
+
+    def fetch(self, kind, norad_id, timestamps):
+        self.requested.append(list(timestamps))
+        return {'positions': [position(t) for t in timestamps]} if self.answer else {}
+
+
+def backfill_one_batch(agent, monkeypatch, propagator, pool, spare=10):
+    schedule = OneBatch()
+    monkeypatch.setattr(agent, 'backfill_schedule', schedule)
+    monkeypatch.setattr(agent, 'source_pool', pool)
+    monkeypatch.setattr(agent, 'executor', concurrent.futures.ThreadPoolExecutor(1))
+    monkeypatch.setattr(agent.rate_limiter, 'available', lambda: spare)
+    agent.gaps.sample(25544, 1000, 10, 60)
+    agent.gaps.sample(25544, 1100, 10, 60)
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(agent.backfill_gaps(propagator))
+    finally:
+        loop.close()
+        agent.executor.shutdown()
+    return schedule
+
+
+def track(agent):
+    return [int(point.timestamp) for point in agent.track_history.get(25544).points()]
+
+
+def test_uncovered_timestamps_are_fetched(agent, telemetry, monkeypatch):
+    pool = Pool()
+    propagator = PartialPropagator(25544, [1090, 1080, 1040])
+    schedule = backfill_one_batch(agent, monkeypatch, propagator, pool)
+    assert pool.requested == [[1070, 1060, 1050, 1030, 1020, 1010]]
+    assert track(agent) == list(range(1010, 1100, 10))
+    assert agent.gaps.next_batch() is None
+    assert schedule.results == ['success']
+
+
+def test_failed_fetch_keeps_the_uncovered_timestamps(agent, telemetry, monkeypatch):
+    propagator = PartialPropagator(25544, [1090, 1080, 1040])
+    schedule = backfill_one_batch(agent, monkeypatch, propagator, Pool(answer=False))
+    assert track(agent) == [1040, 1080, 1090]
+    ## only the propagated timestamps newer than the first uncovered one are filled
+    gap, timestamps = agent.gaps.next_batch()
+    assert timestamps == [1070, 1060, 1050, 1040, 1030, 1020, 1010]
+    assert schedule.results == ['failure']
+
+    ## no spare request: nothing is fetched, the gap waits for the next batch
+    pool = Pool()
+    backfill_one_batch(agent, monkeypatch, PartialPropagator(25544, []), pool, spare=0)
+    assert not pool.requested
+    assert agent.gaps.next_batch()[1] == timestamps
+
+
+def test_propagated_gaps_need_no_request(agent, telemetry, monkeypatch):
+    pool = Pool()
+    propagator = PartialPropagator(25544, range(1000, 1100))
+    schedule = backfill_one_batch(agent, monkeypatch, propagator, pool)
+    assert not pool.requested
+    assert len(track(agent)) == 9
+    assert schedule.results == ['success', 'wake']
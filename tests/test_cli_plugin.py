@@ -0,0 +1,253 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import io
+import os
+import re
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import bench_worldmap
+from bench_worldmap import Items
+
+
+class Node(types.SimpleNamespace):
+    pass
+
+
+class List(object):
+    '''A list of the filled-in schema.'''
+
+    def __init__(self):
+        self.rows = []
+
+    def create(self, key=None):
+        ## the leaves that are not set read as None
+        node = Node(key=key, name=None, id=None, fleet=List(), track=List(), passes=List())
+        self.rows.append(node)
+        return node
+
+    def items(self):
+        return self.rows
+
+
+class FakeData(object):
+
+    def __init__(self, schema):
+        self.satellite = List()
+
+
+class FakeDatastore(object):
+    '''The state datastore: answers get_data() with the requested subtree
+    only, leaves only without recursive, and records the reads.'''
+
+    def __init__(self, root):
+        self.root = root
+        self.reads = []
+
+    def get_data(self, path, recursive):
+        self.reads.append((path, recursive))
+        return self._select(self.root, path.strip('/').split('/'), recursive)
+
+    def _select(self, node, segments, recursive):
+        if not segments:
+            return node if recursive else Node(**{k: v for k, v in vars(node).items()
+                                                  if not isinstance(v, Items)})
+        name, key, value = re.match(r'([\w-]+)(?:\[([\w-]+)=([^\]]+)\])?$', segments[0]).groups()
+        entries = getattr(node, name)
+        if key:
+            entries = [e for e in entries if value == '*' or str(getattr(e, key.replace('-', '_'))) == value]
+        keys = {k: v for k, v in vars(node).items() if not isinstance(v, Items) and k == 'norad_id'}
+        return Node(**keys, **{name: Items(self._select(e, segments[1:], recursive) for e in entries)})
+
+
+def satellite(norad_id, passes=0, track=0):
+    return Node(norad_id=norad_id, id=str(norad_id), name='sat-%d' % norad_id, timestamp=1644000000,
+                latitude='1.0', longitude='2.0', altitude='420', velocity='27600', visibility='daylight',
+                footprint='4500', daynum='2459615.0', solar_lat='-15.8', solar_lon='348.5',
+                units='kilometers', restored='false', age='0', estimated='false',
+                track=Items(Node(index=i, timestamp=1644000000 + i, latitude='%d' % i, longitude='%d' % -i,
+                                 altitude='420', velocity='27600') for i in range(track)),
+                passes=Items(Node(index=i, aos='a%d' % i, los='l%d' % i, duration='600', max_elevation='45',
+                                  max_elevation_time='m', aos_azimuth='10', los_azimuth='200', sunlit='true')
+                             for i in range(passes)))
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    module = bench_worldmap.load_plugin()
+    monkeypatch.setattr(module, 'Data', FakeData)
+    monkeypatch.setattr(module, 'build_path', lambda path: path)
+    monkeypatch.setattr(module.Plugin, '_projection_schema', lambda self, fields: None)
+    return module
+
+
+@pytest.fixture
+def state():
+    container = satellite(25544, passes=2, track=5)
+    container.satellite = Items([satellite(20580, passes=1, track=3), satellite(48274, track=4)])
+    return Node(server_data_store=FakeDatastore(Node(satellite=Items([container]))))
+
+
+def test_track_of_the_container(plugin, state):
+    schema = plugin.Plugin._populate_track(plugin.Plugin(), state, Node(schema=None))
+    node, = schema.satellite.rows
+    assert node.name == 'sat-25544'
+    assert [f.key for f in node.fleet.rows] == [20580, 48274]
+    assert [p.key for p in node.track.rows] == list(range(5))
+    assert ('/satellite', True) not in state.server_data_store.reads
+    assert ('/satellite/track', True) in state.server_data_store.reads
+
+
+def test_track_of_a_list_entry(plugin, state):
+    schema = plugin.Plugin._populate_track(plugin.Plugin(), state, Node(schema=None), '48274')
+    node, = schema.satellite.rows
+    assert node.name == 'sat-48274' and not node.fleet.rows
+    assert [p.latitude for p in node.track.rows] == ['0', '1', '2', '3']
+    recursive = [path for path, recursive in state.server_data_store.reads if recursive]
+    assert recursive == ['/satellite/satellite[norad-id=48274]/track']
+
+
+def test_passes_of_all_satellites(plugin, state):
+    schema = plugin.Plugin._populate_passes(plugin.Plugin(), state, Node(schema=None))
+    assert [(n.key, len(n.passes.rows)) for n in schema.satellite.rows] == [('25544', 2), ('20580', 1), ('48274', 0)]
+    recursive = {path for path, recursive in state.server_data_store.reads if recursive}
+    assert recursive == {'/satellite/satellite[norad-id=*]/passes', '/satellite/passes'}
+
+
+def test_passes_of_one_satellite(plugin, state):
+    schema = plugin.Plugin._populate_passes(plugin.Plugin(), state, Node(schema=None), '20580')
+    node, = schema.satellite.rows
+    assert (node.key, node.name, [p.aos for p in node.passes.rows]) == ('20580', 'sat-20580', ['a0'])
+    schema = plugin.Plugin._populate_passes(plugin.Plugin(), state, Node(schema=None), '99999')
+    assert not schema.satellite.rows
+
+
+class Arguments(dict):
+    '''The context of a CLI command.'''
+    schema = None
+
+
+class Output(object):
+
+    def __init__(self):
+        self.printed = []
+
+    def print_data(self, schema):
+        self.printed.append(schema)
+
+
+def draw(plugin, state, norad_id):
+    '''Return the panel of the world map printed by 'show satellite <norad_id>'.'''
+    output = Output()
+    command = plugin.Plugin()
+    command._set_formatters = lambda schema, **kwargs: None
+    command._print(state, Arguments({'norad-id': norad_id, 'fields': None, 'map': 'ascii'}), output)
+    node, = output.printed[0].satellite.rows
+    markers, panel = plugin.WorldMapFormatter().frame(node)
+    return markers, list(panel.values())
+
+
+def test_unknown_satellite_is_not_tracked(plugin, state):
+    markers, panel = draw(plugin, state, '99999')
+    assert not markers
+    assert panel[0] == '\tSatellite 99999 is not tracked'
+
+    markers, panel = draw(plugin, state, '20580')
+    assert panel[0] == '\tName        : sat-20580'
+
+    schema = plugin.Plugin._populate_track(plugin.Plugin(), state, Arguments(), '99999')
+    node, = schema.satellite.rows
+    assert node.id == '99999' and not node.track.rows
+
+
+def test_no_state_is_a_lost_connection(plugin):
+    state = Node(server_data_store=FakeDatastore(Node(satellite=Items())))
+    markers, panel = draw(plugin, state, '*')
+    assert not markers
+    assert 'lost connection' in panel[0]
+
+
+def test_projection_reads_no_children(plugin, state):
+    schema = plugin.Plugin._populate_projection(plugin.Plugin(), state, '*', 'position')
+    assert [n.key for n in schema.satellite.rows] == ['25544', '20580', '48274']
+    assert all(not recursive for _, recursive in state.server_data_store.reads)
+
+
+def test_world_map_warm_frames_match_cold_ones(plugin):
+    formatter = plugin.WorldMapFormatter(track=True)
+    satellite = bench_worldmap.entry(5, 60)
+    formatter.row_cache.clear()
+    formatter.cell_cache.clear()
+    cold = list(formatter.iter_format(satellite, 120))
+    converted = dict(formatter.cell_cache)
+    assert list(formatter.iter_format(satellite, 120)) == cold
+    assert formatter.cell_cache == converted
+
+    ## the current position, 51.5N 0.12W, is drawn at its cell on the base row
+    y, x = formatter._cell('51.5', '-0.12')
+    assert re.sub(r'\x1b\[[\d;]*m', '', cold[y])[x] == '#'
+
+
+def test_world_map_caches_are_bounded(plugin, monkeypatch):
+    formatter = plugin.WorldMapFormatter(track=True)
+    monkeypatch.setattr(plugin.WorldMapFormatter, 'cell_cache', {})
+    monkeypatch.setattr(plugin.WorldMapFormatter, 'cell_cache_size', 10)
+    list(formatter.iter_format(bench_worldmap.entry(0, 60), 120))
+    assert len(formatter.cell_cache) <= 10
+
+
+def test_watch_screen_rewrites_only_the_changes(plugin):
+    formatter = plugin.WorldMapFormatter()
+    out = io.StringIO()
+    screen = plugin.WatchScreen(formatter, out)
+    screen.draw([('0.0', '0.0', '#')], {3: '\tiss'})
+    first = out.getvalue()
+    assert first.startswith('\033[?25l\033[2J')
+    assert first.count('#') == 1 + sum(row.count('#') for row in formatter.base_rows)
+
+    out.seek(0)
+    out.truncate()
+    assert screen.draw([('0.0', '0.0', '#')], {3: '\tiss'}) == 0
+    assert out.getvalue() == ''
+
+    ## the marker moves one cell east, the panel row changes and another is erased
+    y, x = formatter._cell('0.0', '0.0')
+    assert formatter._cell('0.0', '5.0') == (y, x + 1)
+    written = screen.draw([('0.0', '5.0', '#')], {4: '\thubble'})
+    column = formatter.width + 3
+    ## written row by row, the panel rows are above the equator
+    assert out.getvalue() == (f"\033[4;{column}H\033[K\033[5;{column}Hhubble\033[K"
+                              f"\033[{y + 1};{x + 1}H{formatter.base_rows[y][x]}#")
+    assert written == len(out.getvalue())
+
+    screen.close()
+    assert out.getvalue().endswith(f"\033[{len(formatter.base_rows) + 1};1H\033[?25h\n")
+
+
+def test_dot_maps_are_shared_per_style_and_size(plugin, monkeypatch):
+    monkeypatch.setattr(plugin.DotMap, 'cache', {})
+    braille = plugin.DotMap.get('braille', 120)
+    assert plugin.DotMap.get('braille', 120) is braille
+    assert plugin.DotMap.get('half-block', 120) is not braille
+    assert plugin.DotMap.get('braille', 10).columns == plugin.DotMap.min_columns
+    assert plugin.DotMap.get('braille', 1000).columns == plugin.DotMap.max_columns
+    assert len(braille.base_rows) == 30
+    assert all(len(row) == 120 for row in braille.base_rows)
+
+
+@pytest.mark.parametrize('style', ['braille', 'half-block'])
+def test_dot_map_points_and_markers(plugin, style):
+    dotmap = plugin.DotMap(style, 80)
+    assert list(dotmap.render([], [])) == list(dotmap.base_rows)
+
+    ## the north west corner is the first dot of the first cell
+    rows = list(dotmap.render([('90.0', '-180.0')], [('-89.9', '179.9', '@')], color='<'))
+    assert rows[0] == f"<{dotmap.glyphs[dotmap.base[0][0] | 0x01]}\033[00m" + dotmap.base_rows[0][1:]
+    assert rows[-1] == dotmap.base_rows[-1][:-1] + '@'
+    assert rows[1:-1] == list(dotmap.base_rows[1:-1])
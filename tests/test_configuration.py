@@ -0,0 +1,82 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import pytest
+
+import configuration
+from configuration import DEFAULT, parse, validate
+
+
+def test_top_level_leaves():
+    config = parse(DEFAULT, '.satellite', [], False,
+                   {'interval': {'value': '30'}, 'mode': 'MODE_propagate', 'backfill': {'value': False},
+                    'history_size': {'value': 120}})
+    assert config.interval == 30
+    assert config.mode == 'propagate'
+    assert config.backfill is False
+    assert config.history_size == 120
+    assert config.norad_id == DEFAULT.norad_id
+    assert parse(config, '.satellite', [], True, {}) == DEFAULT
+
+
+def test_tracked_satellites():
+    config = parse(DEFAULT, '.satellite.satellite', ['20580'], False, {})
+    config = parse(config, '.satellite.satellite', ['48274'], False, {})
+    assert config.norad_ids == {20580, 48274}
+    assert parse(config, '.satellite.satellite', ['20580'], True, {}).norad_ids == {48274}
+
+
+def test_units_of_the_model():
+    config = parse(DEFAULT, '.satellite.site', [], False,
+                   {'latitude': {'value': '48.85'}, 'longitude': {'value': '2.35'}, 'altitude': {'value': 35}})
+    assert config.site == configuration.Site(48.85, 2.35, 0.035, 10.0)
+    config = parse(config, '.satellite.fetch', [], False, {'deadline': {'value': 1500}})
+    assert config.fetch == configuration.Fetch(1.5, DEFAULT.fetch.hedge_delay)
+    config = parse(config, '.satellite.log', [], False, {'level': 'LEVEL_debug', 'max_size': {'value': 2}})
+    assert config.log == configuration.Log('debug', 2 * 1048576)
+    config = parse(config, '.satellite.publish', [], False, {'policy': 'POLICY_on_change'})
+    assert config.publish == DEFAULT.publish._replace(policy='on-change')
+    assert parse(config, '.satellite.site', [], True, {}).site is None
+
+
+def test_sources_keep_their_order():
+    config = DEFAULT
+    for name, kind in [('primary', 'TYPE_wheretheiss'), ('tles', 'TYPE_celestrak'), ('backup', 'TYPE_wheretheiss')]:
+        config = parse(config, '.satellite.source', [name], False, {'type': kind})
+    config = parse(config, '.satellite.source', ['tles'], False, {'type': 'TYPE_file', 'url': {'value': '/tmp/tle'}})
+    assert [(e.name, e.type, e.url) for e in config.sources] == [
+        ('primary', 'wheretheiss', None), ('tles', 'file', '/tmp/tle'), ('backup', 'wheretheiss', None)]
+    config = parse(config, '.satellite.source', ['primary'], True, {})
+    assert [e.name for e in config.sources] == ['tles', 'backup']
+
+
+def test_other_paths_are_ignored():
+    assert parse(DEFAULT, '.other', [], False, {'interval': 1}) is DEFAULT
+
+
+def test_unparsable_notifications_raise():
+    with pytest.raises(ValueError):
+        parse(DEFAULT, '.satellite', [], False, {'interval': {'value': 'often'}})
+    with pytest.raises(ValueError):
+        parse(DEFAULT, '.satellite.satellite', ['iss'], False, {})
+
+
+@pytest.mark.parametrize('change', [
+    dict(interval=0),
+    dict(mode='guess'),
+    dict(history_size=-1),
+    dict(publish=DEFAULT.publish._replace(min_interval=30, max_interval=10)),
+    dict(publish=DEFAULT.publish._replace(policy='sometimes')),
+    dict(proximity=DEFAULT.proximity._replace(separation=-1.0)),
+    dict(sources=(configuration.Source('tles', 'celestrak', None),)),
+    dict(sources=(configuration.Source('local', 'file', None),)),
+    dict(fetch=DEFAULT.fetch._replace(deadline=0)),
+    dict(log=DEFAULT.log._replace(level='trace')),
+    dict(site=configuration.Site(91.0, 0.0, 0.0, 10.0)),
+])
+def test_invalid_configs(change):
+    validate(DEFAULT)
+    with pytest.raises(ValueError):
+        validate(DEFAULT._replace(**change))
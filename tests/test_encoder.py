@@ -0,0 +1,39 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import encoder
+import history
+
+SAMPLE = {'name': 'iss', 'id': 25544, 'latitude': 51.50073512, 'longitude': -0.1245, 'altitude': 420.12345,
+          'velocity': 27600.5, 'visibility': 'daylight', 'footprint': 4500, 'timestamp': 1644000000.7,
+          'daynum': 2459615.1234567891, 'solar_lat': -15.8, 'solar_lon': 348.5, 'units': 'kilometers',
+          'restored': True, 'age': 12}
+
+
+def test_leaves_match_the_yang_types():
+    data = encoder.encode(SAMPLE)
+    assert data['id'] == {'value': '25544'}
+    assert data['latitude'] == {'value': '51.500735'}
+    assert data['longitude'] == {'value': '-0.124500'}
+    assert data['altitude'] == {'value': '420.123'}
+    assert data['footprint'] == {'value': '4500.000'}
+    assert data['timestamp'] == {'value': '1644000000'}
+    assert data['daynum'] == {'value': '2459615.12345679'}
+    assert data['restored'] == {'value': 'true'}
+    assert data['age'] == {'value': '12'}
+
+
+def test_fields_without_a_leaf_are_left_out():
+    data = encoder.encode(dict(SAMPLE, coordinates='unused'))
+    assert 'coordinates' not in data
+    assert 'estimated' not in data
+    assert list(data) == [leaf for leaf, _ in encoder.SAMPLE_LEAVES if leaf in SAMPLE]
+
+
+def test_track_entries():
+    track = encoder.encode_track(SAMPLE)
+    assert list(track) == ['timestamp', 'latitude', 'longitude', 'altitude', 'velocity']
+    point = history.Point(0, *(SAMPLE[field] for field in history.FIELDS))
+    assert encoder.encode_point(point) == track
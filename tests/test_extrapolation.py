@@ -0,0 +1,99 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import math
+import asyncio
+
+import pytest
+
+import extrapolation
+
+## degrees per second along the equator at 27600 km/h
+RATE = math.degrees(27600.0 / 3600.0 / extrapolation.EARTH_RADIUS)
+
+
+def equator(extrapolator, key, timestamps):
+    for t in timestamps:
+        extrapolator.add(key, t, 0.0, RATE * t, 420.0, 27600.0)
+
+
+def test_dead_reckoning_follows_the_great_circle():
+    extrapolator = extrapolation.Extrapolator()
+    equator(extrapolator, 1, [0, 10])
+    lat, lon, alt, error = extrapolator.estimate(1, 40)
+    assert lat == pytest.approx(0.0, abs=1e-9)
+    assert lon == pytest.approx(RATE * 40)
+    assert alt == pytest.approx(420.0)
+    ## no residual yet: a share of the travelled distance
+    assert error == pytest.approx(27600.0 / 3600.0 * 30 * extrapolation.DEFAULT_RELATIVE_ERROR)
+
+
+def test_error_bound_from_the_residual():
+    extrapolator = extrapolation.Extrapolator()
+    equator(extrapolator, 1, [0, 10])
+    ## the next fix is 1 km ahead of the prediction
+    extrapolator.add(1, 20, 0.0, RATE * 20 + math.degrees(1.0 / extrapolation.EARTH_RADIUS), 420.0, 27600.0)
+    assert extrapolator.error_rate[1] == pytest.approx(1.0 / 100)
+    assert extrapolator.estimate(1, 40)[3] == pytest.approx(4.0)
+    assert extrapolator.estimate(1, 21)[3] == extrapolation.MIN_ERROR
+
+
+def test_older_fixes_and_remove():
+    extrapolator = extrapolation.Extrapolator()
+    equator(extrapolator, 1, [10, 5])
+    assert extrapolator.estimate(1, 20) is None
+    equator(extrapolator, 1, [20])
+    assert extrapolator.last_fix(1).timestamp == 20
+    extrapolator.remove(1)
+    assert extrapolator.last_fix(1) is None
+
+
+def sample(key, t):
+    return {'name': 'sat-%d' % key, 'id': key, 'latitude': 0.0, 'longitude': RATE * t, 'altitude': 420.0,
+            'velocity': 27600.0, 'visibility': 'daylight', 'footprint': 4500.0, 'timestamp': t,
+            'daynum': 2459000.5, 'solar_lat': 0.0, 'solar_lon': 0.0, 'units': 'kilometers'}
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def agent_state(agent, telemetry, monkeypatch):
+    monkeypatch.setattr(agent, 'extrapolator', extrapolation.Extrapolator())
+    monkeypatch.setattr(agent, 'config', agent.configuration.DEFAULT._replace(
+        norad_ids=frozenset({7}), extrapolation_interval=2))
+    for t in (1000, 1010):
+        run(agent.publish_samples({7: sample(7, t)}, agent.extrapolator, t))
+    return agent
+
+
+def test_estimates_carry_the_age_of_the_fix(agent_state, telemetry):
+    agent = agent_state
+    run(agent.publish_estimates(agent.extrapolator, 1025.5))
+    published = telemetry.state[agent.satellite_js_path(7)]
+    assert published['estimated'] == {'value': 'true'}
+    assert published['age'] == {'value': '15'}
+    assert published['timestamp'] == {'value': '1025'}
+
+
+def test_stale_estimates_are_deleted(agent_state, telemetry):
+    agent = agent_state
+    run(agent.publish_last_known({7, 25544}, 1010 + agent.STALE_AGE))
+    assert agent.satellite_js_path(7) in telemetry.state
+    run(agent.publish_last_known({7, 25544}, 1011 + agent.STALE_AGE))
+    assert telemetry.deletes[-1] == ['.satellite']
+    assert not telemetry.state
+    assert agent.deleted_entries == {7, 25544}
+
+
+def test_untracked_satellites_leave_the_extrapolator(agent_state):
+    agent = agent_state
+    run(agent.apply_config(agent.config._replace(norad_ids=frozenset())))
+    assert agent.extrapolator.last_fix(7) is None
@@ -0,0 +1,71 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import json
+import time
+import asyncio
+import threading
+
+import fleet
+import sources
+
+
+class SlowApi(object):
+    '''Stand-in for http_get(): every position takes delay seconds, the
+    satellites in missing are not found.'''
+
+    def __init__(self, delay, missing=()):
+        self.delay = delay
+        self.missing = set(missing)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def __call__(self, url, deadline, limiter):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        norad_id = int(url.rsplit('/', 1)[1])
+        if norad_id in self.missing:
+            return 404, b'{"error": "not found"}'
+        return 200, json.dumps({'id': norad_id, 'latitude': 1.0}).encode()
+
+
+def fetch_all(api, norad_ids, max_workers=fleet.MAX_WORKERS):
+    pool = sources.SourcePool([sources.WhereTheIss('public', 'http://api/v1/satellites')], api,
+                              deadline=5.0, hedge_delay=0)
+    fetcher = fleet.FleetFetcher(pool, max_workers=max_workers)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(fetcher.fetch_all(norad_ids)), fetcher
+    finally:
+        loop.close()
+        fetcher.shutdown()
+
+
+def test_requests_of_a_cycle_run_concurrently():
+    api = SlowApi(0.2)
+    started = time.monotonic()
+    results, fetcher = fetch_all(api, range(1, 9))
+    assert time.monotonic() - started < 0.6
+    assert api.max_active == 8
+    assert sorted(results) == list(range(1, 9))
+    assert results[3] == {'id': 3, 'latitude': 1.0}
+    assert fetcher.stats.summary()['executor'].count == 8
+
+
+def test_concurrency_is_bounded_by_the_workers():
+    api = SlowApi(0.05)
+    results, _ = fetch_all(api, range(1, 7), max_workers=2)
+    assert api.max_active == 2
+    assert len(results) == 6
+
+
+def test_failed_satellites_are_left_out():
+    results, _ = fetch_all(SlowApi(0, missing={2}), [1, 2, 3, 3])
+    assert sorted(results) == [1, 3]
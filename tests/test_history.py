@@ -0,0 +1,92 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import asyncio
+
+import history
+import extrapolation
+
+
+def sample(t):
+    return (t, t / 10.0, t / 5.0, 420.0, 27600.0)
+
+
+def test_ring_buffer_overwrites_the_oldest():
+    track = history.TrackHistory(3)
+    slots = [track.append(*sample(t)) for t in range(1, 6)]
+    assert slots == [0, 1, 2, 0, 1]
+    assert len(track) == 3
+    assert [p.timestamp for p in track.points()] == [3, 4, 5]
+    assert [p.slot for p in track.points(last=2)] == [0, 1]
+    assert [list(segment) for segment in track.segments('timestamp')] == [[3.0], [4.0, 5.0]]
+
+
+def test_append_ignores_older_samples():
+    tracks = history.History(4)
+    assert tracks.append(1, *sample(10)) == 0
+    assert tracks.append(1, *sample(10)) is None
+    assert tracks.append(1, *sample(9)) is None
+    assert tracks.append(1, *sample(11)) == 1
+
+
+def test_merge_keeps_timestamp_order_and_capacity():
+    tracks = history.History(4)
+    for t in (10, 40, 50):
+        tracks.append(1, *sample(t))
+    assert tracks.merge(1, [sample(20), sample(30), sample(40)])
+    assert [p.timestamp for p in tracks.get(1).points()] == [20, 30, 40, 50]
+    assert not tracks.merge(1, [sample(5)])
+
+
+def test_resize_keeps_the_last_samples():
+    tracks = history.History(4)
+    for t in range(1, 5):
+        tracks.append(1, *sample(t))
+    tracks.resize(2)
+    assert [p.timestamp for p in tracks.get(1).points()] == [3, 4]
+    tracks.resize(0)
+    assert tracks.append(1, *sample(5)) is None
+
+
+def test_snapshot_restore():
+    tracks = history.History(3)
+    for t in range(1, 5):
+        tracks.append(7, *sample(t))
+    restored = history.History(3)
+    restored.restore(tracks.snapshot())
+    assert [p[1:] for p in restored.get(7).points()] == [sample(t) for t in (2, 3, 4)]
+    ## only the samples newer than the last known one are restored
+    newer = history.History(3)
+    newer.append(7, *sample(3))
+    newer.restore(tracks.snapshot())
+    assert [p.timestamp for p in newer.get(7).points()] == [3, 4]
+
+
+def position(key, t):
+    return {'name': 'sat-%d' % key, 'id': key, 'latitude': t / 10.0, 'longitude': t / 5.0,
+            'altitude': 420.0, 'velocity': 27600.0, 'visibility': 'daylight', 'footprint': 4500.0,
+            'timestamp': t, 'daynum': 2459000.5, 'solar_lat': 0.0, 'solar_lon': 0.0, 'units': 'kilometers'}
+
+
+def test_deleted_entry_gets_its_track_back(agent, telemetry, monkeypatch):
+    monkeypatch.setattr(agent, 'config', agent.configuration.DEFAULT._replace(norad_ids=frozenset({7})))
+    path = agent.satellite_js_path(7)
+    extrapolator = extrapolation.Extrapolator()
+    loop = asyncio.new_event_loop()
+    try:
+        for t in (100, 110, 120):
+            loop.run_until_complete(agent.publish_samples({7: position(7, t)}, extrapolator, t))
+        assert agent.track_js_path(path, 2) in telemetry.state
+
+        ## a failed fetch deletes the entry and its children
+        loop.run_until_complete(telemetry.delete([path]))
+        agent.deleted_entries.add(7)
+
+        loop.run_until_complete(agent.publish_samples({7: position(7, 130)}, extrapolator, 130))
+    finally:
+        loop.close()
+    assert [agent.track_js_path(path, slot) in telemetry.state for slot in range(4)] == [True] * 4
+    assert telemetry.state[path]['timestamp'] == {'value': '130'}
+    assert not agent.deleted_entries
@@ -0,0 +1,107 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import time
+import socket
+import threading
+import http.server
+
+import pytest
+
+import httpclient
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(1.0)
+        body = b'{"path": "%s"}' % self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return 'http://127.0.0.1:%d%s' % (server.server_address[1], path)
+
+
+def test_connection_is_reused(server):
+    client = httpclient.KeepAliveClient()
+    for index in range(5):
+        response = client.get(url(server, '/%d' % index))
+        assert response.status == 200
+        assert response.body == b'{"path": "/%d"}' % index
+    assert server.connections == 1
+    summary = client.stats.summary()
+    assert summary['connect'].count == 1 and summary['request'].count == 5
+    client.close()
+
+
+def test_server_closed_connections_are_not_reused(server):
+    client = httpclient.KeepAliveClient()
+    client.get(url(server, '/close'))
+    client.get(url(server, '/next'))
+    assert server.connections == 2
+    client.close()
+
+
+def test_stale_idle_connection_is_retried(server):
+    client = httpclient.KeepAliveClient()
+    client.get(url(server, '/first'))
+    ## the server dropped the idle connection
+    for conns in client.idle.values():
+        for conn in conns:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+    assert client.get(url(server, '/second')).status == 200
+    assert server.connections == 2
+    client.close()
+
+
+def test_timeouts_are_not_retried(server):
+    client = httpclient.KeepAliveClient()
+    client.get(url(server, '/first'))
+    start = time.monotonic()
+    with pytest.raises(socket.timeout):
+        client.get(url(server, '/slow'), timeout=0.3)
+    ## a single attempt on the reused connection, within the timeout
+    assert time.monotonic() - start < 0.6
+    assert server.connections == 1
+    client.close()
+
+
+def test_resolver_caches_addresses(monkeypatch):
+    resolver = httpclient.NetNSResolver(None, ttl=60)
+    lookups = []
+    monkeypatch.setattr('socket.getaddrinfo', lambda host, port, type: lookups.append(host) or ['info'])
+    assert resolver.resolve('api', 443) == ['info']
+    assert resolver.resolve('api', 443) == ['info']
+    resolver.invalidate('api', 443)
+    resolver.resolve('api', 443)
+    assert lookups == ['api', 'api']
@@ -0,0 +1,68 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import queue
+import logging
+
+import logs
+
+
+def record(msg, created=1000.0, lineno=10):
+    entry = logging.LogRecord('satellite', logging.ERROR, 'satellite.py', lineno, msg, None, None)
+    entry.created = created
+    return entry
+
+
+def test_call_sites_are_rate_limited():
+    limit = logs.RateLimit(window=60.0, burst=2, sample=3)
+    passed = [r.getMessage() for r in (record(f"m{i}", 1000.0 + i) for i in range(8)) if limit.filter(r)]
+    ## the burst, then one of every sample records with the count of the suppressed ones
+    assert passed == ['m0', 'm1', 'm4 (2 similar messages suppressed)', 'm7 (2 similar messages suppressed)']
+    ## another call site has its own budget
+    assert limit.filter(record('other', 1008.0, lineno=20))
+
+
+def test_a_new_window_reports_the_suppressed_records():
+    limit = logs.RateLimit(window=60.0, burst=1, sample=100)
+    for i in range(5):
+        limit.filter(record(f"m{i}", 1000.0 + i))
+    later = record('later', 1060.0)
+    assert limit.filter(later)
+    assert later.getMessage() == 'later (4 similar messages suppressed)'
+    assert not limit.filter(record('again', 1061.0))
+
+
+def test_a_full_queue_drops_records():
+    handler = logs.QueueHandler(queue.Queue(2))
+    for i in range(4):
+        handler.enqueue(record(f"m{i}"))
+    assert handler.dropped == 2
+    handler.queue.get_nowait()
+    handler.enqueue(record('m4'))
+    assert handler.dropped == 0
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == [
+        'm1', 'm4 (2 records dropped, log queue full)']
+
+
+def write(writer, messages):
+    writer.listener.start()
+    for msg in messages:
+        writer.handler.handle(record(msg))
+    writer.stop()
+
+
+def test_log_file_rotation(tmp_path):
+    path = tmp_path / 'satellite.log'
+    write(logs.LogWriter(str(path)), ['first run'])
+    assert 'first run' in path.read_text()
+
+    ## a new start of the agent begins a new file
+    writer = logs.LogWriter(str(path), max_size=200)
+    assert 'first run' in (tmp_path / 'satellite.log.1').read_text()
+    write(writer, [f"{'x' * 50} {i}" for i in range(10)])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['satellite.log', 'satellite.log.1',
+                                                           'satellite.log.2', 'satellite.log.3']
+    assert all(p.stat().st_size <= 200 for p in tmp_path.iterdir())
+    assert path.read_text().rstrip().endswith(' 9')
@@ -0,0 +1,58 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import pytest
+
+import metrics
+
+
+def test_percentile():
+    ordered = list(range(1, 101))
+    assert metrics.percentile(ordered, 50) == 50
+    assert metrics.percentile(ordered, 99) == 99
+    assert metrics.percentile(ordered, 100) == 100
+    assert metrics.percentile([7], 50) == 7
+    assert metrics.percentile([7], 0) == 7
+
+
+def test_error_type():
+    class Code(object):
+        name = 'UNAVAILABLE'
+
+    class RpcError(Exception):
+        def code(self):
+            return Code()
+
+    assert metrics.error_type(RpcError()) == 'UNAVAILABLE'
+    assert metrics.error_type(TimeoutError()) == 'TimeoutError'
+
+
+def test_summary(clock):
+    stats = metrics.Metrics(window=4)
+    for ms in [5, 1, 3, 2, 4]:
+        clock.sleep(1.0)
+        stats.record('request', ms / 1000.0)
+    stats.error('request', 'HTTP 503')
+    summary = stats.summary()['request']
+    ## the first duration left the window
+    assert summary.count == 5
+    assert summary.p50 == pytest.approx(2.0)
+    assert summary.max == pytest.approx(4.0)
+    assert summary.rate == pytest.approx(1.0)
+    assert summary.errors == 1
+    assert summary.error_types == {'HTTP 503': 1}
+
+
+def test_timer_records_the_exception_type(clock):
+    stats = metrics.Metrics()
+    with stats.timer('dns'):
+        clock.sleep(0.25)
+    with pytest.raises(KeyError):
+        with stats.timer('dns'):
+            raise KeyError('x')
+    summary = stats.summary()['dns']
+    assert summary.count == 2
+    assert summary.max == pytest.approx(250.0)
+    assert summary.error_types == {'KeyError': 1}
@@ -0,0 +1,49 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import os
+
+import pytest
+
+import netns
+
+## the namespace of the test process, entering it needs CAP_SYS_ADMIN
+NSPATH = '/proc/self/ns/net'
+
+
+@pytest.fixture
+def executor():
+    try:
+        executor = netns.NetNSExecutor(nspath=NSPATH, max_workers=2)
+    except (OSError, ValueError) as e:
+        pytest.skip(f"network namespaces not available: {e}")
+    yield executor
+    executor.shutdown()
+
+
+def thread_namespace():
+    return os.stat(netns.THREAD_NS_PATH).st_ino
+
+
+def test_work_items_run_in_the_namespace(executor):
+    assert executor.submit(thread_namespace).result(5) == os.stat(NSPATH).st_ino
+    assert [executor.submit(pow, 2, n).result(5) for n in range(4)] == [1, 2, 4, 8]
+
+
+def test_exceptions_are_set_on_the_future(executor):
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(lambda: 1 / 0).result(5)
+
+
+def test_no_work_after_shutdown(executor):
+    executor.shutdown()
+    assert not any(thread.is_alive() for thread in executor.threads)
+    with pytest.raises(RuntimeError):
+        executor.submit(thread_namespace)
+
+
+def test_unknown_namespace():
+    with pytest.raises(ValueError):
+        netns.get_ns_path(nsname='no-such-namespace')
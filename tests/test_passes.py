@@ -0,0 +1,72 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import pytest
+
+np = pytest.importorskip('numpy')
+import passes
+import propagation
+
+from test_propagation import iss
+
+NOW = 1644000000
+## Paris, passes start 10 degrees above the horizon
+SITE = passes.Site(48.85, 2.35, 0.035, 10.0)
+
+
+def predictor():
+    propagator = propagation.Propagator(lambda norad_id: iss())
+    propagator.update([25544], now=NOW)
+    predictor = passes.PassPredictor(propagator)
+    predictor.set_site(SITE)
+    return predictor
+
+
+def test_passes_cross_the_minimum_elevation():
+    predicted = predictor()
+    found = predicted.predict([25544], now=NOW)[25544]
+    assert 2 <= len(found) <= passes.MAX_PASSES
+    elements = predicted.propagator.elements
+    for p in found:
+        assert NOW < p.aos < p.max_elevation_time < p.los < NOW + passes.HORIZON
+        assert p.los - p.aos < 15 * 60
+        assert SITE.min_elevation < p.max_elevation <= 90.0
+        aos, los, tmax = passes.elevation(elements, SITE, np.array([p.aos, p.los, p.max_elevation_time], float))[0]
+        assert aos == pytest.approx(SITE.min_elevation, abs=0.2)
+        assert los == pytest.approx(SITE.min_elevation, abs=0.2)
+        assert tmax == pytest.approx(p.max_elevation, abs=0.1)
+    assert all(a.los < b.aos for a, b in zip(found, found[1:]))
+
+
+def test_a_pass_in_progress_starts_now():
+    first = predictor().predict([25544], now=NOW)[25544][0]
+    during = predictor().predict([25544], now=first.aos + 60)[25544][0]
+    assert during.aos == first.aos + 60
+    assert during.los == pytest.approx(first.los, abs=1)
+
+
+def test_passes_are_cached_until_half_the_horizon(monkeypatch):
+    cached = predictor()
+    first = cached.predict([25544], now=NOW)[25544]
+    computed = []
+    monkeypatch.setattr(passes, 'find_passes', lambda *args: computed.append(args) or {})
+
+    ## ended passes are dropped without recomputing
+    later = cached.predict([25544], now=first[0].los)[25544]
+    assert later == first[1:]
+    assert cached.predict([48274], now=NOW) == {}
+    assert not computed
+
+    cached.predict([25544], now=NOW + passes.HORIZON * passes.REFRESH_FRACTION + 1)
+    assert len(computed) == 1
+    cached.set_site(SITE._replace(min_elevation=0.0))
+    cached.predict([25544], now=NOW + passes.HORIZON * passes.REFRESH_FRACTION + 2)
+    assert len(computed) == 2
+
+
+def test_no_site_no_passes():
+    propagator = propagation.Propagator(lambda norad_id: iss())
+    propagator.update([25544], now=NOW)
+    assert passes.PassPredictor(propagator).predict([25544], now=NOW) == {}
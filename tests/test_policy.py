@@ -0,0 +1,65 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import math
+
+import pytest
+
+import policy
+from configuration import Publish
+
+
+def sample(latitude=0.0, longitude=0.0, altitude=420.0, timestamp=0, visibility='daylight'):
+    return {'latitude': latitude, 'longitude': longitude, 'altitude': altitude,
+            'timestamp': timestamp, 'visibility': visibility}
+
+
+def published(settings, samples, step=10):
+    '''Return the times at which the samples of a satellite, one every
+    step seconds, are selected.'''
+    publish = policy.PublishPolicy()
+    return [i * step for i, s in enumerate(samples) if publish.select({25544: s}, i * step, settings)]
+
+
+def test_moved():
+    ## a degree of longitude on the equator, and across the antimeridian
+    distance, angle = policy.moved(sample(longitude=179.5), sample(longitude=-179.5))
+    assert distance == pytest.approx(math.radians(1.0) * (6371.0 + 420.0))
+    assert angle == pytest.approx(1.0)
+    assert policy.moved(sample(), sample(altitude=421.0)) == (pytest.approx(1.0), 0.0)
+
+
+def test_on_change_ignores_the_time_leaves():
+    settings = Publish('on-change', 0.0, 0.0, 0, 0)
+    samples = [sample(timestamp=t) for t in range(3)] + [sample(timestamp=3, latitude=0.1)]
+    assert published(settings, samples) == [0, 30]
+
+
+def test_deadband():
+    settings = Publish('deadband', 50.0, 0.0, 0, 0)
+    ## about 11 km per step
+    samples = [sample(latitude=0.1 * i, timestamp=i) for i in range(12)]
+    assert published(settings, samples) == [0, 50, 100]
+    ## status leaves are always published
+    samples[3] = dict(samples[3], visibility='eclipsed')
+    assert published(settings, samples) == [0, 30, 40, 90]
+
+
+def test_minimum_and_maximum_intervals():
+    samples = [sample(latitude=float(i), timestamp=i) for i in range(10)]
+    assert published(Publish('always', 0.0, 0.0, 25, 0), samples) == [0, 30, 60, 90]
+    still = [sample(timestamp=i) for i in range(10)]
+    assert published(Publish('on-change', 0.0, 0.0, 0, 40), still) == [0, 40, 80]
+
+
+def test_forget():
+    publish = policy.PublishPolicy()
+    settings = Publish('on-change', 0.0, 0.0, 0, 0)
+    assert publish.select({25544: sample(), 20580: sample()}, 0, settings)
+    assert not publish.select({25544: sample(), 20580: sample()}, 10, settings)
+    publish.forget(25544)
+    assert list(publish.select({25544: sample(), 20580: sample()}, 20, settings)) == [25544]
+    publish.forget()
+    assert len(publish.select({25544: sample(), 20580: sample()}, 30, settings)) == 2
@@ -0,0 +1,105 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+import propagation
+
+ISS_LINE1 = '1 25544U 98067A   22035.51743056  .00005614  00000-0  10851-3 0  9993'
+ISS_LINE2 = '2 25544  51.6446 272.9016 0006148  88.3398 356.3466 15.49646102324278'
+## a Molniya orbit, 12 hours period, needs the deep space model
+MOLNIYA_LINE1 = '1 06251U 72064A   22035.04305398  .00000096  00000-0  00000+0 0  9991'
+MOLNIYA_LINE2 = '2 06251  64.0745 289.3013 7283373 280.1802  14.2385  2.00589387362402'
+
+
+def iss():
+    return {'name': 'ISS (ZARYA)', 'line1': ISS_LINE1, 'line2': ISS_LINE2}
+
+
+def test_parse_tle():
+    tle = propagation.parse_tle(ISS_LINE1, ISS_LINE2)
+    assert tle['norad_id'] == 25544
+    assert tle['epoch'] == pytest.approx(1643977506.0, abs=0.01)
+    assert tle['bstar'] == pytest.approx(1.0851e-4)
+    assert tle['ecco'] == pytest.approx(0.0006148)
+    assert tle['no_kozai'] * 1440.0 / (2 * math.pi) == pytest.approx(15.49646102)
+
+
+def test_sgp4_matches_the_reference():
+    sgp4_api = pytest.importorskip('sgp4.api')
+    tle = propagation.parse_tle(ISS_LINE1, ISS_LINE2)
+    elements = propagation.Elements([tle])
+    minutes = np.arange(0.0, 1440.0, 90.0)
+    r, v = propagation.sgp4(elements, tle['epoch'] + minutes * 60.0)
+
+    reference = sgp4_api.Satrec.twoline2rv(ISS_LINE1, ISS_LINE2, sgp4_api.WGS72)
+    for j, tsince in enumerate(minutes):
+        error, position, velocity = reference.sgp4_tsince(tsince)
+        assert error == 0
+        assert np.linalg.norm(r[0, j] - position) < 1e-3
+        assert np.linalg.norm(v[0, j] - velocity) < 1e-6
+
+
+def test_deep_space_orbits_are_not_propagated():
+    tles = [propagation.parse_tle(ISS_LINE1, ISS_LINE2),
+            propagation.parse_tle(MOLNIYA_LINE1, MOLNIYA_LINE2)]
+    r, v = propagation.sgp4(propagation.Elements(tles), [tles[0]['epoch']])
+    assert not np.isnan(r[0]).any()
+    assert np.isnan(r[1]).all()
+
+
+def test_positions_are_computed_at_the_published_second():
+    propagator = propagation.Propagator(lambda norad_id: iss())
+    propagator.update([25544], now=1644160000)
+    fractional, = propagator.positions([1644160000.9])[25544]
+    whole, = propagator.positions([1644160000])[25544]
+    assert fractional['timestamp'] == 1644160000
+    assert fractional == whole
+    assert whole['name'] == 'ISS (ZARYA)'
+    assert 400 < whole['altitude'] < 430
+    assert abs(whole['latitude']) < 52
+
+
+def test_failed_fetches_are_retried_with_backoff():
+    attempts = []
+
+    def fetch(norad_id):
+        attempts.append(now)
+        return {}
+
+    propagator = propagation.Propagator(fetch, refresh=300)
+    for now in range(1000, 2000, 10):
+        propagator.update([25544], now=now)
+    ## 60, 120, 240 seconds and then the refresh interval
+    assert attempts == [1000, 1060, 1180, 1420, 1720]
+    assert propagator.elements is None
+
+
+def test_failed_refresh_keeps_the_previous_elements():
+    answers = [iss(), {}, iss()]
+    propagator = propagation.Propagator(lambda norad_id: answers.pop(0), refresh=100)
+    propagator.update([25544], now=1644160000)
+    propagator.update([25544], now=1644160100)
+    assert propagator.positions([1644160100])[25544]
+    assert propagator.retries[25544] == (1644160160, 1)
+    propagator.update([25544], now=1644160159)
+    assert propagator.fetched[25544] == 1644160000
+    propagator.update([25544], now=1644160160)
+    assert propagator.fetched[25544] == 1644160160
+    assert 25544 not in propagator.retries
+
+
+def test_snapshot_restore():
+    propagator = propagation.Propagator(lambda norad_id: iss())
+    propagator.update([25544], now=1644160000)
+    restored = propagation.Propagator(lambda norad_id: {})
+    restored.restore(propagator.snapshot())
+    assert restored.positions([1644160000]) == propagator.positions([1644160000])
+    ## restored TLEs are refreshed on their original schedule
+    restored.update([25544], now=1644160001)
+    assert restored.fetched[25544] == 1644160000
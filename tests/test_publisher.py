@@ -0,0 +1,103 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip('grpc')
+pytest.importorskip('telemetry_service_pb2')
+
+import publisher
+
+
+class FakeChannel(object):
+    def unary_unary(self, *args, **kwargs):
+        return None
+
+
+class FakeStub(object):
+    '''Records the requests as lists of (js_path, object) and of js_paths.'''
+
+    def __init__(self):
+        self.updates = []
+        self.deletes = []
+
+    async def TelemetryAddOrUpdate(self, request, metadata):
+        self.updates.append([(info.key.js_path, json.loads(info.data.json_content)) for info in request.state])
+
+    async def TelemetryDelete(self, request, metadata):
+        self.deletes.append([key.js_path for key in request.key])
+
+
+def run(requests, maxsize=publisher.QUEUE_SIZE):
+    '''Queue requests(telemetry) before the run() task starts, return the stub.'''
+    async def main():
+        telemetry = publisher.TelemetryPublisher(FakeChannel(), [], maxsize=maxsize)
+        telemetry.stub = FakeStub()
+        await requests(telemetry)
+        await telemetry.stop()
+        await telemetry.run()
+        return telemetry.stub
+    return asyncio.run(main())
+
+
+def leaf(value):
+    return {'value': value}
+
+
+def test_consecutive_updates_are_merged():
+    async def requests(telemetry):
+        await telemetry.publish([('.satellite', {'latitude': leaf('1.0'), 'longitude': leaf('2.0')})])
+        await telemetry.publish([('.satellite', {'latitude': leaf('3.0'), 'longitude': leaf('2.0')}),
+                                 ('.satellite.track{.index==0}', {'latitude': leaf('1.0')})])
+    stub = run(requests)
+    ## a newer object of a js_path replaces the queued one
+    assert stub.updates == [[('.satellite', {'latitude': leaf('3.0'), 'longitude': leaf('2.0')}),
+                             ('.satellite.track{.index==0}', {'latitude': leaf('1.0')})]]
+
+
+def test_only_changed_leaves_are_sent():
+    async def requests(telemetry):
+        await telemetry.publish([('.satellite', {'latitude': leaf('1.0'), 'longitude': leaf('2.0')})])
+        await telemetry.delete(['.other'])
+        await telemetry.publish([('.satellite', {'latitude': leaf('1.0'), 'longitude': leaf('4.0')})])
+        await telemetry.delete(['.other'])
+        await telemetry.publish([('.satellite', {'latitude': leaf('1.0'), 'longitude': leaf('4.0')})])
+    stub = run(requests)
+    assert stub.updates == [[('.satellite', {'latitude': leaf('1.0'), 'longitude': leaf('2.0')})],
+                            [('.satellite', {'longitude': leaf('4.0')})]]
+
+
+def test_delete_forgets_the_children():
+    obj = {'latitude': leaf('1.0')}
+
+    async def requests(telemetry):
+        await telemetry.publish([('.satellite', obj), ('.satellite.track{.index==0}', obj),
+                                 ('.satellites', obj)])
+        await telemetry.delete(['.satellite'])
+        await telemetry.publish([('.satellite', obj), ('.satellite.track{.index==0}', obj),
+                                 ('.satellites', obj)])
+    stub = run(requests)
+    assert stub.deletes == [['.satellite']]
+    ## '.satellites' is not a child of '.satellite', it is unchanged
+    assert stub.updates[1] == [('.satellite', obj), ('.satellite.track{.index==0}', obj)]
+
+
+def test_a_full_queue_blocks_until_run_takes_a_request():
+    async def main():
+        telemetry = publisher.TelemetryPublisher(FakeChannel(), [], maxsize=1)
+        telemetry.stub = FakeStub()
+        await telemetry.delete(['.a'])
+        blocked = asyncio.ensure_future(telemetry.delete(['.b']))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        runner = asyncio.ensure_future(telemetry.run())
+        await blocked
+        await telemetry.stop()
+        await runner
+        return telemetry.stub
+    assert asyncio.run(main()).deletes == [['.a'], ['.b']]
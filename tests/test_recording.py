@@ -0,0 +1,61 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import pytest
+
+import recording
+
+ISS = 'https://api.wheretheiss.at/v1/satellites/25544'
+HUBBLE = 'https://api.wheretheiss.at/v1/satellites/20580'
+
+
+def capture(path, records, max_size=recording.MAX_SIZE):
+    recorder = recording.Recorder(str(path), max_size)
+    for received, url, status, body in records:
+        recorder.record(url, status, body, received)
+    recorder.close()
+    return list(recording.read(str(path)))
+
+
+def test_records_are_read_back(tmp_path):
+    path = tmp_path / 'capture.rec'
+    records = [(100.0, ISS, 200, b'{"id": 25544}'), (100.5, HUBBLE, 0, b'timed out')]
+    assert capture(path, records) == [recording.Record(*record) for record in records]
+    ## a second recorder appends to the file
+    assert len(capture(path, records)) == 4
+
+
+def test_capture_stops_at_the_maximum_size(tmp_path):
+    path = tmp_path / 'capture.rec'
+    record = (100.0, ISS, 200, b'x' * 100)
+    size = recording.HEADER.size + len(ISS) + 100
+    assert len(capture(path, [record] * 3, max_size=len(recording.MAGIC) + 2 * size)) == 2
+
+
+def test_truncated_record_ends_the_file(tmp_path):
+    path = tmp_path / 'capture.rec'
+    capture(path, [(100.0, ISS, 200, b'{"id": 25544}')] * 2)
+    path.write_bytes(path.read_bytes()[:-3])
+    assert len(list(recording.read(str(path)))) == 1
+    path.write_bytes(b'not a capture')
+    with pytest.raises(ValueError):
+        list(recording.read(str(path)))
+
+
+def test_batches_follow_the_fetch_cycles():
+    records = [recording.Record(received, url, 200, b'{}')
+               for received, url in [(100.0, ISS), (100.2, HUBBLE), (105.0, ISS), (105.1, ISS), (125.0, HUBBLE)]]
+    replayer = recording.Replayer(records, speed=2.0)
+    delays, batches = zip(*replayer.batches())
+    ## the second response of an url starts a new batch
+    assert [[record.received for record in batch] for batch in batches] == [[100.0, 100.2], [105.0], [105.1], [125.0]]
+    assert delays == pytest.approx([0.0, 2.5, 0.05, 9.95])
+    assert [delay for delay, _ in recording.Replayer(records, speed=0).batches()] == [0.0] * 4
+
+    replayer.replay(records[2])
+    replayer.replay(records[3])
+    assert replayer.latest(ISS) is records[3]
+    assert replayer.latest(HUBBLE) is None
+    assert replayer.clock == 105.1
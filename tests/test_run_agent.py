@@ -0,0 +1,141 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+############################################################
+## run_agent() against the in-process fake sdk_mgr of the
+## benchmarks, with the API answered by a stand-in of
+## http_get(): startup, configuration and SIGTERM shutdown
+############################################################
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+
+def api_get(url, deadline=None, limiter=None):
+    '''Stand-in for http_get(): every satellite is at 1N 2E right now.'''
+    if url.endswith('/tles') or '/positions?' in url:
+        return 404, b'{"error": "not found"}'
+    norad_id = int(url.rsplit('/', 1)[1])
+    return 200, json.dumps({'name': 'sat-%d' % norad_id, 'id': norad_id, 'latitude': 1.0, 'longitude': 2.0,
+                            'altitude': 420.0, 'velocity': 27600.0, 'visibility': 'daylight',
+                            'footprint': 4500.0, 'timestamp': int(time.time()), 'daynum': 2459615.0,
+                            'solar_lat': -15.8, 'solar_lon': 348.5, 'units': 'kilometers'}).encode()
+
+
+@pytest.fixture
+def sdk(agent, telemetry, monkeypatch, tmp_path):
+    '''The fake sdk_mgr the agent connects to, the globals run_agent()
+    sets are restored afterwards.'''
+    fake_sdk_mgr = pytest.importorskip('fake_sdk_mgr')
+    import scheduler
+    import snapshot
+    for name in ('channel', 'stub', 'sdk_notification_service_client', 'executor', 'source_pool', 'config',
+                 'config_ready', 'replayer', 'fetch_schedule', 'extrapolate_schedule', 'SDK_MGR_ADDRESS'):
+        monkeypatch.setattr(agent, name, getattr(agent, name))
+    monkeypatch.setattr(agent, 'MGMT_NAMESPACE', None)
+    monkeypatch.setattr(agent, 'API_MIN_INTERVAL', 0)
+    monkeypatch.setattr(agent, 'CONFIG_WAIT', 0.2)
+    monkeypatch.setattr(agent, 'rate_limiter', scheduler.RateLimiter(100, 100))
+    monkeypatch.setattr(agent, 'http_get', api_get)
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_PATH', str(tmp_path / 'snapshot.json'))
+    return fake_sdk_mgr.FakeSdkMgr()
+
+
+def run(sdk, agent, scenario):
+    '''Run the agent against sdk until scenario(agent_task) returns, then
+    stop it with SIGTERM. Return the seconds the shutdown took.'''
+    async def main():
+        agent.SDK_MGR_ADDRESS = await sdk.start()
+        task = asyncio.ensure_future(agent.run_agent())
+        try:
+            await asyncio.wait_for(sdk.registered.wait(), 5)
+            await scenario()
+            start = time.monotonic()
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(task, 5)
+            stopped = time.monotonic() - start
+
+            ## no task of the agent is left behind
+            code = lambda t: getattr(t.get_coro(), 'cr_code', None)
+            assert not [t for t in asyncio.all_tasks() if code(t) and code(t).co_filename == agent.__file__]
+            return stopped
+        finally:
+            task.cancel()
+            await sdk.stop()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+
+async def published(sdk, js_path, timeout=5):
+    deadline = time.monotonic() + timeout
+    while js_path not in sdk.state:
+        assert time.monotonic() < deadline, f"{js_path} not published"
+        await asyncio.sleep(0.02)
+
+
+def test_configured_satellites_are_published(agent, sdk):
+    async def scenario():
+        await sdk.config('.satellite', {'interval': {'value': 1}})
+        await sdk.config('.satellite.satellite', {}, keys=[20580])
+        await sdk.config('.commit.end', {})
+        await published(sdk, agent.satellite_js_path(20580))
+        await published(sdk, '.satellite')
+
+    run(sdk, agent, scenario)
+    assert agent.config.norad_ids == {20580}
+    assert sdk.state['.satellite']['name'] == {'value': 'sat-25544'}
+    assert sdk.state[agent.satellite_js_path(20580)]['latitude'] == {'value': '1.000000'}
+
+
+def test_sampling_starts_without_configuration(agent, sdk):
+    async def scenario():
+        ## no '.commit.end' arrives, the default configuration is used after CONFIG_WAIT
+        await published(sdk, '.satellite')
+
+    run(sdk, agent, scenario)
+    assert agent.config is agent.configuration.DEFAULT
+
+
+def test_sigterm_flushes_the_telemetry_then_unregisters(agent, sdk, tmp_path, monkeypatch):
+    import fake_sdk_mgr
+    update = fake_sdk_mgr.SdkMgrTelemetryService.TelemetryAddOrUpdate
+    slow = []
+
+    async def slow_update(self, request, context):
+        if slow:
+            await asyncio.sleep(0.3)
+        return await update(self, request, context)
+    monkeypatch.setattr(fake_sdk_mgr.SdkMgrTelemetryService, 'TelemetryAddOrUpdate', slow_update)
+
+    async def scenario():
+        await published(sdk, '.satellite')
+        ## an update in flight and one queued behind it when the signal arrives
+        slow.append(True)
+        await agent.telemetry.publish([('.satellite.inflight', {'value': {'value': '1'}})])
+        await asyncio.sleep(0.05)
+        await agent.telemetry.publish([('.satellite.pending', {'value': {'value': '2'}})])
+        assert '.satellite.inflight' not in sdk.state
+
+    stopped = run(sdk, agent, scenario)
+    ## the tasks sleeping for seconds (keep alive, schedules) are cancelled right away
+    assert stopped < 2
+    assert sdk.state['.satellite.inflight'] == {'value': {'value': '1'}}
+    assert sdk.state['.satellite.pending'] == {'value': {'value': '2'}}
+    assert sdk.rpcs[0] == 'AgentRegister'
+    assert sdk.rpcs[-1] == 'AgentUnRegister'
+    assert sdk.rpcs.count('AgentUnRegister') == 1
+    ## the last known state is saved for the next start
+    assert os.path.exists(str(tmp_path / 'snapshot.json'))
@@ -0,0 +1,112 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import time
+import asyncio
+import email.utils
+
+import pytest
+
+import scheduler
+
+
+def make_scheduler(interval, **kwargs):
+    ## asyncio.Event binds to a loop on older Pythons
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return scheduler.Scheduler(interval, **kwargs)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_success_keeps_the_grid(clock):
+    s = make_scheduler(10)
+    clock.now += 3.5
+    s.success()
+    assert s.deadline == s.origin + 10
+    assert s.skipped == 0
+
+
+def test_success_skips_missed_deadlines(clock):
+    s = make_scheduler(10)
+    s.success()
+    clock.now += 35
+    s.success()
+    assert s.deadline == s.origin + 40
+    assert s.skipped == 2
+
+
+def test_failure_backs_off_up_to_the_cap(clock, monkeypatch):
+    monkeypatch.setattr('random.uniform', lambda low, high: high)
+    s = make_scheduler(10, max_backoff=60)
+    delays = []
+    for _ in range(4):
+        s.failure()
+        delays.append(s.deadline - clock.now)
+    assert delays == [20, 40, 60, 60]
+    s.success()
+    assert s.failures == 0
+
+
+def test_failure_honours_retry_after(clock, monkeypatch):
+    monkeypatch.setattr('random.uniform', lambda low, high: low)
+    s = make_scheduler(10)
+    s.failure(retry_after=120)
+    assert s.deadline == clock.now + 120
+
+
+def test_rate_limiter_burst_then_rate(clock):
+    limiter = scheduler.RateLimiter(rate=2, burst=3)
+    for _ in range(3):
+        assert limiter.acquire()
+    assert clock.slept == []
+    assert limiter.acquire()
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_rate_limiter_gives_up_at_the_deadline(clock):
+    limiter = scheduler.RateLimiter(rate=1, burst=1)
+    assert limiter.acquire()
+    ## the next token is due in one second
+    assert not limiter.acquire(deadline=clock.now + 0.5)
+    assert clock.slept == []
+    ## the abandoned request did not take the token
+    assert limiter.acquire(deadline=clock.now + 1.0)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_rate_limiter_pause(clock):
+    limiter = scheduler.RateLimiter(rate=1, burst=4)
+    limiter.pause(30)
+    assert limiter.remaining_pause() == 30
+    assert limiter.available() == 0.0
+    assert not limiter.acquire(deadline=clock.now + 10)
+    assert limiter.acquire()
+    assert sum(clock.slept) == pytest.approx(30)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, 60), ('', 60), ('7', 7), ('-3', 0), ('soon', 60),
+    ('Wed, 21 Oct 2015 07:28:00 GMT', 0), ('Wed, 21 Oct 2015 07:28:00 -0000', 0),
+])
+def test_parse_retry_after(value, expected):
+    assert scheduler.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date_without_zone():
+    ## formatdate() writes UTC dates with the '-0000' zone
+    value = email.utils.formatdate(time.time() + 120)
+    assert value.endswith('-0000')
+    assert scheduler.parse_retry_after(value) == pytest.approx(120, abs=2)
+
+
+def test_sample_interval_stretches_to_the_fleet(agent, monkeypatch):
+    cfg = agent.configuration.DEFAULT._replace(interval=5, norad_ids=frozenset(range(1, 11)))
+    monkeypatch.setattr(agent, 'rate_limiter', scheduler.RateLimiter(agent.API_RATE, agent.API_BURST))
+    ## 10 list entries and the default satellite at 1 request per second
+    assert agent.sample_interval(cfg) == 11 / agent.API_RATE
+    assert agent.sample_interval(cfg._replace(norad_ids=frozenset())) == 5
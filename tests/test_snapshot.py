@@ -0,0 +1,38 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import os
+import json
+
+import snapshot
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'satellite' / 'snapshot.json')
+    assert snapshot.save({'samples': {'25544': [{'latitude': 1.0}]}}, path)
+    data = snapshot.load(path)
+    assert data['samples'] == {'25544': [{'latitude': 1.0}]}
+    assert data['version'] == snapshot.VERSION
+    assert os.listdir(os.path.dirname(path)) == ['snapshot.json']
+
+
+def test_failed_save_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot.json')
+    snapshot.save({'samples': 1}, path)
+
+    def crash(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'fsync', crash)
+    assert not snapshot.save({'samples': 2}, path)
+    assert snapshot.load(path)['samples'] == 1
+
+
+def test_unusable_snapshots_are_ignored(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    assert snapshot.load(str(path)) is None
+    path.write_text('{"samples": ')
+    assert snapshot.load(str(path)) is None
+    path.write_text(json.dumps({'version': snapshot.VERSION + 1, 'samples': 1}))
+    assert snapshot.load(str(path)) is None
@@ -0,0 +1,159 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import json
+import time
+import asyncio
+import concurrent.futures
+
+import pytest
+
+import scheduler
+import sources
+
+TLE_TEXT = '''ISS (ZARYA)
+1 25544U 98067A   22035.51743056  .00005614  00000-0  10851-3 0  9993
+2 25544  51.6446 272.9016 0006148  88.3398 356.3466 15.49646102324278
+1 43013U 17073A   22035.14471286 -.00000020  00000-0  11329-4 0  9995
+2 43013  98.7224 333.7211 0001253  88.4207 271.7102 14.19540133219358
+'''
+
+
+class FakeGet(object):
+    '''Stand-in for http_get(): answers by url after a delay.'''
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def __call__(self, url, deadline, limiter):
+        self.calls.append(url)
+        delay, status, payload = self.answers[url]
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        if time.monotonic() >= deadline:
+            return 0, b'timed out'
+        return status, json.dumps(payload).encode()
+
+
+def wheretheiss(name):
+    return sources.WhereTheIss(name, 'http://%s/v1/satellites' % name)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_parse_tles():
+    tles = list(sources.parse_tles(TLE_TEXT))
+    assert [(t['name'], t['id']) for t in tles] == [('ISS (ZARYA)', 25544), ('43013', 43013)]
+
+
+def test_create():
+    source = sources.create('public', 'celestrak')
+    assert isinstance(source, sources.Celestrak)
+    assert source.url(sources.TLES, 25544) == sources.CELESTRAK_URL + '?CATNR=25544&FORMAT=TLE'
+    with pytest.raises(ValueError):
+        sources.create('local', 'file')
+
+
+def test_source_types_build_their_urls():
+    with pytest.raises(TypeError):
+        sources.Source('abstract', 'http://api')
+    for cls in sources.CLASSES.values():
+        assert cls.url is not sources.Source.url
+        assert cls.kinds
+
+
+def test_health_cooldown():
+    health = sources.Health()
+    for _ in range(sources.MAX_FAILURES):
+        health.record(0.1, False, now=100)
+    assert health.down(now=100 + sources.COOLDOWN - 1)
+    assert not health.down(now=100 + sources.COOLDOWN)
+    health.record(0.1, False, now=200)
+    assert health.down_until == 200 + 2 * sources.COOLDOWN
+
+
+def test_ranked_by_score_down_last():
+    fast, slow, down = wheretheiss('fast'), wheretheiss('slow'), wheretheiss('down')
+    fast.health.record(0.05, True)
+    slow.health.record(0.5, True)
+    for _ in range(sources.MAX_FAILURES):
+        down.health.record(0.01, False)
+    pool = sources.SourcePool([down, slow, fast], FakeGet({}))
+    assert pool.ranked(sources.POSITION) == [fast, slow, down]
+    assert pool.ranked(sources.TLES) == [fast, slow, down]
+
+
+def test_fetch_falls_back_to_the_next_source():
+    first, second = wheretheiss('first'), wheretheiss('second')
+    get = FakeGet({first.url(sources.POSITION, 25544): (0, 500, {}),
+                   second.url(sources.POSITION, 25544): (0, 200, {'id': 25544})})
+    pool = sources.SourcePool([first, second], get)
+    assert pool.fetch(sources.POSITION, 25544) == {'id': 25544}
+    assert first.health.failures == 1
+    assert pool.stats.summary()['source-first'].error_types == {'HTTP 500': 1}
+
+
+def test_tle_file(tmp_path):
+    path = tmp_path / 'catalog.txt'
+    path.write_text(TLE_TEXT)
+    source = sources.create('local', 'file', 'file://%s' % path)
+    pool = sources.SourcePool([source], FakeGet({}))
+    assert pool.fetch(sources.TLES, 25544)['name'] == 'ISS (ZARYA)'
+    ## a satellite missing from the file is no failure of the source
+    assert pool.fetch(sources.TLES, 1) == {}
+    assert source.health.failures == 0
+
+
+def test_fetch_hedged_asks_the_next_source_when_slow():
+    slow, fast = wheretheiss('slow'), wheretheiss('fast')
+    get = FakeGet({slow.url(sources.POSITION, 25544): (1.0, 200, {'source': 'slow'}),
+                   fast.url(sources.POSITION, 25544): (0, 200, {'source': 'fast'})})
+    pool = sources.SourcePool([slow, fast], get, deadline=2.0, hedge_delay=0.05)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        started = time.monotonic()
+        data = run(pool.fetch_hedged(sources.POSITION, 25544, executor.submit))
+        assert time.monotonic() - started < 0.5
+    assert data == {'source': 'fast'}
+    assert pool.stats.summary()['hedge'].count == 1
+
+
+def test_fetch_hedged_drops_requests_queued_past_the_deadline():
+    hung, spare = wheretheiss('hung'), wheretheiss('spare')
+    get = FakeGet({hung.url(sources.POSITION, 25544): (1.0, 200, {}),
+                   spare.url(sources.POSITION, 25544): (0, 200, {'source': 'spare'})})
+    pool = sources.SourcePool([hung, spare], get, deadline=0.2, hedge_delay=0.05)
+    ## a single worker: the hedged request waits behind the hung one
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        assert run(pool.fetch_hedged(sources.POSITION, 25544, executor.submit)) == {}
+    assert get.calls == [hung.url(sources.POSITION, 25544)]
+    assert pool.stats.summary()['source-spare'].error_types == {'deadline': 1}
+    assert spare.health.failures == 0
+
+
+def test_attempt_skips_a_source_paused_past_the_deadline():
+    source = wheretheiss('public')
+    source.limiter = scheduler.RateLimiter(1, 1)
+    source.limiter.pause(60)
+    get = FakeGet({})
+    pool = sources.SourcePool([source], get)
+    assert pool.attempt(source, sources.POSITION, 25544, time.monotonic() + 5) == {}
+    assert get.calls == []
+
+
+def test_http_get_gives_up_rate_limited_past_the_deadline(agent, monkeypatch):
+    sent = []
+    monkeypatch.setattr(agent.http_client, 'get', lambda url, timeout: sent.append(timeout))
+    limiter = scheduler.RateLimiter(1, 1)
+    limiter.acquire()
+    status, body = agent.http_get('http://api/1', time.monotonic() + 0.5, limiter)
+    assert status == 0 and sent == []
+    ## the token of the abandoned request is still there for the next one
+    assert limiter.acquire(time.monotonic() + 1.0)
@@ -0,0 +1,84 @@
+# Copyright 2022 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+
+# coding=utf-8
+import random
+
+import pytest
+
+import spatial
+import configuration
+
+
+def fleet(count, seed=1):
+    '''Random positions of a low earth orbit fleet.'''
+    rng = random.Random(seed)
+    return {key: spatial.ecef(rng.uniform(-70, 70), rng.uniform(-180, 180), rng.uniform(400, 1200))
+            for key in range(count)}
+
+
+def brute_within(positions, center, radius):
+    found = [(key, spatial.norm(tuple(a - b for a, b in zip(center, p)))) for key, p in positions.items()]
+    return sorted((key for key, distance in found if distance <= radius))
+
+
+def index(positions, cell_size=spatial.CELL_SIZE):
+    spatial_index = spatial.SpatialIndex(cell_size)
+    for key, position in positions.items():
+        spatial_index.update(key, position)
+    return spatial_index
+
+
+@pytest.mark.parametrize('radius', [50.0, 500.0, 1400.0, 2500.0])
+def test_within_matches_brute_force(radius):
+    positions = fleet(2000)
+    spatial_index = index(positions)
+    center = spatial.ecef(48.0, 2.0, 0.1)
+    found = spatial_index.within(center, radius)
+    assert sorted(key for key, _ in found) == brute_within(positions, center, radius)
+    assert [d for _, d in found] == sorted(d for _, d in found)
+
+
+def test_pairs_matches_brute_force():
+    positions = fleet(500)
+    expected = sorted((a, b) for a in positions for b in positions
+                      if a < b and spatial.norm(tuple(x - y for x, y in zip(positions[a], positions[b]))) <= 200.0)
+    assert sorted((a, b) for a, b, _ in index(positions).pairs(200.0)) == expected
+
+
+def test_site_queries_scan_a_fraction_of_the_fleet():
+    positions = fleet(5000)
+    spatial_index = index(positions)
+    center = spatial.ecef(48.0, 2.0, 0.1)
+    ## the search cube spans more fine cells than are occupied, the fine grid
+    ## would filter every occupied cell, the coarse grid looks up 7 x 7 x 7 cells
+    assert (2 * 25 + 1) ** 3 > len(spatial_index.grid) > 4000
+    assert len(spatial_index.coarse) > 7 ** 3
+    scanned = len(list(spatial_index.coarse.candidates(center, 2500.0)))
+    assert scanned < len(positions) / 4
+
+
+def test_update_remove_and_farthest():
+    spatial_index = spatial.SpatialIndex()
+    spatial_index.update(1, (7000.0, 0.0, 0.0))
+    spatial_index.update(2, (0.0, 8000.0, 0.0))
+    assert spatial_index.farthest() == 8000.0
+    spatial_index.update(2, (0.0, 6900.0, 0.0))
+    assert spatial_index.farthest() == 7000.0
+    spatial_index.remove(1)
+    assert spatial_index.farthest() == 6900.0
+    assert len(spatial_index) == 1 and len(spatial_index.grid) == 1 and len(spatial_index.coarse) == 1
+    spatial_index.resize(500.0)
+    assert spatial_index.within((0.0, 6900.0, 0.0), 1.0) == [(2, 0.0)]
+
+
+def test_in_view():
+    site = configuration.Site(latitude=48.0, longitude=2.0, altitude=0.1, min_elevation=10.0)
+    positions = fleet(2000)
+    positions['overhead'] = spatial.ecef(48.0, 2.0, 420.0)
+    seen = index(positions).in_view(site)
+    expected = [key for key, p in positions.items() if spatial.look_angles(site, p).elevation >= 10.0]
+    assert sorted(map(str, (key for key, _ in seen))) == sorted(map(str, expected))
+    assert seen[0][0] == 'overhead'
+    assert seen[0][1].elevation == pytest.approx(90.0, abs=0.1)